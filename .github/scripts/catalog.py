@@ -0,0 +1,326 @@
+"""
+ORION APP CATALOG
+-----------------
+apps.json parsed once into compact records that keep only the fields the
+mirror pipeline reads (descriptions, screenshots and the rest are dropped
+as soon as each entry is parsed), with indexes by id, package name and
+normalized repo key built on first use.
+
+With a cache path, the hot fields are also stored as a msgpack table
+keyed by the SHA-256 of apps.json; while apps.json is unchanged the next
+load reads that table instead of parsing the full JSON.
+
+Repo-key derivation (githubRepo / repoUrl / gitlabRepo -> unique key) is
+memoized: apps built from one shared repo (ReVanced bundles and the like)
+parse it once.
+
+    python .github/scripts/catalog.py bench [--apps 10000]
+
+compares the old dict walks of the generator against the catalog on
+synthetic apps.
+"""
+import argparse
+import functools
+import gc
+import hashlib
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+import urllib.parse
+
+import msgpack
+
+CACHE_FORMAT = 1
+_DERIVE = object() # AppRecord: derive repo from the repo fields
+
+@functools.lru_cache(maxsize=None)
+def repo_ref(github_repo, repo_url, gitlab_repo, gitlab_domain):
+    """
+    Release source of an app from its repo fields, as the
+    (unique_key, repo_path, type, domain) tuple fetch_all_repos takes, or None.
+    """
+    repo_key = None
+    source_type = None
+    domain = "gitlab.com"
+
+    if github_repo:
+        repo_key = github_repo.replace("https://github.com/", "").strip("/")
+        source_type = 'github'
+    elif repo_url and "github.com" in repo_url:
+        parts = repo_url.split("github.com/")
+        segments = parts[1].split('/') if len(parts) > 1 else []
+        if len(segments) > 1:
+            repo_key = (segments[0] + "/" + segments[1]).replace(".git", "").strip("/")
+            source_type = 'github'
+    elif gitlab_repo:
+        repo_key = gitlab_repo.strip("/")
+        source_type = 'gitlab'
+        domain = gitlab_domain or "gitlab.com"
+    elif repo_url and "gitlab" in repo_url:
+        try:
+            parsed = urllib.parse.urlparse(repo_url)
+            path_parts = parsed.path.strip("/").split("/")
+            if len(path_parts) >= 2:
+                repo_key = "/".join(path_parts)
+                source_type = 'gitlab'
+                domain = parsed.netloc
+        except ValueError:
+            pass
+
+    if not (repo_key and source_type):
+        return None
+    return (f"{source_type}::{domain}::{repo_key.lower()}", repo_key, source_type, domain)
+
+class AppRecord:
+    """The hot fields of one apps.json entry"""
+    __slots__ = ("id", "name", "package_name", "github_repo", "repo_url", "gitlab_repo",
+                 "gitlab_domain", "release_keyword", "version", "repo")
+
+    def __init__(self, id, name, package_name, github_repo, repo_url, gitlab_repo,
+                 gitlab_domain, release_keyword, version, repo=_DERIVE):
+        self.id = id
+        self.name = name
+        self.package_name = package_name
+        self.github_repo = github_repo
+        self.repo_url = repo_url
+        self.gitlab_repo = gitlab_repo
+        self.gitlab_domain = gitlab_domain
+        self.release_keyword = release_keyword
+        self.version = version
+        if repo is _DERIVE:
+            repo = repo_ref(github_repo, repo_url, gitlab_repo, gitlab_domain)
+        self.repo = repo
+
+    @classmethod
+    def from_entry(cls, entry):
+        get = entry.get
+        return cls(get("id"), get("name"), get("packageName"), get("githubRepo"), get("repoUrl"),
+                   get("gitlabRepo"), get("gitlabDomain"), get("releaseKeyword"), get("version"))
+
+    def row(self):
+        """Constructor arguments, derived repo included (the cache table format)"""
+        return (self.id, self.name, self.package_name, self.github_repo, self.repo_url,
+                self.gitlab_repo, self.gitlab_domain, self.release_keyword, self.version, self.repo)
+
+    @property
+    def repo_key(self):
+        return self.repo[0] if self.repo else None
+
+    @property
+    def target(self):
+        """The repo field as written in apps.json (for reports)"""
+        return self.github_repo or self.repo_url
+
+class Catalog:
+    def __init__(self, records):
+        self.records = records
+
+    @classmethod
+    def load(cls, path, cache_path=None):
+        """
+        Parse apps.json. With cache_path, reuse the hot-field table stored
+        there when apps.json is byte-identical, and refresh it otherwise.
+        """
+        with open(path, "rb") as f:
+            raw = f.read()
+        digest = hashlib.sha256(raw).hexdigest() if cache_path else None
+        if cache_path:
+            try:
+                with open(cache_path, "rb") as f:
+                    cached = msgpack.unpackb(f.read(), use_list=False)
+                if cached.get("format") == CACHE_FORMAT and cached.get("digest") == digest:
+                    return cls([AppRecord(*row) for row in cached["rows"]])
+            except (OSError, ValueError, TypeError, AttributeError, msgpack.UnpackException):
+                pass
+        catalog = cls([AppRecord.from_entry(entry) for entry in json.loads(raw)])
+        if cache_path:
+            catalog.save_cache(cache_path, digest)
+        return catalog
+
+    def save_cache(self, cache_path, digest):
+        payload = msgpack.packb({"format": CACHE_FORMAT, "digest": digest,
+                                 "rows": [record.row() for record in self.records]})
+        os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(cache_path) or ".")
+        with os.fdopen(fd, "wb") as f:
+            f.write(payload)
+        os.replace(tmp_path, cache_path)
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def __len__(self):
+        return len(self.records)
+
+    @functools.cached_property
+    def by_id(self):
+        """app id -> record (a later duplicate id wins)"""
+        return {record.id: record for record in self.records if record.id}
+
+    @functools.cached_property
+    def by_package(self):
+        """packageName -> record (a later duplicate wins, like the shard it writes)"""
+        return {record.package_name: record for record in self.records if record.package_name}
+
+    @functools.cached_property
+    def by_repo(self):
+        """unique repo key -> records of every app released from it"""
+        index = {}
+        for record in self.records:
+            if record.repo:
+                index.setdefault(record.repo[0], []).append(record)
+        return index
+
+    def repos(self):
+        """Distinct release sources as (unique_key, repo_path, type, domain), first seen wins."""
+        return [records[0].repo for records in self.by_repo.values()]
+
+def synthetic_apps(count, shared_every=4):
+    """apps.json-shaped entries; every shared_every-th app shares one bundle repo"""
+    apps = []
+    for i in range(count):
+        entry = {
+            "id": f"app-{i}",
+            "name": f"App {i}",
+            "description": "Synthetic app used for benchmarking. " * 8,
+            "icon": f"https://example.com/icons/{i}.png",
+            "version": "Latest",
+            "packageName": f"com.example.app{i}",
+            "category": "Tools",
+            "screenshots": [f"https://example.com/shots/{i}/{n}.png" for n in range(6)],
+        }
+        if i % shared_every == 0:
+            entry["githubRepo"] = "Example/Bundle-AutoBuilds"
+            entry["releaseKeyword"] = f"app{i}"
+        elif i % 7 == 0:
+            entry["repoUrl"] = f"https://gitlab.com/group{i}/app{i}"
+        else:
+            entry["repoUrl"] = f"https://github.com/owner{i}/app{i}.git"
+        apps.append(entry)
+    return apps
+
+def _shard_name(identifier):
+    identifier = identifier.lower().strip()
+    return "".join(c for c in identifier if c.isalnum() or c in "._-")
+
+def _legacy_walks(raw, fetched):
+    """The three walks mirror_generator did over raw dicts: repo parsing, audit, shards/manifest"""
+    apps = json.loads(raw)
+    app_to_repo = {}
+    unique = set()
+    for app in apps:
+        repo_key, source_type, domain = None, None, "gitlab.com"
+        if app.get("githubRepo"):
+            repo_key, source_type = app["githubRepo"].replace("https://github.com/", "").strip("/"), 'github'
+        elif app.get("repoUrl") and "github.com" in app["repoUrl"]:
+            parts = app["repoUrl"].split("github.com/")
+            repo_key = (parts[1].split('/')[0] + "/" + parts[1].split('/')[1]).replace(".git", "").strip("/")
+            source_type = 'github'
+        elif app.get("gitlabRepo"):
+            repo_key, source_type = app["gitlabRepo"].strip("/"), 'gitlab'
+            domain = app.get("gitlabDomain", "gitlab.com")
+        elif app.get("repoUrl") and "gitlab" in app["repoUrl"]:
+            parsed = urllib.parse.urlparse(app["repoUrl"])
+            repo_key, source_type, domain = parsed.path.strip("/"), 'gitlab', parsed.netloc
+        if repo_key and source_type:
+            u_key = f"{source_type}::{domain}::{repo_key.lower()}"
+            unique.add((u_key, repo_key, source_type, domain))
+            app_to_repo[app['id']] = u_key
+    missing = 0
+    for app in apps:
+        unique_key = app_to_repo.get(app.get('id', 'unknown'))
+        if not unique_key or not fetched.get(unique_key):
+            missing += 1
+    shards = {}
+    manifest = {}
+    for app in apps:
+        unique_key = app_to_repo.get(app.get('id'))
+        live_version = None
+        if unique_key and fetched.get(unique_key):
+            identifier = app.get('packageName') or app.get('id')
+            shards[_shard_name(identifier)] = fetched[unique_key]
+            live_version = fetched[unique_key][0].get('tag_name')
+        manifest[app.get('id')] = live_version or app.get('version', 'Latest')
+    return len(unique), missing, len(shards), len(manifest)
+
+def _catalog_walk(path, fetched, cache_path=None):
+    """The same work as _legacy_walks in the generator's single pass over a Catalog"""
+    repo_ref.cache_clear()
+    catalog = Catalog.load(path, cache_path)
+    repos = catalog.repos()
+    missing = 0
+    shards = {}
+    manifest = {}
+    for record in catalog:
+        releases = fetched.get(record.repo[0]) if record.repo else None
+        live_version = None
+        if releases:
+            shards[_shard_name(record.package_name or record.id)] = releases
+            live_version = releases[0].get('tag_name')
+        else:
+            missing += 1
+        manifest[record.id] = live_version or record.version or 'Latest'
+    return len(repos), missing, len(shards), len(manifest)
+
+def _retained_kb(load):
+    """KB still allocated by what load() returns (the in-memory app table)"""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = load()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+    return (after - before) / 1024
+
+def benchmark(count, rounds=5):
+    with tempfile.TemporaryDirectory() as tmp:
+        apps_path = os.path.join(tmp, "apps.json")
+        cache_path = os.path.join(tmp, "catalog.msgpack")
+        apps = synthetic_apps(count)
+        with open(apps_path, "w", encoding="utf-8") as f:
+            json.dump(apps, f)
+        with open(apps_path, "rb") as f:
+            raw = f.read()
+        fetched = {}
+        for record in Catalog([AppRecord.from_entry(entry) for entry in apps]):
+            if record.repo:
+                fetched[record.repo[0]] = [{"tag_name": "v1.0"}]
+        print(f"📚 {count} synthetic apps ({len(raw) / 1024 / 1024:.1f} MB of JSON), best of {rounds}")
+
+        def cold():
+            if os.path.exists(cache_path):
+                os.remove(cache_path)
+            return _catalog_walk(apps_path, fetched, cache_path)
+
+        timings = {}
+        for label, fn in (("dict walks", lambda: _legacy_walks(raw, fetched)),
+                          ("catalog", lambda: _catalog_walk(apps_path, fetched)),
+                          ("catalog cold", cold),
+                          ("catalog warm", lambda: _catalog_walk(apps_path, fetched, cache_path))):
+            best = None
+            for _ in range(rounds):
+                gc.collect()
+                start = time.perf_counter()
+                outcome = fn()
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            timings[label] = best
+            print(f"   {label:<13} {best * 1000:8.1f} ms  (repos, missing, shards, manifest) = {outcome}")
+        base = timings["dict walks"]
+        print("   ⚡ " + ", ".join(f"{label} {base / timings[label]:.2f}x"
+                                  for label in ("catalog", "catalog cold", "catalog warm")))
+        dicts_kb = _retained_kb(lambda: json.loads(raw))
+        records_kb = _retained_kb(lambda: Catalog.load(apps_path, cache_path))
+        print(f"   🧠 app table in memory: {dicts_kb:,.0f} KB as dicts, {records_kb:,.0f} KB as records")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Orion app catalog")
+    sub = parser.add_subparsers(dest="command", required=True)
+    bench = sub.add_parser("bench", help="Benchmark the catalog against the old dict walks")
+    bench.add_argument("--apps", type=int, default=10000)
+    bench.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+    benchmark(args.apps, args.rounds)
@@ -1,10 +1,23 @@
 
+import argparse
+import hashlib
 import json
-import requests
 import os
+import re
+import sys
 import urllib.parse
 import shutil
+import threading
+import time
 import msgpack
+from concurrent.futures import ThreadPoolExecutor
+
+import shared_scripts # Puts scripts/ on sys.path for http_client
+import shard_codec
+import http_client
+import catalog
+import rate_budget
+import repo_stats
 
 # Files
 APPS_FILE = "apps.json"
@@ -12,6 +25,56 @@ MIRROR_FILE = "mirror.json"
 MIRRORS_DIR = "mirrors"
 BINARY_MANIFEST_FILE = "updates.bin"
 
+# Persistent State (restored between runs by the workflow cache)
+CACHE_DIR = os.environ.get("MIRROR_CACHE_DIR", ".mirror_cache")
+HTTP_CACHE_FILE = os.path.join(CACHE_DIR, "http_cache.json")
+SHARD_INDEX_FILE = os.path.join(CACHE_DIR, "shard_index.json")
+REPO_STATS_FILE = os.path.join(CACHE_DIR, "repo_stats.json")
+CATALOG_CACHE_FILE = os.path.join(CACHE_DIR, "catalog.msgpack")
+CHANGES_FILE = "mirror_changes.json"
+
+# Delta Manifests (updates.bin patches for clients that already hold sequence N)
+DELTAS_DIR = "deltas"
+DELTA_INDEX_FILE = os.path.join(DELTAS_DIR, "index.json")
+# Published next to index.json (not in the cache) so both are seeded from the same data branch commit
+MANIFEST_HISTORY_FILE = os.path.join(DELTAS_DIR, "history.json")
+DELTA_KEEP = int(os.environ.get("MIRROR_DELTA_KEEP", "10")) # Generations a client can lag behind
+
+# Fetch Concurrency
+FETCH_WORKERS = int(os.environ.get("MIRROR_FETCH_WORKERS", "16"))
+HOST_LIMITS = {"api.github.com": 8} # Per-host in-flight cap
+DEFAULT_HOST_LIMIT = 4 # Applied to each GitLab domain
+
+# Per-App Shards: preferred APK ABIs, best first (e.g. "arm64-v8a,universal"); empty keeps every asset
+ABI_PREFERENCE = [abi.strip().lower() for abi in os.environ.get("MIRROR_ABI_PREFERENCE", "").split(",") if abi.strip()]
+ABI_ALIASES = ( # Checked in order: x86_64 before x86
+    ("arm64-v8a", ("arm64-v8a", "arm64", "aarch64")),
+    ("armeabi-v7a", ("armeabi-v7a", "armeabi", "armv7", "arm-v7a")),
+    ("x86_64", ("x86_64", "x86-64", "x64")),
+    ("x86", ("x86",)),
+    ("universal", ("universal",)),
+)
+
+# Repos shared by several apps are fetched deeper so each releaseKeyword finds its latest release
+SHARED_REPO_RELEASES = int(os.environ.get("MIRROR_SHARED_RELEASES", "100")) # REST per_page maximum
+
+# Refresh Mode: "hot" refetches only repos due by their release cadence, "full" refetches all
+REFRESH_MODE = os.environ.get("MIRROR_REFRESH", "hot")
+
+# GitHub GraphQL Batching
+GRAPHQL_URL = "https://api.github.com/graphql"
+GRAPHQL_BATCH_SIZE = int(os.environ.get("MIRROR_GRAPHQL_BATCH", "25"))
+GRAPHQL_RELEASE_QUERY = """
+  releases(first: 20, orderBy: {field: CREATED_AT, direction: DESC}) {
+    nodes {
+      tagName name isPrerelease isDraft publishedAt url
+      releaseAssets(first: 100) {
+        pageInfo { hasNextPage }
+        nodes { name size downloadUrl contentType downloadCount }
+      }
+    }
+  }"""
+
 def minify_release(release):
     """
     THIN MIRROR PROTOCOL
@@ -58,12 +121,530 @@ def minify_release(release):
         "assets": minified_assets
     }
 
-def generate_mirror():
+def minify_payload(data):
+    """Apply the Thin Mirror Protocol to a raw API payload (list or single release)."""
+    if isinstance(data, list):
+        return [minify_release(r) for r in data]
+    return minify_release(data)
+
+def asset_abi(name):
+    """ABI an APK asset name is built for (e.g. 'arm64-v8a'), or None if it doesn't say."""
+    lowered = (name or "").lower()
+    for abi, aliases in ABI_ALIASES:
+        if any(alias in lowered for alias in aliases):
+            return abi
+    return None
+
+def prefer_abi(assets, preference):
+    """
+    Keep the assets for the first preferred ABI present (plus assets that
+    name no ABI). Unchanged when there is no preference or no match.
+    """
+    for abi in preference:
+        if any(asset_abi(asset.get("name")) == abi for asset in assets):
+            return [asset for asset in assets if asset_abi(asset.get("name")) in (abi, None)]
+    return assets
+
+def keyword_pattern(keyword):
+    """releaseKeyword as a token: not preceded or followed by a letter or digit (case-insensitive)"""
+    return re.compile(r"(?<![a-z0-9])" + re.escape(keyword.lower()) + r"(?![a-z0-9])")
+
+def keyword_owns(text, pattern, rivals):
+    """
+    True when `pattern` matches `text` and none of the more specific
+    sibling keywords in `rivals` does: "youtube-music-v6.apk" belongs to
+    "youtube-music", not to "youtube".
+    """
+    text = text.lower()
+    return bool(pattern.search(text)) and not any(rival.search(text) for rival in rivals)
+
+def filter_releases(releases, keyword, preference=ABI_PREFERENCE, siblings=()):
+    """
+    KEYWORD FILTER
+    --------------
+    Narrows a repo's minified releases to one app of a multi-app repo. A
+    release matches when an asset name, its tag or its title contains
+    releaseKeyword as a token (case-insensitive, bounded by non-alphanumerics);
+    only the matching assets are kept. `siblings` are the keywords of the
+    other apps in the repo: a name that also matches a sibling keyword
+    extending this one belongs to that app instead.
+    Order is preserved, so [0] is the latest matching release.
+    Returns None when nothing matches. Callers pass no keyword for apps
+    that have their repo to themselves: generic keywords like "apk" or
+    "app" would otherwise drop assets from single-app repos.
+    """
+    if not isinstance(releases, list):
+        return releases
+    pattern = keyword_pattern(keyword) if keyword else None
+    # Sibling keywords that extend this one ("youtube" -> "youtube-music") take precedence
+    rivals = [keyword_pattern(s) for s in siblings
+              if s and len(s) > len(keyword) and pattern.search(s.lower())] if keyword else []
+    filtered = []
+    for release in releases:
+        assets = release.get("assets") or []
+        if pattern:
+            matching = [asset for asset in assets if keyword_owns(asset.get("name") or "", pattern, rivals)]
+            if not matching:
+                titles = f"{release.get('tag_name') or ''} {release.get('name') or ''}"
+                if not keyword_owns(titles, pattern, rivals):
+                    continue
+                matching = assets
+        else:
+            matching = assets
+        matching = prefer_abi(matching, preference) if preference else matching
+        if len(matching) == len(assets):
+            filtered.append(release)
+        else:
+            filtered.append(dict(release, assets=matching))
+    return filtered or None
+
+def asset_total(releases):
+    """(release count, asset count) of a minified release list, for the audit"""
+    if not isinstance(releases, list):
+        return (1, len(releases.get("assets") or []))
+    return (len(releases), sum(len(release.get("assets") or []) for release in releases))
+
+def load_json_state(path, default):
+    """Load a JSON state file, falling back to default if missing or corrupt."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+def save_json_state(path, data):
+    """Atomically write a JSON state file (temp file + rename)."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, separators=(',', ':'))
+    os.replace(tmp_path, path)
+
+def file_sha256(path):
+    """SHA-256 of a file on disk, or None if it does not exist."""
+    try:
+        with open(path, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except OSError:
+        return None
+
+def write_if_changed(path, payload):
+    """Write bytes to path unless the file already holds identical content. Returns True if written."""
+    if file_sha256(path) == hashlib.sha256(payload).hexdigest():
+        return False
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(payload)
+    os.replace(tmp_path, path)
+    return True
+
+def shard_path(identifier):
+    """Relative shard path (mirrors/<c1>/<c2>/<name>.json) for an app's package name (or id), or None."""
+    if not identifier:
+        return None
+    identifier = identifier.lower().strip()
+    safe_name = "".join([c for c in identifier if c.isalnum() or c in "._-"])
+    char1 = safe_name[0] if len(safe_name) > 0 else "_"
+    char2 = safe_name[1] if len(safe_name) > 1 else "_"
+    return os.path.normpath(os.path.join(MIRRORS_DIR, char1, char2, f"{safe_name}.json"))
+
+def sync_shards(shards):
+    """
+    INCREMENTAL SHARD SYNC
+    ----------------------
+    `shards` maps shard .json path -> (app_ids, release data). Each shard is
+    written in every configured shard_codec variant. Only files whose
+    content moved are rewritten, and only orphaned files are deleted.
+    Returns the change manifest (added/changed/removed app IDs).
+    """
+    previous = load_json_state(SHARD_INDEX_FILE, {})
+    index = {}
+    changes = {"added": [], "changed": [], "removed": []}
+    expected = set()
+
+    for path, (app_ids, data) in shards.items():
+        # Change detection always hashes the canonical JSON form
+        digest = hashlib.sha256(shard_codec.encode(data, "json")).hexdigest()
+        disk_hash = file_sha256(path)
+        for app_id in app_ids:
+            # Prefer the recorded hash; fall back to what is on disk (first run)
+            old = previous.get(app_id, {})
+            old_hash = old.get("sha256") if old.get("path") == path else disk_hash
+            if old_hash is None:
+                changes["added"].append(app_id)
+            elif old_hash != digest:
+                changes["changed"].append(app_id)
+            index[app_id] = {"path": path, "sha256": digest}
+        base = path[:-len(".json")]
+        for suffix, payload in shard_codec.encode_variants(data).items():
+            expected.add(base + suffix)
+            write_if_changed(base + suffix, payload)
+
+    changes["removed"] = sorted(k for k in previous if k not in index)
+
+    # Delete orphaned shards and any directories they leave empty
+    deleted = 0
+    for root, dirs, files in os.walk(MIRRORS_DIR, topdown=False):
+        for name in files:
+            path = os.path.join(root, name)
+            if path not in expected:
+                os.remove(path)
+                deleted += 1
+        if root != MIRRORS_DIR and not os.listdir(root):
+            os.rmdir(root)
+
+    changes["added"].sort()
+    changes["changed"].sort()
+    print(f"   ✅ Shards: +{len(changes['added'])} ~{len(changes['changed'])} -{len(changes['removed'])} ({deleted} orphaned files deleted)")
+
+    try:
+        save_json_state(SHARD_INDEX_FILE, index)
+    except Exception as e:
+        print(f"   ⚠️ Could not save shard index: {e}")
+    return changes
+
+def write_delta_manifests(manifest):
+    """
+    DELTA MANIFESTS
+    ---------------
+    Keeps the last DELTA_KEEP generations of the AppID -> Version manifest
+    and publishes, for each of them, deltas/since_<N>.bin: a msgpack patch
+    {"from": N, "to": seq, "set": {id: version}, "del": [ids]} that brings
+    a client from generation N to the current one. deltas/index.json
+    carries the current sequence and the oldest base still available;
+    clients older than that fall back to the full updates.bin.
+
+    The history (deltas/history.json) must end at the published index's
+    sequence. If it does not, it is dropped: the new generation then has
+    no patches and every client takes the full updates.bin once.
+    Returns the current sequence number.
+    """
+    history = load_json_state(MANIFEST_HISTORY_FILE, [])
+    published = load_json_state(DELTA_INDEX_FILE, {})
+    last_seq = published.get("seq", 0)
+    if history and history[-1]["seq"] != last_seq:
+        print(f"   ⚠️ Manifest history ends at seq {history[-1]['seq']} but deltas/index.json "
+              f"is at {last_seq}: dropping it, no patches this run")
+        history = []
+
+    if history and history[-1]["manifest"] == manifest:
+        seq = last_seq # Nothing moved, keep the current generation
+    else:
+        seq = last_seq + 1
+        history.append({"seq": seq, "manifest": manifest})
+
+    # Compaction: the current generation plus DELTA_KEEP bases
+    history = history[-(DELTA_KEEP + 1):]
+    bases = [h for h in history if h["seq"] != seq]
+
+    # Never publish a sequence that goes backwards or skips one
+    if published and seq not in (last_seq, last_seq + 1):
+        raise ValueError(f"delta seq {seq} does not follow published seq {last_seq}")
+
+    os.makedirs(DELTAS_DIR, exist_ok=True)
+    keep = {os.path.basename(DELTA_INDEX_FILE), os.path.basename(MANIFEST_HISTORY_FILE)}
+    for base in bases:
+        old = base["manifest"]
+        patch = {
+            "from": base["seq"],
+            "to": seq,
+            "set": {k: v for k, v in manifest.items() if old.get(k) != v},
+            "del": sorted(k for k in old if k not in manifest)
+        }
+        name = f"since_{base['seq']}.bin"
+        write_if_changed(os.path.join(DELTAS_DIR, name), msgpack.packb(patch))
+        keep.add(name)
+
+    for name in os.listdir(DELTAS_DIR):
+        if name not in keep:
+            os.remove(os.path.join(DELTAS_DIR, name))
+
+    index = {"seq": seq, "min_seq": bases[0]["seq"] if bases else seq}
+    write_if_changed(DELTA_INDEX_FILE, json.dumps(index, separators=(',', ':')).encode("utf-8"))
+    save_json_state(MANIFEST_HISTORY_FILE, history)
+    print(f"   ✅ Delta manifests: seq {seq}, {len(bases)} patch file(s)")
+    return seq
+
+# fetch_repo result for a GitHub request refused by the rate limiter
+RATE_LIMITED = "rate_limited"
+
+def fetch_repo(repo_path, s_type, s_domain, gh_headers, cached=None, budget=None, per_page=20):
+    """
+    Fetch and minify the newest `per_page` releases of one repository.
+
+    `cached` is the previous http_cache entry for this repo. Its validators
+    are sent as If-None-Match / If-Modified-Since; a 304 reuses the cached
+    minified releases. Returns a cache entry dict, or None on failure.
+
+    GitHub responses feed `budget`; a rate-limited answer returns
+    RATE_LIMITED so the scheduler can retry the repo later.
+    """
+    print(f"⬇️ Fetching {s_type.title()}: {repo_path}...")
+
+    headers = dict(gh_headers) if s_type == 'github' else {}
+    if cached:
+        if cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        if cached.get("last_modified"):
+            headers["If-Modified-Since"] = cached["last_modified"]
+    
+    try:
+        if s_type == 'github':
+            url = f"https://api.github.com/repos/{repo_path}/releases?per_page={per_page}"
+        else:
+            encoded_path = urllib.parse.quote(repo_path, safe='')
+            url = f"https://{s_domain}/api/v4/projects/{encoded_path}/releases?per_page={per_page}"
+
+        # GitHub limits are handled by RateBudget (sleep or defer), not by the client sleeping in this worker
+        r = http_client.get_session().get(url, headers=headers, timeout=20,
+                                          wait_for_rate_limit=budget is None or s_type != 'github')
+        if budget is not None and s_type == 'github':
+            budget.observe(r)
+            if rate_budget.is_rate_limited(r):
+                print(f"   ⏳ Rate limited, deferring {repo_path}")
+                return RATE_LIMITED
+
+        if r.status_code == 304 and cached:
+            print(f"   ♻️ Not modified: {repo_path}")
+            return cached
+        if r.status_code == 200:
+            data = r.json()
+            return {
+                "etag": r.headers.get("ETag"),
+                "last_modified": r.headers.get("Last-Modified"),
+                "releases": minify_payload(data) if data else data
+            }
+
+        if s_type == 'github' and r.status_code == 404:
+            print(f"   ⚠️ Repo not found: {repo_path}")
+            return None
+        if s_type == 'github' and r.status_code == 403:
+            print(f"   ⚠️ Rate limit exceeded for {repo_path}")
+        elif s_type == 'gitlab':
+            print(f"   ⚠️ GitLab Error {r.status_code}: {repo_path}")
+
+    except Exception as e:
+        print(f"   ❌ Network Error: {e}")
+
+    # Transient failure: keep the app alive with the last known releases
+    if cached:
+        print(f"   ♻️ Serving cached releases for {repo_path}")
+        return cached
+    return None
+
+def graphql_to_rest(node):
+    """Map a GraphQL Release node onto the REST fields minify_release reads."""
+    return {
+        "tag_name": node.get("tagName"),
+        "name": node.get("name"),
+        "prerelease": node.get("isPrerelease", False),
+        "published_at": node.get("publishedAt"),
+        "html_url": node.get("url"),
+        "assets": [{
+            "name": asset.get("name"),
+            "size": asset.get("size"),
+            "browser_download_url": asset.get("downloadUrl"),
+            "content_type": asset.get("contentType"),
+            "download_count": asset.get("downloadCount")
+        } for asset in node["releaseAssets"]["nodes"]]
+    }
+
+def fetch_github_graphql(repos, gh_headers, budget=None, http_cache=None, shared=()):
+    """
+    GRAPHQL BATCH FETCHER
+    ---------------------
+    Fetches releases for many GitHub repos per request using aliased
+    `repository(...)` fields. Returns a dict of unique_key -> cache entry
+    for every repo the batch answered completely; anything missing (not
+    found, >100 assets, failed batch) is left for the REST fallback.
+
+    GraphQL has no validators of its own. When the releases match the
+    `http_cache` entry, its REST ETag/Last-Modified are kept so the next
+    REST fetch of the repo can still be conditional.
+
+    Repos in `shared` are left to REST, which fetches them deeper.
+    """
+    http_cache = http_cache if http_cache is not None else {}
+    candidates = [(u_key, repo_path) for u_key, repo_path, s_type, _ in repos
+                  if s_type == 'github' and len(repo_path.split("/")) == 2 and u_key not in shared]
+    results = {}
+    requests_made = 0
+
+    for start in range(0, len(candidates), GRAPHQL_BATCH_SIZE):
+        batch = candidates[start:start + GRAPHQL_BATCH_SIZE]
+        fields = []
+        for i, (_, repo_path) in enumerate(batch):
+            owner, name = repo_path.split("/")
+            fields.append(f"r{i}: repository(owner: {json.dumps(owner)}, name: {json.dumps(name)}) {{{GRAPHQL_RELEASE_QUERY}\n}}")
+        query = "query {\n" + "\n".join(fields) + "\n}"
+
+        try:
+            r = http_client.get_session().post(GRAPHQL_URL, json={"query": query}, headers=gh_headers, timeout=60,
+                                               wait_for_rate_limit=False)
+            requests_made += 1
+            if budget is not None:
+                budget.observe(r)
+            if r.status_code != 200:
+                print(f"   ⚠️ GraphQL batch failed ({r.status_code}), falling back to REST")
+                continue
+            data = r.json().get("data") or {}
+        except Exception as e:
+            print(f"   ❌ GraphQL Network Error: {e}")
+            continue
+
+        for i, (u_key, repo_path) in enumerate(batch):
+            repo = data.get(f"r{i}")
+            if not repo or u_key in results:
+                continue
+            nodes = [n for n in repo["releases"]["nodes"] if n and not n.get("isDraft")]
+            if any(n["releaseAssets"]["pageInfo"]["hasNextPage"] for n in nodes):
+                continue # Truncated asset list, let REST return the full set
+            releases = [graphql_to_rest(n) for n in nodes]
+            releases = minify_payload(releases) if releases else releases
+            cached = http_cache.get(u_key) or {}
+            unchanged = cached.get("releases") == releases
+            results[u_key] = {
+                "etag": cached.get("etag") if unchanged else None,
+                "last_modified": cached.get("last_modified") if unchanged else None,
+                "releases": releases
+            }
+
+    print(f"   🧬 GraphQL: {len(results)}/{len(candidates)} GitHub repos in {requests_made} requests")
+    return results
+
+def fetch_all_repos(repos, gh_headers, http_cache, use_graphql=False, budget=None, stats=None, shared=()):
+    """
+    CONCURRENT FETCH ENGINE
+    -----------------------
+    Runs fetch_repo over a thread pool. A semaphore per API host keeps
+    api.github.com and every GitLab domain under its own in-flight cap.
+    Returns a dict of unique_key -> cache entry (failures omitted).
+
+    With use_graphql, GitHub repos are batched through GraphQL first and
+    only the repos it could not answer go through the REST pool. Repos in
+    `shared` (several apps told apart by releaseKeyword) skip GraphQL and
+    fetch SHARED_REPO_RELEASES releases instead of 20.
+
+    GitHub REST requests are scheduled against the rate budget: repos
+    without a cached copy go first, then the ones that release most often
+    (from `stats`). When the budget runs low the scheduler sleeps until
+    the reset or defers the repo; deferred and rate-limited repos get a
+    second pass before the run ends, and whatever is still unanswered
+    falls back to its cached releases.
+    """
+    budget = budget if budget is not None else rate_budget.RateBudget()
+    stats = stats if stats is not None else {}
+    results = fetch_github_graphql(repos, gh_headers, budget, http_cache, shared) if use_graphql else {}
+
+    host_slots = {}
+    host_lock = threading.Lock()
+
+    def host_slot(s_type, s_domain):
+        host = "api.github.com" if s_type == 'github' else s_domain
+        with host_lock:
+            if host not in host_slots:
+                host_slots[host] = threading.Semaphore(HOST_LIMITS.get(host, DEFAULT_HOST_LIMIT))
+            return host_slots[host]
+
+    def task(u_key, repo_path, s_type, s_domain):
+        try:
+            with host_slot(s_type, s_domain):
+                return fetch_repo(repo_path, s_type, s_domain, gh_headers, http_cache.get(u_key), budget,
+                                  SHARED_REPO_RELEASES if u_key in shared else 20)
+        finally:
+            if s_type == 'github':
+                budget.release()
+
+    pending = []
+    seen = set(results)
+    for repo in repos:
+        if repo[0] not in seen:
+            seen.add(repo[0])
+            pending.append(repo)
+    pending.sort(key=lambda repo: repo_stats.priority(stats, repo[0], repo[0] in http_cache))
+
+    def run_pass(pool, batch):
+        """Submit a batch in priority order; returns the repos to try again."""
+        retry = []
+        futures = {}
+        for repo in batch:
+            u_key, repo_path, s_type, s_domain = repo
+            if s_type == 'github' and not budget.acquire():
+                retry.append(repo)
+                continue
+            futures[u_key] = (repo, pool.submit(task, u_key, repo_path, s_type, s_domain))
+        for u_key, (repo, future) in futures.items():
+            entry = future.result()
+            if entry == RATE_LIMITED:
+                retry.append(repo)
+            elif entry is not None:
+                results[u_key] = entry
+        return retry
+
+    with ThreadPoolExecutor(max_workers=max(1, FETCH_WORKERS)) as pool:
+        deferred = run_pass(pool, pending)
+        if deferred:
+            budget.deferred.update(repo[0] for repo in deferred)
+            wait = budget.seconds_to_reset()
+            print(f"   🔁 Retrying {len(deferred)} deferred repo(s) (budget resets in {wait:.0f}s)")
+            deferred = run_pass(pool, deferred)
+            budget.recovered.update(u_key for u_key in budget.deferred if u_key in results)
+
+    for u_key, repo_path, _, _ in deferred:
+        if http_cache.get(u_key):
+            print(f"   ♻️ Serving cached releases for deferred {repo_path}")
+            results[u_key] = http_cache[u_key]
+            budget.stale.add(u_key)
+    return results
+
+def plan_refresh(repos, http_cache, stats, now):
+    """
+    HOT/COLD SPLIT
+    --------------
+    Splits repos into the ones due for a refetch and the ones whose cached
+    releases are carried forward this run (see repo_stats.is_due). Repos
+    without cached releases are always due.
+    Returns (due repos, {unique_key: cache entry} carried forward).
+    """
+    due = []
+    carried = {}
+    for repo in repos:
+        u_key = repo[0]
+        cached = http_cache.get(u_key)
+        if cached and cached.get("releases") and not repo_stats.is_due(stats.get(u_key), now):
+            carried[u_key] = cached
+        else:
+            due.append(repo)
+    return due, carried
+
+def refresh_report(repos, carried, stats, now):
+    """Requests saved by the hot/cold split versus the chance that what we skipped is stale."""
+    if not carried:
+        print(f"🌡️ Refresh: all {len(repos)} repos fetched")
+        return
+    paths = {repo[0]: repo[1] for repo in repos}
+    risks = sorted(((repo_stats.stale_risk(stats.get(u_key), now), u_key) for u_key in carried), reverse=True)
+    expected = sum(risk for risk, _ in risks)
+    oldest = max(now - stats[u_key]["last_checked"] for u_key in carried)
+    print(f"🌡️ Refresh: {len(repos) - len(carried)} due, {len(carried)} carried forward "
+          f"(~{len(carried)} requests saved)")
+    print(f"   Staleness risk: ~{expected:.1f} carried repo(s) expected to have a new release, "
+          f"oldest check {oldest / 3600:.1f}h ago")
+    for risk, u_key in risks[:3]:
+        if risk < 0.05:
+            break
+        print(f"   ⚠️ {paths[u_key]}: {risk:.0%} chance of a missed release")
+
+def generate_mirror(full=False, graphql=True, refresh=REFRESH_MODE):
     # 1. Setup & Cleanup
-    print("🧹 Cleaning mirrors directory...")
-    if os.path.exists(MIRRORS_DIR):
-        shutil.rmtree(MIRRORS_DIR)
-    os.makedirs(MIRRORS_DIR)
+    if full:
+        print("🧹 Cleaning mirrors directory (full rebuild)...")
+        if os.path.exists(MIRRORS_DIR):
+            shutil.rmtree(MIRRORS_DIR)
+    else:
+        print("♻️ Incremental mode: only changed shards will be rewritten.")
+    os.makedirs(MIRRORS_DIR, exist_ok=True)
 
     gh_headers = {}
     if os.environ.get("GH_TOKEN"):
@@ -75,208 +656,220 @@ def generate_mirror():
         return
 
     try:
-        with open(APPS_FILE, "r", encoding="utf-8") as f:
-            apps = json.load(f)
+        # Hot fields only; reuses the cached table while apps.json is unchanged
+        apps = catalog.Catalog.load(APPS_FILE, CATALOG_CACHE_FILE)
     except Exception as e:
         print(f"❌ Error reading apps.json: {e}")
         return
 
     # 2. Fetch Data (Deduplicated)
     repo_cache = {} 
-    unique_repos = set()
-    app_to_repo_map = {} 
 
     print(f"🔍 Analyzing {len(apps)} apps for data sources...")
 
-    for app in apps:
-        repo_key = None
-        source_type = None # 'github' or 'gitlab'
-        domain = "gitlab.com"
-
-        # Logic to determine Repo Key
-        if app.get("githubRepo"):
-            repo_key = app["githubRepo"].replace("https://github.com/", "").strip("/")
-            source_type = 'github'
-        elif app.get("repoUrl") and "github.com" in app["repoUrl"]:
-            parts = app["repoUrl"].split("github.com/")
-            if len(parts) > 1:
-                repo_key = parts[1].split('/')[0] + "/" + parts[1].split('/')[1]
-                repo_key = repo_key.replace(".git", "").strip("/")
-                source_type = 'github'
-        elif app.get("gitlabRepo"):
-            repo_key = app["gitlabRepo"].strip("/")
-            source_type = 'gitlab'
-            domain = app.get("gitlabDomain", "gitlab.com")
-        elif app.get("repoUrl") and "gitlab" in app["repoUrl"]:
-            try:
-                parsed = urllib.parse.urlparse(app["repoUrl"])
-                path_parts = parsed.path.strip("/").split("/")
-                if len(path_parts) >= 2:
-                    repo_key = "/".join(path_parts)
-                    source_type = 'gitlab'
-                    domain = parsed.netloc
-            except: pass
-
-        if repo_key and source_type:
-            unique_key = f"{source_type}::{domain}::{repo_key.lower()}"
-            unique_repos.add((unique_key, repo_key, source_type, domain))
-            app_to_repo_map[app['id']] = unique_key
-
     # 3. Fetching Phase
-    print(f"📡 Detected {len(unique_repos)} unique repositories. Starting fetch & minify...")
+    repo_order = apps.repos()
+    print(f"📡 Detected {len(repo_order)} unique repositories. Starting fetch & minify...")
+
+    http_cache = load_json_state(HTTP_CACHE_FILE, {})
+    stats = repo_stats.load(REPO_STATS_FILE)
+    budget = rate_budget.RateBudget()
+    # GraphQL needs an authenticated token; without one stay on REST
+    use_graphql = graphql and "Authorization" in gh_headers
+    now = time.time()
+    if refresh == "full":
+        due, carried = repo_order, {}
+    else:
+        due, carried = plan_refresh(repo_order, http_cache, stats, now)
+    refresh_report(repo_order, carried, stats, now)
+    if refresh != "full":
+        unseen = sum(1 for repo in due if not stats.get(repo[0]))
+        if unseen:
+            print(f"   ⚠️ {unseen} repo(s) have no release-cadence history yet and are due regardless")
+    shared = {u_key for u_key, records in apps.by_repo.items() if len(records) > 1}
+    fetched = fetch_all_repos(due, gh_headers, http_cache, use_graphql, budget, stats, shared)
+    fetched.update(carried)
 
-    for u_key, repo_path, s_type, s_domain in unique_repos:
+    for u_key, repo_path, s_type, s_domain in repo_order:
         if u_key in repo_cache: continue
 
-        print(f"⬇️ Fetching {s_type.title()}: {repo_path}...")
-        
-        try:
-            data = None
-            if s_type == 'github':
-                url = f"https://api.github.com/repos/{repo_path}/releases?per_page=20"
-                r = requests.get(url, headers=gh_headers)
-                if r.status_code == 200:
-                    data = r.json()
-                elif r.status_code == 404:
-                    print(f"   ⚠️ Repo not found: {repo_path}")
-                elif r.status_code == 403:
-                    print(f"   ⚠️ Rate limit exceeded for {repo_path}")
+        entry = fetched.get(u_key)
+        if entry and entry.get("releases"):
+            # Releases were minified by fetch_repo (or reused from cache on 304)
+            minified_data = entry["releases"]
+            
+            # Check if empty list returned (repo exists but no releases)
+            if not minified_data:
+                print(f"   ⚠️ Repo exists but has NO RELEASES: {repo_path}")
             
-            elif s_type == 'gitlab':
-                encoded_path = urllib.parse.quote(repo_path, safe='')
-                url = f"https://{s_domain}/api/v4/projects/{encoded_path}/releases"
-                r = requests.get(url, timeout=20)
-                if r.status_code == 200:
-                    data = r.json()
-                else:
-                    print(f"   ⚠️ GitLab Error {r.status_code}: {repo_path}")
-
-            if data:
-                # APPLY THIN MIRROR PROTOCOL
-                if isinstance(data, list):
-                    minified_data = [minify_release(r) for r in data]
-                else:
-                    minified_data = minify_release(data)
-                
-                # Check if empty list returned (repo exists but no releases)
-                if not minified_data:
-                    print(f"   ⚠️ Repo exists but has NO RELEASES: {repo_path}")
-                
-                repo_cache[u_key] = minified_data
-                repo_cache[repo_path] = minified_data 
+            repo_cache[u_key] = minified_data
+            repo_cache[repo_path] = minified_data 
 
-        except Exception as e:
-            print(f"   ❌ Network Error: {e}")
+    # Persist validators for the next run (drops repos no longer in apps.json)
+    try:
+        save_json_state(HTTP_CACHE_FILE, fetched)
+    except Exception as e:
+        print(f"⚠️ Could not save HTTP cache: {e}")
+
+    # Learn release cadence for the next run (cache fallbacks and carried repos taught us nothing)
+    for u_key, entry in fetched.items():
+        if u_key not in budget.stale and u_key not in carried:
+            repo_stats.record(stats, u_key, entry.get("releases"), now)
+    try:
+        repo_stats.save(REPO_STATS_FILE, {k: v for k, v in stats.items() if k in fetched or k in http_cache})
+    except Exception as e:
+        print(f"⚠️ Could not save repo stats: {e}")
+
+    # Single pass over the catalog: audit, shard queue and manifest
+    missing = [] # (app, reason)
+    shards = {} # Map: shard path -> (app IDs, release data)
+    manifest = {} # Map: AppID -> Version
+
+    keyword_kept = [] # apps whose releaseKeyword matched nothing new; previous shard reused
+    narrowed = [] # (app, (releases, assets) before, after) for every app whose asset set changed
+    filter_stats = [0, 0] # repo-wide vs per-app release bytes, for apps with a keyword
 
-    # --- NEW: MISSING APPS AUDIT REPORT ---
-    print("\n" + "="*50)
-    print("🕵️  MISSING APPS AUDIT REPORT")
-    print("="*50)
-    
-    missing_count = 0
-    
     for app in apps:
-        app_id = app.get('id', 'unknown')
-        app_name = app.get('name', 'Unknown')
-        unique_key = app_to_repo_map.get(app_id)
-        
-        status = "OK"
-        reason = ""
-        
+        unique_key = app.repo_key
+        releases = repo_cache.get(unique_key) if unique_key else None
+        # releaseKeyword only picks an app out of a repo that several apps share
+        keyword = app.release_keyword if unique_key and len(apps.by_repo[unique_key]) > 1 else None
+        siblings = [other.release_keyword for other in apps.by_repo[unique_key] if other is not app] if keyword else ()
+        keyword_missed = False
+        if releases and (keyword or ABI_PREFERENCE):
+            # Shard and manifest both get only this app's releases and assets
+            selected = filter_releases(releases, keyword, siblings=siblings)
+            previous_path = shard_path(app.package_name or app.id) if selected is None else None
+            if previous_path:
+                # Nothing in the fetched window: keep what the keyword matched in an earlier run
+                previous = load_json_state(previous_path, None)
+                selected = filter_releases(previous, keyword, siblings=siblings) if isinstance(previous, list) else None
+                if selected is not None:
+                    keyword_kept.append(app)
+            if selected is None:
+                # Never fall back to the whole repo: that would be the sibling apps' releases
+                keyword_missed = True
+                releases = None
+            else:
+                if keyword:
+                    filter_stats[0] += len(json.dumps(releases, separators=(',', ':')))
+                    filter_stats[1] += len(json.dumps(selected, separators=(',', ':')))
+                before, after = asset_total(releases), asset_total(selected)
+                if before != after:
+                    narrowed.append((app, before, after))
+                releases = selected
+
+        # Audit
         if not unique_key:
-            status = "MISSING"
-            reason = "Could not parse repoUrl or githubRepo from apps.json"
+            missing.append((app, "Could not parse repoUrl or githubRepo from apps.json"))
+        elif unique_key not in repo_cache and unique_key in budget.deferred:
+            missing.append((app, "Deferred: GitHub rate limit budget ran out and no cached copy exists"))
         elif unique_key not in repo_cache:
-            status = "MISSING"
-            reason = "API Request Failed (404 Not Found, 403 Rate Limit, or Network Error)"
-        elif not repo_cache[unique_key]:
-            status = "MISSING"
-            reason = "Repo fetched successfully, but it has ZERO releases."
-            
-        if status == "MISSING":
-            missing_count += 1
-            print(f"❌ {app_name} (ID: {app_id})")
-            print(f"   Reason: {reason}")
-            print(f"   Target: {app.get('githubRepo') or app.get('repoUrl')}")
-            print("-" * 30)
-
-    if missing_count == 0:
+            missing.append((app, "API Request Failed (404 Not Found, 403 Rate Limit, or Network Error)"))
+        elif keyword_missed:
+            missing.append((app, f"releaseKeyword '{app.release_keyword}' matched no release of the shared repo"))
+        elif not releases:
+            missing.append((app, "Repo fetched successfully, but it has ZERO releases."))
+
+        # Determine latest version for Manifest
+        # Priority: Live Data > Config Data > Fallback
+        live_version = None
+        if releases:
+            # Queue Shard (last app wins if two share a package name)
+            target_file = shard_path(app.package_name or app.id)
+            if target_file:
+                owners = shards[target_file][0] if target_file in shards else []
+                shards[target_file] = (owners + [app.id], releases)
+
+            # Extract Version for Manifest
+            if isinstance(releases, list) and len(releases) > 0:
+                live_version = releases[0].get('tag_name')
+            elif isinstance(releases, dict):
+                live_version = releases.get('tag_name')
+
+        # Fallback to apps.json version if live fetch failed
+        if app.id:
+            manifest[app.id] = live_version if live_version else (app.version or 'Latest')
+
+    # --- MISSING APPS AUDIT REPORT ---
+    print("\n" + "="*50)
+    print("🕵️  MISSING APPS AUDIT REPORT")
+    print("="*50)
+
+    for app, reason in missing:
+        print(f"❌ {app.name or 'Unknown'} (ID: {app.id or 'unknown'})")
+        print(f"   Reason: {reason}")
+        print(f"   Target: {app.target}")
+        print("-" * 30)
+
+    for app in keyword_kept:
+        print(f"♻️ {app.name or 'Unknown'} (ID: {app.id or 'unknown'}): releaseKeyword "
+              f"'{app.release_keyword}' matched none of the fetched releases, kept its previous shard")
+    for app, before, after in narrowed:
+        print(f"🎯 {app.name or 'Unknown'} (ID: {app.id or 'unknown'}): {before[1]} -> {after[1]} assets, "
+              f"{before[0]} -> {after[0]} releases of {app.target}")
+    if filter_stats[0]:
+        print(f"🎯 Keyword filtering: {filter_stats[0] / 1024:.0f} KB of repo releases -> "
+              f"{filter_stats[1] / 1024:.0f} KB per-app ({1 - filter_stats[1] / filter_stats[0]:.0%} smaller shards)")
+
+    if not missing:
         print("✅ PERFECT RUN! All apps accounted for.")
     else:
-        print(f"\n⚠️  TOTAL MISSING: {missing_count}/{len(apps)}")
+        print(f"\n⚠️  TOTAL MISSING: {len(missing)}/{len(apps)}")
         print("   Apps listed above will display 'Varies' or 'Latest' in the store.")
         print("   Action: Check repo URLs, verify Releases exist, or check GitHub Status.")
+    budget.report()
     print("="*50 + "\n")
     # --------------------------------------
 
     # 4. Generate Monolithic File (Legacy)
     print("💾 Saving legacy mirror.json...")
     legacy_data = {k: v for k, v in repo_cache.items() if "::" not in k and v} 
+    mirror_changed = False
     try:
-        with open(MIRROR_FILE, "w", encoding="utf-8") as f:
-            json.dump(legacy_data, f, indent=None, separators=(',', ':'))
+        payload = json.dumps(legacy_data, indent=None, separators=(',', ':')).encode("utf-8")
+        mirror_changed = write_if_changed(MIRROR_FILE, payload)
     except Exception as e:
         print(f"❌ Error writing mirror.json: {e}")
 
-    # 5. Generate Atomic Shards
+    # 5. Write Atomic Shards
     print("⚛️ Generating Atomic Shards...")
-    shard_count = 0
-    
-    # 6. Generate Binary Manifest (The Nuclear Option)
-    print("☢️ Generating Binary Manifest...")
-    manifest = {} # Map: AppID -> Version
-    
-    for app in apps:
-        app_id = app.get('id')
-        
-        # --- Shard Generation Logic ---
-        unique_key = app_to_repo_map.get(app_id)
-        
-        # Determine latest version for Manifest
-        # Priority: Live Data > Config Data > Fallback
-        live_version = None
-        if unique_key and unique_key in repo_cache and repo_cache[unique_key]:
-            cached_data = repo_cache[unique_key]
-            # Write Shard
-            identifier = app.get('packageName') or app.get('id')
-            if identifier:
-                identifier = identifier.lower().strip()
-                safe_name = "".join([c for c in identifier if c.isalnum() or c in "._-"])
-                char1 = safe_name[0] if len(safe_name) > 0 else "_"
-                char2 = safe_name[1] if len(safe_name) > 1 else "_"
-                
-                target_dir = os.path.join(MIRRORS_DIR, char1, char2)
-                os.makedirs(target_dir, exist_ok=True)
-                target_file = os.path.join(target_dir, f"{safe_name}.json")
-                
-                try:
-                    with open(target_file, "w", encoding="utf-8") as f:
-                        json.dump(cached_data, f, separators=(',', ':'))
-                    shard_count += 1
-                except: pass
-
-            # Extract Version for Manifest
-            if isinstance(cached_data, list) and len(cached_data) > 0:
-                live_version = cached_data[0].get('tag_name')
-            elif isinstance(cached_data, dict):
-                live_version = cached_data.get('tag_name')
+    changes = sync_shards(shards)
 
-        # Fallback to apps.json version if live fetch failed
-        final_version = live_version if live_version else app.get('version', 'Latest')
-        
-        if app_id:
-            manifest[app_id] = final_version
-
-    # Write Binary Manifest
+    # 6. Write Binary Manifest (The Nuclear Option)
+    print("☢️ Generating Binary Manifest...")
+    manifest_changed = False
     try:
-        with open(BINARY_MANIFEST_FILE, "wb") as f:
-            f.write(msgpack.packb(manifest))
+        manifest_changed = write_if_changed(BINARY_MANIFEST_FILE, msgpack.packb(manifest))
         print(f"   ✅ Saved {BINARY_MANIFEST_FILE} ({len(manifest)} entries)")
     except Exception as e:
         print(f"   ❌ Failed to write binary manifest: {e}")
 
+    delta_seq = None
+    try:
+        delta_seq = write_delta_manifests(manifest)
+    except Exception as e:
+        print(f"   ❌ Failed to write delta manifests: {e}")
+
+    # Change Manifest (tells the publish step what moved)
+    changes["mirror_json"] = mirror_changed
+    changes["updates_bin"] = manifest_changed
+    changes["delta_seq"] = delta_seq
+    try:
+        with open(CHANGES_FILE, "w", encoding="utf-8") as f:
+            json.dump(changes, f, indent=2)
+    except Exception as e:
+        print(f"   ❌ Failed to write change manifest: {e}")
+
     print("--------------------------------")
-    print(f"🎉 Success! Generated {shard_count} thin shards + 1 binary manifest.")
+    http_client.report()
+    print(f"🎉 Success! Generated {len(shards)} thin shards + 1 binary manifest.")
 
 if __name__ == "__main__":
-    generate_mirror()
+    parser = argparse.ArgumentParser(description="Orion Store mirror generator")
+    parser.add_argument("--full", action="store_true", help="Wipe mirrors/ and rebuild every shard")
+    parser.add_argument("--no-graphql", action="store_true", help="Fetch GitHub releases with one REST call per repo")
+    parser.add_argument("--refresh", choices=("hot", "full"), default=REFRESH_MODE,
+                        help="hot: refetch only repos due by release cadence; full: refetch every repo")
+    args = parser.parse_args()
+    generate_mirror(full=args.full, graphql=not args.no_graphql, refresh=args.refresh)
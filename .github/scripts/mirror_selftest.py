@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+Self-test for the mirror generator's state handling. Each case runs in
+its own temporary working directory with stubbed fetches. Needs no
+network.
+
+    python .github/scripts/mirror_selftest.py
+
+Cases:
+  delta-sequence  deltas/ seeded from the previous run keeps the sequence and patches going
+  delta-stale     a history that does not end at the published seq is dropped, not patched against
+  hot-carry       a second hot run carries every recently checked repo forward instead of refetching it
+  graphql-etag    a repo answered by GraphQL still sends If-None-Match on its next REST fetch
+  shared-keyword  two apps in one repo, one keyword a prefix of the other, each get only their own assets
+
+Exits non-zero when any case fails.
+"""
+import contextlib
+import hashlib
+import io
+import json
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+import urllib.parse
+
+import msgpack
+
+import mirror_generator as mg
+import http_client
+
+DAY = 86400
+
+class FakeResponse:
+    def __init__(self, status_code, payload=None, headers=None):
+        self.status_code = status_code
+        self.payload = payload
+        self.headers = headers or {}
+
+    def json(self):
+        return self.payload
+
+class FakeGitHub:
+    """
+    Stands in for the shared HTTP client. Serves `repos` (repo path ->
+    raw REST release list) with an ETag per repo, answers a matching
+    If-None-Match with 304, and records every request.
+    """
+
+    def __init__(self, repos):
+        self.repos = repos
+        self.requests = [] # (method, url, headers)
+        self.stats = self
+
+    def report(self):
+        pass
+
+    def etag(self, repo_path):
+        return f'"{hashlib.sha256(json.dumps(self.repos[repo_path]).encode()).hexdigest()[:16]}"'
+
+    def get(self, url, headers=None, **kwargs):
+        self.requests.append(("GET", url, dict(headers or {})))
+        parsed = urllib.parse.urlparse(url)
+        repo_path = parsed.path[len("/repos/"):-len("/releases")]
+        if repo_path not in self.repos:
+            return FakeResponse(404)
+        per_page = int(urllib.parse.parse_qs(parsed.query).get("per_page", ["30"])[0])
+        etag = self.etag(repo_path)
+        if (headers or {}).get("If-None-Match") == etag:
+            return FakeResponse(304, headers={"ETag": etag})
+        return FakeResponse(200, self.repos[repo_path][:per_page], {"ETag": etag})
+
+    def post(self, url, json=None, headers=None, **kwargs):
+        """GraphQL: answer every aliased repository(owner, name) field of the query"""
+        self.requests.append(("POST", url, dict(headers or {})))
+        data = {}
+        for alias, owner, name in re.findall(r'(r\d+): repository\(owner: "([^"]+)", name: "([^"]+)"\)', json["query"]):
+            releases = self.repos.get(f"{owner}/{name}")
+            data[alias] = None if releases is None else {"releases": {"nodes": [{
+                "tagName": r["tag_name"], "name": r["name"], "isPrerelease": r["prerelease"], "isDraft": False,
+                "publishedAt": r["published_at"], "url": r["html_url"],
+                "releaseAssets": {"pageInfo": {"hasNextPage": False}, "nodes": [{
+                    "name": a["name"], "size": a["size"], "downloadUrl": a["browser_download_url"],
+                    "contentType": a["content_type"], "downloadCount": a["download_count"]
+                } for a in r["assets"]]}
+            } for r in releases]}}
+        return FakeResponse(200, {"data": data}, {"X-RateLimit-Resource": "graphql"})
+
+    def rest_requests(self):
+        return [r for r in self.requests if r[0] == "GET"]
+
+def github_release(tag, age_days, assets):
+    published = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(time.time() - age_days * DAY))
+    return {"tag_name": tag, "name": tag, "prerelease": False, "published_at": published,
+            "html_url": f"https://github.com/x/y/releases/tag/{tag}",
+            "assets": [{"name": name, "size": 1, "browser_download_url": f"https://example.com/{name}",
+                        "content_type": "application/vnd.android.package-archive", "download_count": 0}
+                       for name in assets]}
+
+def write_apps(apps):
+    with open(mg.APPS_FILE, "w", encoding="utf-8") as f:
+        json.dump(apps, f)
+
+def generate(fake, **kwargs):
+    http_client._shared = fake
+    return run_quietly(mg.generate_mirror, **kwargs)
+
+def run_quietly(fn, *args, **kwargs):
+    """Call fn, showing only the warnings and errors it prints, indented under the case"""
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        result = fn(*args, **kwargs)
+    for line in out.getvalue().splitlines():
+        if "⚠️" in line or "❌" in line:
+            print(f"      {line.strip()}")
+    return result
+
+def read_index():
+    with open(mg.DELTA_INDEX_FILE, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def apply_patch(manifest, name):
+    with open(os.path.join(mg.DELTAS_DIR, name), "rb") as f:
+        patch = msgpack.unpackb(f.read())
+    patched = {k: v for k, v in manifest.items() if k not in patch["del"]}
+    patched.update(patch["set"])
+    return patched
+
+def case_delta_sequence():
+    problems = []
+    manifests = [{"a": "1.0", "b": "2.0"}, {"a": "1.1", "b": "2.0"}, {"a": "1.1", "c": "0.1"}]
+    for expected, manifest in enumerate(manifests, 1):
+        # Every run starts from a fresh checkout seeded with the published deltas/ only
+        published = os.path.abspath("published")
+        if os.path.exists(published):
+            shutil.copytree(published, mg.DELTAS_DIR)
+        seq = run_quietly(mg.write_delta_manifests, manifest)
+        if seq != expected:
+            problems.append(f"run {expected}: seq {seq}")
+        shutil.rmtree(published, ignore_errors=True)
+        shutil.move(mg.DELTAS_DIR, published)
+    shutil.copytree("published", mg.DELTAS_DIR)
+
+    if read_index() != {"seq": 3, "min_seq": 1}:
+        problems.append(f"index is {read_index()}")
+    for base_seq, base in ((1, manifests[0]), (2, manifests[1])):
+        if apply_patch(base, f"since_{base_seq}.bin") != manifests[2]:
+            problems.append(f"since_{base_seq}.bin does not produce the current manifest")
+    if run_quietly(mg.write_delta_manifests, manifests[2]) != 3:
+        problems.append("an unchanged manifest started a new generation")
+    return problems
+
+def case_delta_stale():
+    problems = []
+    os.makedirs(mg.DELTAS_DIR)
+    with open(mg.DELTA_INDEX_FILE, "w", encoding="utf-8") as f:
+        json.dump({"seq": 3, "min_seq": 1}, f)
+    # History from an older run: ends at seq 2, not at the published 3
+    mg.save_json_state(mg.MANIFEST_HISTORY_FILE, [{"seq": 1, "manifest": {"a": "1.0"}},
+                                                 {"seq": 2, "manifest": {"a": "1.1"}}])
+    seq = run_quietly(mg.write_delta_manifests, {"a": "1.2"})
+    if seq != 4:
+        problems.append(f"seq {seq}, expected 4")
+    if read_index() != {"seq": 4, "min_seq": 4}:
+        problems.append(f"index is {read_index()}")
+    patches = [name for name in os.listdir(mg.DELTAS_DIR) if name.startswith("since_")]
+    if patches:
+        problems.append(f"patched against a stale history: {patches}")
+    return problems
+
+def case_hot_carry():
+    problems = []
+    # Releases a month apart: a refresh period far longer than the gap between two runs
+    fake = FakeGitHub({f"owner/app{i}": [github_release(f"v{i}.{n}", 30 * n, [f"app{i}.apk"]) for n in range(4)]
+                       for i in range(3)})
+    write_apps([{"id": f"app{i}", "name": f"App {i}", "githubRepo": f"owner/app{i}"} for i in range(3)])
+
+    generate(fake, graphql=False, refresh="hot")
+    first = len(fake.rest_requests())
+    if first != 3:
+        problems.append(f"first run made {first} requests, expected 3")
+    if not os.path.exists(mg.REPO_STATS_FILE):
+        problems.append("first run saved no repo stats")
+
+    generate(fake, graphql=False, refresh="hot")
+    second = len(fake.rest_requests()) - first
+    if second:
+        problems.append(f"second hot run refetched {second} repo(s) instead of carrying them forward")
+
+    generate(fake, graphql=False, refresh="full")
+    if len(fake.rest_requests()) - first - second != 3:
+        problems.append("full run did not refetch every repo")
+    return problems
+
+def case_graphql_etag():
+    problems = []
+    fake = FakeGitHub({"owner/app": [github_release("v1.1", 10, ["app.apk"]), github_release("v1.0", 40, ["app.apk"])]})
+    write_apps([{"id": "app", "name": "App", "githubRepo": "owner/app"}])
+    os.environ["GH_TOKEN"] = "selftest"
+    try:
+        generate(fake, graphql=False, refresh="full") # REST: learns the ETag
+        generate(fake, graphql=True, refresh="full") # GraphQL answers the repo
+        if not any(method == "POST" for method, _, _ in fake.requests):
+            problems.append("GraphQL was not used")
+        cached = mg.load_json_state(mg.HTTP_CACHE_FILE, {})
+        if not any(entry.get("etag") for entry in cached.values()):
+            problems.append("GraphQL fetch dropped the cached ETag")
+        sent = len(fake.requests)
+        generate(fake, graphql=False, refresh="full") # REST fallback
+        headers = [h for method, _, h in fake.requests[sent:] if method == "GET"]
+        if not headers or headers[0].get("If-None-Match") != fake.etag("owner/app"):
+            problems.append(f"REST fetch after GraphQL sent no If-None-Match: {headers}")
+    finally:
+        del os.environ["GH_TOKEN"]
+    return problems
+
+def read_shard(identifier):
+    return mg.load_json_state(mg.shard_path(identifier), None)
+
+def shard_assets(identifier):
+    return sorted({a["name"] for r in read_shard(identifier) or [] for a in r["assets"]})
+
+def case_shared_keyword():
+    problems = []
+    # 30 releases: the 25 newest are YouTube Music only, YouTube's last build is 26th
+    releases = [github_release(f"music-{n}", n, [f"youtube-music-v{n}.apk"]) for n in range(25)]
+    releases.append(github_release("builds-25", 25, ["youtube-v25.apk", "youtube-music-v25.apk", "tiktok-v25.apk"]))
+    releases += [github_release(f"old-{n}", n, [f"youtube-v{n}.apk"]) for n in range(26, 30)]
+    fake = FakeGitHub({"owner/builds": releases})
+    write_apps([
+        {"id": "yt", "name": "YouTube", "githubRepo": "owner/builds", "releaseKeyword": "youtube", "packageName": "com.yt"},
+        {"id": "ytm", "name": "YouTube Music", "githubRepo": "owner/builds", "releaseKeyword": "Youtube-Music",
+         "packageName": "com.ytm"},
+        {"id": "cake", "name": "Cake", "githubRepo": "owner/builds", "releaseKeyword": "cake", "packageName": "com.cake"},
+    ])
+
+    generate(fake, graphql=False, refresh="full")
+    url = fake.rest_requests()[0][1]
+    if f"per_page={mg.SHARED_REPO_RELEASES}" not in url:
+        problems.append(f"shared repo fetched with {url}")
+    if shard_assets("com.yt") != ["youtube-v25.apk", "youtube-v26.apk", "youtube-v27.apk", "youtube-v28.apk",
+                                  "youtube-v29.apk"]:
+        problems.append(f"YouTube shard holds {shard_assets('com.yt')}")
+    if any(not name.startswith("youtube-music-") for name in shard_assets("com.ytm")):
+        problems.append(f"YouTube Music shard holds {shard_assets('com.ytm')}")
+    with open(mg.BINARY_MANIFEST_FILE, "rb") as f:
+        manifest = msgpack.unpackb(f.read())
+    if manifest.get("yt") != "builds-25" or manifest.get("ytm") != "music-0":
+        problems.append(f"manifest versions {manifest}")
+    if read_shard("com.cake") is not None:
+        problems.append("a keyword that matched nothing was served the whole repo")
+
+    # YouTube's builds fall out of the fetched window: its previous shard is kept
+    fake.repos["owner/builds"] = releases[:10]
+    generate(fake, graphql=False, refresh="full")
+    if shard_assets("com.yt") != ["youtube-v25.apk", "youtube-v26.apk", "youtube-v27.apk", "youtube-v28.apk",
+                                  "youtube-v29.apk"]:
+        problems.append(f"YouTube shard not kept once out of the window: {shard_assets('com.yt')}")
+    return problems
+
+CASES = [
+    ("delta-sequence", case_delta_sequence),
+    ("delta-stale", case_delta_stale),
+    ("hot-carry", case_hot_carry),
+    ("graphql-etag", case_graphql_etag),
+    ("shared-keyword", case_shared_keyword),
+]
+
+def main():
+    failures = 0
+    for name, case in CASES:
+        work_dir = tempfile.mkdtemp(prefix="mirror-selftest-")
+        cwd = os.getcwd()
+        os.chdir(work_dir)
+        print(f"\n🧪 Case {name}")
+        try:
+            problems = case()
+        except Exception as e:
+            problems = [f"raised {e!r}"]
+        finally:
+            http_client._shared = None
+            os.chdir(cwd)
+            shutil.rmtree(work_dir, ignore_errors=True)
+        failures += bool(problems)
+        for problem in problems:
+            print(f"❌ {name}: {problem}")
+        if not problems:
+            print(f"✅ {name}: passed")
+
+    print(f"\n{'❌' if failures else '✅'} {len(CASES) - failures}/{len(CASES)} mirror cases passed")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,131 @@
+"""
+ORION GITHUB RATE BUDGET
+------------------------
+Tracks the GitHub API budget from the X-RateLimit-* headers of every
+response and gates REST requests on it, so the mirror generator can
+sleep until the window resets (when that's soon) or defer a repo instead
+of burning requests into 403s.
+
+Each bucket (X-RateLimit-Resource: core, graphql, ...) is tracked
+separately. Requests already in flight are counted against the
+remaining budget until their response updates it.
+
+Rate-limited responses are handled here rather than by the HTTP client
+(callers pass wait_for_rate_limit=False): an exhausted bucket waits for
+its reset, and a secondary limit's Retry-After blocks the bucket for
+that long. Both sleeps come out of the same MAX_WAIT and show up in
+report().
+"""
+import os
+import threading
+import time
+
+RESERVE = int(os.environ.get("MIRROR_RATE_RESERVE", "5")) # Requests kept back for other jobs on the token
+MAX_WAIT = int(os.environ.get("MIRROR_RATE_MAX_WAIT", "300")) # Longest total sleep for a reset per run
+
+def is_rate_limited(response):
+    """True for a primary (remaining 0) or secondary (Retry-After) GitHub limit."""
+    if response.status_code not in (403, 429):
+        return False
+    return response.headers.get("X-RateLimit-Remaining") == "0" or "Retry-After" in response.headers
+
+class RateBudget:
+    def __init__(self, reserve=RESERVE, max_wait=MAX_WAIT):
+        self.reserve = reserve
+        self.max_wait = max_wait
+        self.lock = threading.Lock()
+        self.buckets = {} # resource -> {"limit", "remaining", "reset", "used"}
+        self.blocked_until = {} # resource -> epoch seconds, from a secondary limit's Retry-After
+        self.inflight = 0
+        self.waited = 0.0
+        self.requests = 0
+        self.not_modified = 0
+        self.rate_limited = 0
+        self.deferred = set()
+        self.recovered = set()
+        self.stale = set()
+
+    def observe(self, response):
+        """Update the budget from a GitHub API response."""
+        headers = response.headers
+        resource = headers.get("X-RateLimit-Resource", "core")
+        with self.lock:
+            self.requests += 1
+            if response.status_code == 304:
+                self.not_modified += 1
+            if is_rate_limited(response):
+                self.rate_limited += 1
+                retry_after = headers.get("Retry-After", "")
+                if retry_after.isdigit():
+                    until = time.time() + int(retry_after)
+                    self.blocked_until[resource] = max(until, self.blocked_until.get(resource, 0))
+            remaining = headers.get("X-RateLimit-Remaining", "")
+            if not remaining.isdigit():
+                return
+            bucket = self.buckets.setdefault(resource, {"used": 0, "reset": 0, "remaining": int(remaining)})
+            # Conditional requests answered with 304 (and refused ones) are not charged
+            bucket["used"] += response.status_code != 304 and not is_rate_limited(response)
+            reset = int(headers.get("X-RateLimit-Reset", "0") or 0)
+            # Responses arrive out of order: keep the lowest count of the newest window
+            if reset > bucket["reset"] or int(remaining) < bucket["remaining"]:
+                bucket["remaining"] = int(remaining)
+            bucket["reset"] = max(reset, bucket["reset"])
+            bucket["limit"] = int(headers.get("X-RateLimit-Limit", "0") or 0)
+
+    def acquire(self, resource="core"):
+        """
+        Reserve one request. Sleeps until the window resets (or a secondary
+        limit's Retry-After passes) when the budget is at the reserve and
+        the wait fits in what is left of MAX_WAIT; returns False (defer the
+        request) otherwise.
+        """
+        while True:
+            with self.lock:
+                bucket = self.buckets.get(resource)
+                blocked = self.blocked_until.get(resource, 0) - time.time()
+                if blocked > 0:
+                    wait = blocked
+                elif bucket is None and not self.inflight:
+                    # Budget unknown: send one probe and read the headers first
+                    self.inflight += 1
+                    return True
+                elif bucket is not None and bucket["remaining"] - self.inflight > self.reserve:
+                    self.inflight += 1
+                    return True
+                elif self.inflight or bucket is None:
+                    wait = None # Responses in flight will refresh the numbers
+                else:
+                    wait = bucket["reset"] - time.time() + 1
+            if wait is None:
+                time.sleep(0.2)
+                continue
+            if wait > self.max_wait - self.waited:
+                return False
+            if blocked > 0:
+                print(f"   ⏳ GitHub secondary rate limit, sleeping {wait:.0f}s (Retry-After)")
+            else:
+                print(f"   ⏳ GitHub budget at {bucket['remaining']}, sleeping {wait:.0f}s until reset")
+            time.sleep(max(0.0, wait))
+            with self.lock:
+                self.waited += max(0.0, wait)
+                if blocked <= 0:
+                    bucket["remaining"] = bucket.get("limit") or bucket["remaining"]
+
+    def release(self):
+        """Mark a reserved request as answered (or failed)."""
+        with self.lock:
+            self.inflight -= 1
+
+    def seconds_to_reset(self, resource="core"):
+        bucket = self.buckets.get(resource)
+        return max(0.0, bucket["reset"] - time.time()) if bucket and bucket.get("reset") else 0.0
+
+    def report(self):
+        print(f"📊 GitHub API budget: {self.requests} requests ({self.not_modified} not modified, "
+              f"{self.rate_limited} rate limited), slept {self.waited:.0f}s")
+        for resource, bucket in sorted(self.buckets.items()):
+            reset = time.strftime("%H:%M:%S", time.gmtime(bucket["reset"])) if bucket.get("reset") else "?"
+            print(f"   {resource:<8} used {bucket['used']}, {bucket['remaining']}/{bucket['limit']} left, resets {reset} UTC")
+        if self.deferred:
+            print(f"   Deferred {len(self.deferred)} repo(s): {len(self.recovered)} recovered on retry, "
+                  f"{len(self.stale)} served from cache")
@@ -0,0 +1,134 @@
+"""
+ORION REPO STATS
+----------------
+Per-repository release history learned across mirror runs, persisted in
+the mirror cache directory. Used to fetch the repos most likely to have
+something new first when the API budget is tight, and to skip repos that
+are not due for a refresh (see is_due).
+
+  runs         runs in which the repo answered
+  changes      runs in which its newest tag differed from the previous run
+  last_tag     newest tag seen
+  last_change  when the newest tag was published (or first seen), epoch seconds
+  interval     typical seconds between releases: median gap between recent
+               release dates, else the time between detected changes
+  last_checked when the repo last answered, epoch seconds
+"""
+import datetime
+import json
+import math
+import os
+
+# Adaptive refresh: a repo is due once a fraction of its release interval has
+# passed since the last check, clamped to [MIN_REFRESH, MAX_REFRESH]
+REFRESH_FRACTION = float(os.environ.get("MIRROR_REFRESH_FRACTION", "0.25"))
+MIN_REFRESH = float(os.environ.get("MIRROR_MIN_REFRESH_H", "0")) * 3600
+MAX_REFRESH = float(os.environ.get("MIRROR_MAX_REFRESH_H", "72")) * 3600
+INTERVAL_RELEASES = 10 # Recent releases used to estimate the interval
+
+def load(path):
+    """Stats saved by an earlier run. Logs when there are none: every repo then counts as unseen."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        print(f"⚠️ No repo stats at {path}: priorities and refresh cadence start without history")
+    except (OSError, ValueError) as e:
+        print(f"⚠️ Unreadable repo stats at {path} ({e}): priorities and refresh cadence start without history")
+    return {}
+
+def save(path, stats):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(stats, f, separators=(',', ':'), sort_keys=True)
+    os.replace(tmp_path, path)
+
+def newest_tag(releases):
+    if isinstance(releases, list) and releases:
+        return releases[0].get("tag_name")
+    return None
+
+def parse_time(value):
+    """ISO 8601 timestamp from a GitHub/GitLab release -> epoch seconds (or None)."""
+    if not value:
+        return None
+    try:
+        return datetime.datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+def release_times(releases):
+    """Publish times of the most recent releases, newest first."""
+    if not isinstance(releases, list):
+        return []
+    times = [t for t in (parse_time(r.get("published_at")) for r in releases if isinstance(r, dict)) if t]
+    return sorted(times, reverse=True)[:INTERVAL_RELEASES]
+
+def median_gap(times):
+    gaps = sorted(a - b for a, b in zip(times, times[1:]) if a > b)
+    return gaps[len(gaps) // 2] if gaps else None
+
+def record(stats, u_key, releases, now):
+    """Fold one successful fetch at time `now` into the stats for u_key."""
+    entry = stats.setdefault(u_key, {"runs": 0, "changes": 0, "last_tag": None})
+    tag = newest_tag(releases)
+    times = release_times(releases)
+    if entry["runs"] and tag != entry["last_tag"]:
+        entry["changes"] += 1
+        previous = entry.get("last_change")
+        changed_at = times[0] if times else now
+        if entry.get("interval") is None and previous and changed_at > previous:
+            entry["interval"] = changed_at - previous
+        entry["last_change"] = changed_at
+    elif entry.get("last_change") is None:
+        entry["last_change"] = times[0] if times else now
+    gap = median_gap(times)
+    if gap:
+        entry["interval"] = gap
+    entry["runs"] += 1
+    entry["last_tag"] = tag
+    entry["last_checked"] = now
+
+def expected_interval(entry, now):
+    """
+    Release interval to plan with. Without a measured one, a repo that has
+    been quiet for N seconds is assumed to release about every N seconds.
+    """
+    if entry.get("interval"):
+        return entry["interval"]
+    if entry.get("last_change"):
+        return max(0.0, now - entry["last_change"])
+    return 0.0
+
+def refresh_period(entry, now):
+    period = expected_interval(entry, now) * REFRESH_FRACTION
+    return min(max(period, MIN_REFRESH), MAX_REFRESH)
+
+def is_due(entry, now):
+    """True when the repo should be refetched this run (unknown repos always are)."""
+    if not entry or not entry.get("last_checked"):
+        return True
+    return now - entry["last_checked"] >= refresh_period(entry, now)
+
+def stale_risk(entry, now):
+    """
+    Probability that a release was published since the last check, treating
+    releases as a Poisson process with the repo's expected interval.
+    """
+    if not entry or not entry.get("last_checked"):
+        return 1.0
+    interval = expected_interval(entry, now)
+    if interval <= 0:
+        return 1.0
+    return 1.0 - math.exp(-max(0.0, now - entry["last_checked"]) / interval)
+
+def priority(stats, u_key, cached):
+    """
+    Sort key, lowest first: repos without a cached copy (they would go
+    missing), then the ones that change most often.
+    """
+    entry = stats.get(u_key) or {"runs": 0, "changes": 0}
+    # Laplace-smoothed, so an unseen repo ranks between hot and dormant ones
+    change_rate = (entry["changes"] + 1) / (entry["runs"] + 2)
+    return (cached, -change_rate)
@@ -0,0 +1,120 @@
+"""
+ORION SENTINEL PREFILTER
+------------------------
+Bloom filter over every Sentinel signature. Clients check a hash against
+this small file first and only fetch the matching shard on a positive,
+so the (overwhelmingly common) clean lookup costs no shard download.
+
+File layout (sentinel/filter.bin, little-endian):
+  [0:3]    magic b"OSB"
+  [3]      format version
+  [4:8]    uint32 k (hash functions)
+  [8:16]   uint64 m (bits)
+  [16:24]  uint64 n (signatures inserted)
+  [24:]    ceil(m / 8) bytes of bit array, bit i = byte[i >> 3] & (1 << (i & 7))
+
+SHA-256 digests are already uniformly distributed, so bit positions come
+straight from the digest (double hashing over two 64-bit words) instead
+of rehashing: pos_i = (h1 + i * h2) mod m.
+"""
+import math
+import os
+import struct
+import sys
+
+MAGIC = b"OSB"
+VERSION = 1
+HEADER = struct.Struct("<3sBIQQ")
+DEFAULT_FPR = float(os.environ.get("SENTINEL_FILTER_FPR", "0.001"))
+
+def _positions(digest, k, m):
+    h1 = int.from_bytes(digest[0:8], "little")
+    h2 = int.from_bytes(digest[8:16], "little") | 1
+    return [(h1 + i * h2) % m for i in range(k)]
+
+class BloomFilter:
+    def __init__(self, m, k, bits=None, count=0):
+        self.m = m
+        self.k = k
+        self.count = count
+        self.bits = bits if bits is not None else bytearray((m + 7) // 8)
+
+    @classmethod
+    def for_capacity(cls, n, fpr=DEFAULT_FPR):
+        """Size a filter for n items at the target false-positive rate."""
+        n = max(n, 1)
+        m = max(8, int(math.ceil(-n * math.log(fpr) / (math.log(2) ** 2))))
+        k = max(1, int(round(m / n * math.log(2))))
+        return cls(m, k)
+
+    def add(self, digest):
+        bits = self.bits
+        for pos in _positions(digest, self.k, self.m):
+            bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, digest):
+        bits = self.bits
+        for pos in _positions(digest, self.k, self.m):
+            if not bits[pos >> 3] & (1 << (pos & 7)):
+                return False
+        return True
+
+    def might_contain(self, sha256):
+        """True if the hex hash may be listed; False means definitely clean."""
+        return bytes.fromhex(sha256.strip()) in self
+
+    def to_bytes(self):
+        return HEADER.pack(MAGIC, VERSION, self.k, self.m, self.count) + bytes(self.bits)
+
+    @classmethod
+    def from_bytes(cls, payload):
+        magic, version, k, m, count = HEADER.unpack_from(payload, 0)
+        if magic != MAGIC or version > VERSION:
+            raise ValueError(f"Not a Sentinel v{VERSION} filter")
+        return cls(m, k, bytearray(payload[HEADER.size:]), count)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            return cls.from_bytes(f.read())
+
+    def save(self, path):
+        """Write the same bytes as to_bytes() without copying the bit array. Returns the size."""
+        with open(path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, self.k, self.m, self.count))
+            f.write(self.bits)
+        return HEADER.size + len(self.bits)
+
+def build_filter(iter_digests, count, path, fpr=DEFAULT_FPR, probes=100000):
+    """
+    Build and write the filter for `count` 32-byte digests, then report its
+    size, an exact-match check over every member (a Bloom filter must have
+    zero false negatives) and the measured false-positive rate over random
+    digests. `iter_digests` is called twice (insert, verify) and must return
+    a fresh iterator each time, so the member set never has to fit in memory.
+    """
+    bloom = BloomFilter.for_capacity(count, fpr)
+    for d in iter_digests():
+        bloom.add(d)
+    size = bloom.save(path)
+
+    misses = sum(1 for d in iter_digests() if d not in bloom)
+    # A random 256-bit digest colliding with a real member is negligible
+    false_positives = sum(1 for _ in range(probes) if os.urandom(32) in bloom)
+
+    measured = false_positives / probes if probes else 0.0
+    print(f"   🌸 Bloom filter: {path} ({size} bytes, m={bloom.m}, k={bloom.k})")
+    print(f"      Exact-match check: {count - misses}/{count} members found")
+    print(f"      False-positive rate: {measured:.5f} measured vs {fpr:.5f} target ({probes} probes)")
+    if misses:
+        raise RuntimeError(f"Bloom filter lost {misses} members")
+    return {"bytes": size, "m": bloom.m, "k": bloom.k, "fpr": measured}
+
+if __name__ == "__main__":
+    # python sentinel_filter.py <sha256> [filter.bin]
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    bloom = BloomFilter.load(sys.argv[2] if len(sys.argv) > 2 else "sentinel/filter.bin")
+    print("⚠️ Possible match, check the shard" if bloom.might_contain(sys.argv[1]) else "✅ Definitely clean")
@@ -0,0 +1,187 @@
+"""
+ORION SENTINEL BINARY TABLE
+---------------------------
+Compact alternative to the JSON shards: one file per bucket holding
+fixed-width 32-byte raw SHA-256 digests, sorted for binary search.
+
+Bucket file layout (sentinel/bin/shard_<prefix>.bin, little-endian):
+  [0:3]   magic b"OST"
+  [3]     format version
+  [4:8]   uint32 record count N
+  [8:]    N x 32-byte digests (sorted), then N x uint8 label indexes
+
+Label indexes point into sentinel/bin/labels.json; index 0 means "no
+label" (the Archive feed, which the JSON shards store without "n").
+
+SentinelTable memory-maps bucket files on first use and answers lookups
+in O(log n) without parsing the bucket. The bucket prefix length is read
+from sentinel/index.json, which sits one level above the table directory.
+"""
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+
+MAGIC = b"OST"
+VERSION = 1
+HEADER = struct.Struct("<3sBI")
+DIGEST_SIZE = 32
+LABELS_FILE = "labels.json"
+
+def read_prefix_len(sentinel_dir):
+    """Prefix length recorded in sentinel/index.json (1 if there is no index)."""
+    try:
+        with open(os.path.join(sentinel_dir, "index.json")) as f:
+            return json.load(f).get("prefix_len", 1)
+    except (OSError, ValueError):
+        return 1
+
+def write_bucket(out_dir, prefix, records):
+    """
+    Write one binary bucket. `records` is a list of (digest bytes, label
+    index) already sorted by digest. Returns bytes written.
+    """
+    return write_bucket_stream(out_dir, prefix, len(records), lambda: iter(records))
+
+def write_bucket_stream(out_dir, prefix, count, iter_records, chunk_records=4096):
+    """
+    Streaming write_bucket(): `iter_records` is called twice (digests, then
+    labels) and must return a fresh iterator of the `count` sorted
+    (digest, label index) records each time. Returns bytes written.
+    """
+    size = HEADER.size
+    with open(os.path.join(out_dir, f"shard_{prefix}.bin"), "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, count))
+        for column in (0, 1):
+            block = []
+            for record in iter_records():
+                block.append(record[column])
+                if len(block) == chunk_records:
+                    size += f.write(b"".join(block) if column == 0 else bytes(block))
+                    block = []
+            size += f.write(b"".join(block) if column == 0 else bytes(block))
+    if size != HEADER.size + count * (DIGEST_SIZE + 1):
+        raise ValueError(f"shard_{prefix}.bin: expected {count} records")
+    return size
+
+def write_labels(out_dir, labels):
+    """Write the label table (labels[0] must be None)."""
+    with open(os.path.join(out_dir, LABELS_FILE), "w") as f:
+        json.dump(labels, f, separators=(',', ':'))
+
+def write_tables(out_dir, buckets, labels):
+    """
+    Write one binary bucket per prefix.
+    `buckets` maps prefix -> list of (digest bytes, label index); `labels`
+    is the label table (labels[0] must be None). Returns total bytes written.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    total = sum(write_bucket(out_dir, prefix, sorted(records)) for prefix, records in buckets.items())
+    write_labels(out_dir, labels)
+    return total
+
+class SentinelTable:
+    """Read-only lookup over a directory written by write_tables()."""
+
+    def __init__(self, table_dir, prefix_len=None):
+        self.table_dir = table_dir
+        if prefix_len is None:
+            prefix_len = read_prefix_len(os.path.dirname(os.path.abspath(table_dir)))
+        self.prefix_len = prefix_len
+        with open(os.path.join(table_dir, LABELS_FILE)) as f:
+            self.labels = json.load(f)
+        self._maps = {}
+
+    def _bucket(self, prefix):
+        if prefix not in self._maps:
+            path = os.path.join(self.table_dir, f"shard_{prefix}.bin")
+            if not os.path.exists(path) or os.path.getsize(path) <= HEADER.size:
+                self._maps[prefix] = None
+            else:
+                with open(path, "rb") as f:
+                    mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                magic, version, count = HEADER.unpack_from(mm, 0)
+                if magic != MAGIC or version > VERSION:
+                    raise ValueError(f"{path} is not a Sentinel v{VERSION} table")
+                self._maps[prefix] = (mm, count)
+        return self._maps[prefix]
+
+    def lookup(self, sha256):
+        """Return (True, label) if the hash is listed, else (False, None)."""
+        sha256 = sha256.strip().lower()
+        bucket = self._bucket(sha256[:self.prefix_len])
+        if bucket is None:
+            return False, None
+        mm, count = bucket
+        target = bytes.fromhex(sha256)
+        lo, hi = 0, count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            offset = HEADER.size + mid * DIGEST_SIZE
+            probe = mm[offset:offset + DIGEST_SIZE]
+            if probe < target:
+                lo = mid + 1
+            elif probe > target:
+                hi = mid
+            else:
+                label_index = mm[HEADER.size + count * DIGEST_SIZE + mid]
+                return True, self.labels[label_index]
+        return False, None
+
+    def is_malicious(self, sha256):
+        return self.lookup(sha256)[0]
+
+    def close(self):
+        for bucket in self._maps.values():
+            if bucket:
+                bucket[0].close()
+        self._maps = {}
+
+def benchmark(sentinel_dir, table_dir, samples=2000):
+    """Compare on-disk size and per-lookup latency: JSON shard vs binary table."""
+    prefix_len = read_prefix_len(sentinel_dir)
+    json_files = [f for f in os.listdir(sentinel_dir)
+                  if f.startswith("shard_") and f.endswith(".json") and len(f) == len("shard_.json") + prefix_len]
+    bin_files = [f for f in os.listdir(table_dir) if f.endswith(".bin")]
+    json_bytes = sum(os.path.getsize(os.path.join(sentinel_dir, f)) for f in json_files)
+    bin_bytes = sum(os.path.getsize(os.path.join(table_dir, f)) for f in bin_files)
+
+    # Sample known hashes (hits) and flipped ones (almost certainly misses)
+    known = []
+    for name in json_files:
+        with open(os.path.join(sentinel_dir, name)) as f:
+            known += [e["h"] for e in json.load(f)][:samples // 2 - len(known)]
+        if len(known) >= samples // 2:
+            break
+    queries = known + [h[:-1] + ("0" if h[-1] != "0" else "1") for h in known]
+
+    # JSON: a client downloads and parses the whole bucket for one lookup
+    start = time.perf_counter()
+    for h in queries[:50]:
+        with open(os.path.join(sentinel_dir, f"shard_{h[:prefix_len]}.json")) as f:
+            any(e["h"] == h for e in json.load(f))
+    json_lookup = (time.perf_counter() - start) / min(50, len(queries))
+
+    table = SentinelTable(table_dir, prefix_len)
+    start = time.perf_counter()
+    for h in queries:
+        table.is_malicious(h)
+    bin_lookup = (time.perf_counter() - start) / len(queries)
+    table.close()
+
+    print(f"📊 JSON shards:  {json_bytes:>12} bytes, {json_lookup * 1e6:>10.1f} µs/lookup (parse bucket)")
+    print(f"📊 Binary table: {bin_bytes:>12} bytes, {bin_lookup * 1e6:>10.1f} µs/lookup (mmap + bisect)")
+
+if __name__ == "__main__":
+    # python sentinel_table.py lookup <sha256> [table_dir]
+    # python sentinel_table.py bench [sentinel_dir] [table_dir]
+    if len(sys.argv) >= 3 and sys.argv[1] == "lookup":
+        found, label = SentinelTable(sys.argv[3] if len(sys.argv) > 3 else "sentinel/bin").lookup(sys.argv[2])
+        print(f"🚨 MALICIOUS ({label or 'Archive'})" if found else "✅ Clean")
+    elif len(sys.argv) >= 2 and sys.argv[1] == "bench":
+        benchmark(sys.argv[2] if len(sys.argv) > 2 else "sentinel",
+                  sys.argv[3] if len(sys.argv) > 3 else "sentinel/bin")
+    else:
+        print(__doc__)
@@ -0,0 +1,265 @@
+"""
+ORION SHARD CODEC
+-----------------
+Pluggable serialization for the static files served from the data branch
+(mirror shards and Sentinel shards).
+
+Formats:
+  json     Minified JSON, identical to the legacy output.
+  msgpack  4-byte header (b"OSF" + schema version) followed by a msgpack
+           body. Dict keys found in KEY_TABLE are interned to their small
+           integer index, so repeated keys like "browser_download_url"
+           cost one byte each. Integer keys never collide with JSON keys,
+           which are always strings.
+
+Every format can also get precompressed ".gz" / ".br" siblings. Brotli is
+optional and only used when the `brotli` package is installed.
+
+Configure with SHARD_FORMATS (default "json") and SHARD_COMPRESSION
+(default none), e.g. SHARD_FORMATS=json,msgpack SHARD_COMPRESSION=gz,br.
+"""
+import gzip
+import io
+import json
+import os
+import sys
+
+import msgpack
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+SCHEMA_VERSION = 1
+MAGIC = b"OSF"
+
+# Schema v1 key table. Append only: a key's position is its wire ID.
+KEY_TABLE = [
+    "tag_name", "name", "prerelease", "published_at", "html_url", "assets",
+    "size", "browser_download_url", "content_type", "download_count",
+    "link_type", "h", "n",
+]
+KEY_IDS = {key: i for i, key in enumerate(KEY_TABLE)}
+
+EXTENSIONS = {"json": ".json", "msgpack": ".msgpack"}
+
+def _intern(obj):
+    if isinstance(obj, dict):
+        return {KEY_IDS.get(k, k): _intern(v) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [_intern(v) for v in obj]
+    return obj
+
+def _extern(obj):
+    if isinstance(obj, dict):
+        return {(KEY_TABLE[k] if isinstance(k, int) else k): _extern(v) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [_extern(v) for v in obj]
+    return obj
+
+def encode(data, fmt="json"):
+    """Serialize data to bytes in the given format."""
+    if fmt == "json":
+        return json.dumps(data, separators=(',', ':')).encode("utf-8")
+    if fmt == "msgpack":
+        return MAGIC + bytes([SCHEMA_VERSION]) + msgpack.packb(_intern(data))
+    raise ValueError(f"Unknown shard format: {fmt}")
+
+def decode(payload, fmt="json"):
+    """Inverse of encode()."""
+    if fmt == "json":
+        return json.loads(payload.decode("utf-8"))
+    if fmt == "msgpack":
+        if payload[:3] != MAGIC:
+            raise ValueError("Not an Orion msgpack shard (bad magic)")
+        if payload[3] > SCHEMA_VERSION:
+            raise ValueError(f"Unsupported shard schema v{payload[3]}")
+        return _extern(msgpack.unpackb(payload[4:], strict_map_key=False))
+    raise ValueError(f"Unknown shard format: {fmt}")
+
+def compress(payload, method):
+    """Precompress a payload. Output is deterministic (gzip mtime is pinned)."""
+    if method == "gz":
+        # GzipFile rather than gzip.compress, whose header differs across Python versions
+        out = io.BytesIO()
+        with gzip.GzipFile(filename="", mode="wb", fileobj=out, compresslevel=9, mtime=0) as f:
+            f.write(payload)
+        return out.getvalue()
+    if method == "br":
+        return brotli.compress(payload, quality=11)
+    raise ValueError(f"Unknown compression: {method}")
+
+def decompress(payload, method):
+    if method == "gz":
+        return gzip.decompress(payload)
+    if method == "br":
+        return brotli.decompress(payload)
+    raise ValueError(f"Unknown compression: {method}")
+
+def _env_list(name, default):
+    return [v.strip() for v in os.environ.get(name, default).split(",") if v.strip()]
+
+FORMATS = _env_list("SHARD_FORMATS", "json")
+COMPRESSION = _env_list("SHARD_COMPRESSION", "")
+if "br" in COMPRESSION and brotli is None:
+    print("⚠️ brotli not installed, skipping .br shard variants")
+    COMPRESSION = [m for m in COMPRESSION if m != "br"]
+
+def variant_suffixes(formats=None, compression=None):
+    """File suffixes encode_variants() and write_list() produce, in the same order."""
+    formats = FORMATS if formats is None else formats
+    compression = COMPRESSION if compression is None else compression
+    return [EXTENSIONS[fmt] + (f".{method}" if method else "")
+            for fmt in formats for method in [None] + list(compression)]
+
+def encode_variants(data, formats=None, compression=None):
+    """
+    Encode data in every configured format and compression.
+    Returns a dict of file suffix (".json", ".msgpack.gz", ...) -> bytes.
+    """
+    formats = FORMATS if formats is None else formats
+    compression = COMPRESSION if compression is None else compression
+    variants = {}
+    for fmt in formats:
+        payload = encode(data, fmt)
+        ext = EXTENSIONS[fmt]
+        variants[ext] = payload
+        for method in compression:
+            variants[f"{ext}.{method}"] = compress(payload, method)
+    return variants
+
+class _Sink:
+    """One output file, optionally compressed as it is written."""
+
+    def __init__(self, path, method=None):
+        self.file = open(path, "wb")
+        self.stream = self.file
+        self.compressor = None
+        if method == "gz":
+            # Same bytes as compress(): empty file name, pinned mtime
+            self.stream = gzip.GzipFile(filename="", mode="wb", fileobj=self.file, compresslevel=9, mtime=0)
+        elif method == "br":
+            self.compressor = brotli.Compressor(quality=11)
+        elif method is not None:
+            raise ValueError(f"Unknown compression: {method}")
+
+    def write(self, data):
+        if self.compressor:
+            self.file.write(self.compressor.process(data))
+        else:
+            self.stream.write(data)
+
+    def close(self):
+        if self.compressor:
+            self.file.write(self.compressor.finish())
+        elif self.stream is not self.file:
+            self.stream.close()
+        self.file.close()
+
+class _Stream:
+    """One format's encoded bytes, batched and fanned out to its plain and compressed files."""
+
+    def __init__(self, fmt, base, compression, chunk_bytes):
+        ext = EXTENSIONS[fmt]
+        self.fmt = fmt
+        self.sinks = [_Sink(base + ext)] + [_Sink(f"{base}{ext}.{m}", m) for m in compression]
+        self.chunk_bytes = chunk_bytes
+        self.pending = []
+        self.pending_bytes = 0
+        self.size = 0
+
+    def write(self, data):
+        self.pending.append(data)
+        self.pending_bytes += len(data)
+        self.size += len(data)
+        if self.pending_bytes >= self.chunk_bytes:
+            self.flush()
+
+    def flush(self):
+        block = b"".join(self.pending)
+        for sink in self.sinks:
+            sink.write(block)
+        self.pending = []
+        self.pending_bytes = 0
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+
+def write_list(base, items, count, formats=None, compression=None, chunk_bytes=64 * 1024):
+    """
+    Stream a list of `count` items to base + every configured suffix
+    without holding the list or any encoding of it in memory. Each item is
+    encoded on its own and fed to the files (and their compressors) in
+    chunk_bytes batches. The files are byte-identical to
+    encode_variants() of the whole list. Returns the size of the .json output (0 if none).
+    """
+    formats = FORMATS if formats is None else formats
+    compression = COMPRESSION if compression is None else compression
+    packer = msgpack.Packer()
+    streams = []
+    try:
+        for fmt in formats:
+            streams.append(_Stream(fmt, base, compression, chunk_bytes))
+        for stream in streams:
+            if stream.fmt == "json":
+                stream.write(b"[")
+            else:
+                # msgpack arrays carry their length up front, hence `count`
+                stream.write(MAGIC + bytes([SCHEMA_VERSION]) + packer.pack_array_header(count))
+        written = 0
+        for item in items:
+            for stream in streams:
+                if stream.fmt == "json":
+                    data = json.dumps(item, separators=(',', ':')).encode("utf-8")
+                    stream.write(b"," + data if written else data)
+                else:
+                    stream.write(packer.pack(_intern(item)))
+            written += 1
+        if written != count:
+            raise ValueError(f"write_list: expected {count} items, got {written}")
+        for stream in streams:
+            if stream.fmt == "json":
+                stream.write(b"]")
+            stream.flush()
+    finally:
+        for stream in streams:
+            stream.close()
+    return next((stream.size for stream in streams if stream.fmt == "json"), 0)
+
+def decode_variant(suffix, payload):
+    """Decode any file produced by encode_variants, given its suffix."""
+    parts = suffix.lstrip(".").split(".")
+    if len(parts) > 1:
+        payload = decompress(payload, parts[1])
+    return decode(payload, parts[0])
+
+if __name__ == "__main__":
+    # Round-trip existing JSON files through every format and report sizes:
+    #   python shard_codec.py mirrors/o/r/org.example.json sentinel/shard_a.json
+    # --selftest also checks that write_list() streams the same bytes for list files.
+    import tempfile
+    args = sys.argv[1:]
+    selftest = "--selftest" in args
+    all_methods = ["gz"] + (["br"] if brotli else [])
+    failures = 0
+    for path in (a for a in args if a != "--selftest"):
+        with open(path, "rb") as f:
+            data = json.loads(f.read().decode("utf-8"))
+        variants = encode_variants(data, list(EXTENSIONS), all_methods)
+        print(f"📄 {path}")
+        for suffix, payload in variants.items():
+            ok = decode_variant(suffix, payload) == data
+            failures += not ok
+            print(f"   {'✅' if ok else '❌'} {suffix:<14} {len(payload):>10} bytes")
+        if selftest and isinstance(data, list):
+            with tempfile.TemporaryDirectory() as tmp:
+                base = os.path.join(tmp, "shard")
+                write_list(base, iter(data), len(data), list(EXTENSIONS), all_methods)
+                for suffix, payload in variants.items():
+                    with open(base + suffix, "rb") as f:
+                        ok = f.read() == payload
+                    failures += not ok
+                    print(f"   {'✅' if ok else '❌'} {suffix:<14} streamed")
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,13 @@
+"""
+Makes the repository's top-level scripts/ directory importable from the
+workflow scripts in this folder, so they can share modules such as the
+pooled http_client. Import it before any of those modules.
+"""
+import os
+import sys
+
+# `python .github/scripts/<name>.py` only puts this folder on sys.path, and
+# scripts/ is not a package, so it is added here once for every generator
+SCRIPTS_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "scripts"))
+if SCRIPTS_DIR not in sys.path:
+    sys.path.append(SCRIPTS_DIR)
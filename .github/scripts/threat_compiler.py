@@ -1,128 +1,570 @@
-
+import hashlib
+import heapq
 import json
-import requests
 import re
 import os
+import resource
+import shutil
+import sys
+import tempfile
+
+import shared_scripts # Puts scripts/ on sys.path for http_client
+import shard_codec
+import http_client
+import sentinel_table
+import sentinel_filter
 
 # --- DATA SOURCES ---
 THREATFOX_URLS = ["https://threatfox.abuse.ch/export/csv/recent/"]
 MALWARE_BAZAAR_URLS = ["https://bazaar.abuse.ch/export/txt/sha256/recent/"]
 AARYAN_BASE_URL = "https://raw.githubusercontent.com/aaryanrlondhe/Malware-Hash-Database/main/SHA256/sha256_hashes_{}.txt"
 
-# Regex for SHA256 (64 hex chars)
-HASH_PATTERN = re.compile(r'\b[a-fA-F0-9]{64}\b')
+# Priority order: when a hash appears in several sources, the first one labels it.
+# mode "first" = use the first URL that answers, "all" = every URL is one part of the feed.
+SOURCES = [
+    {"name": "ThreatFox", "label": "ThreatFox", "urls": THREATFOX_URLS, "mode": "first"},
+    {"name": "MalwareBazaar", "label": "MalwareBazaar", "urls": MALWARE_BAZAAR_URLS, "mode": "first"},
+    {"name": "Archive", "label": None, "urls": [AARYAN_BASE_URL.format(i) for i in range(1, 7)], "mode": "all"},
+]
+
+# Manual Keys
+MANUAL = [
+    ("275a021bbfb6489e54d471899f7db9d1663fc695ec2fe2a2c4538aabf651fd0f", "EICAR-Test"),
+    ("5e884898da28047151d0e56f8dc6292773603d0d6aabbdd62a11ef721d1542d8", "Orion-Test"),
+]
+
+# Regex for SHA256 (64 hex chars), applied to raw response lines
+HASH_PATTERN = re.compile(rb'\b[a-fA-F0-9]{64}\b')
+
+# Sharding: prefix length is picked so the average JSON shard stays under the target
+SENTINEL_DIR = "sentinel"
+TARGET_SHARD_BYTES = int(os.environ.get("SENTINEL_TARGET_SHARD_KB", "256")) * 1024
+PREFIX_LEN = os.environ.get("SENTINEL_PREFIX_LEN", "auto") # "auto" or 1-4
+MAX_PREFIX_LEN = 4 # Bucket counts are kept per 2-byte (4 hex) digest prefix
+# Keep writing the legacy 16 x shard_<c>.json set for clients that predate index.json
+LEGACY_SHARDS = os.environ.get("SENTINEL_LEGACY_SHARDS", "1") == "1"
+
+# Streaming: digests are held as 32-byte values and spilled to sorted runs on disk
+DIGEST_SIZE = 32
+RUN_RECORDS = int(os.environ.get("SENTINEL_RUN_RECORDS", "200000"))
+READ_CHUNK = 64 * 1024
+
+# Incremental state: per-source snapshots and the last compiled database
+CACHE_DIR = os.environ.get("SENTINEL_CACHE_DIR", ".sentinel_cache")
+SNAPSHOT_META_FILE = os.path.join(CACHE_DIR, "snapshots.json")
+MERGED_SNAPSHOT = os.path.join(CACHE_DIR, "merged.bin")
+DELTAS_DIR = os.path.join(SENTINEL_DIR, "deltas")
+DELTA_KEEP = int(os.environ.get("SENTINEL_DELTA_KEEP", "7")) # Runs a client can lag behind
 
 HEADERS = {
     "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
     "Accept": "text/plain,text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8"
 }
 
-def get_hashes(text):
-    return set(HASH_PATTERN.findall(text))
+def read_records(path, size, start=0, count=None):
+    """Yield fixed-width records (optionally `count` from record `start`) without loading the file."""
+    chunk = size * (READ_CHUNK // size)
+    remaining = None if count is None else count * size
+    with open(path, "rb") as f:
+        f.seek(start * size)
+        while remaining is None or remaining > 0:
+            block = f.read(chunk if remaining is None else min(chunk, remaining))
+            if not block:
+                return
+            if remaining is not None:
+                remaining -= len(block)
+            for i in range(0, len(block), size):
+                yield block[i:i + size]
+
+def merge_unique(paths, out_path):
+    """K-way merge sorted digest files into one sorted unique file. Returns the count."""
+    count = 0
+    last = None
+    with open(out_path, "wb") as out:
+        for digest in heapq.merge(*[read_records(p, DIGEST_SIZE) for p in paths]):
+            if digest != last:
+                out.write(digest)
+                count += 1
+                last = digest
+    return count
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(READ_CHUNK), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def load_json(path, default):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+def save_json(path, data):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path + ".tmp", "w") as f:
+        json.dump(data, f, separators=(',', ':'))
+    os.replace(path + ".tmp", path)
+
+class DigestSorter:
+    """
+    EXTERNAL MERGE SORT
+    -------------------
+    Buffers up to RUN_RECORDS 32-byte digests, spills each full buffer to
+    disk as a sorted run, then k-way merges the runs into one sorted,
+    de-duplicated file. Memory stays bounded by the run size no matter how
+    large the feed is. The buffer is a plain list sorted in place (a set
+    costs its hash table plus a sorted copy); duplicates drop out in the merge.
+    """
+
+    def __init__(self, work_dir):
+        self.work_dir = work_dir
+        self.buffer = []
+        self.runs = []
+
+    def add(self, digest):
+        self.buffer.append(digest)
+        if len(self.buffer) >= RUN_RECORDS:
+            self._spill()
+
+    def _spill(self):
+        if not self.buffer:
+            return
+        self.buffer.sort()
+        fd, path = tempfile.mkstemp(dir=self.work_dir, suffix=".run")
+        with os.fdopen(fd, "wb") as f:
+            for i in range(0, len(self.buffer), 4096):
+                f.write(b"".join(self.buffer[i:i + 4096]))
+        self.runs.append(path)
+        self.buffer = []
+
+    def finish(self, path):
+        """Merge everything into `path`. Returns the number of unique digests."""
+        self._spill()
+        count = merge_unique(self.runs, path)
+        for run in self.runs:
+            os.remove(run)
+        self.runs = []
+        return count
 
-def fetch_simple_source(name, urls):
+def stream_digests(response, whole_line):
+    """
+    Yield 32-byte digests from a streamed response, one line at a time.
+    whole_line: the line itself must be the hash (archive lists); otherwise
+    every 64-hex token in the line is taken (CSV/TXT exports).
+    """
+    for line in response.iter_lines(chunk_size=READ_CHUNK):
+        if not line:
+            continue
+        if whole_line:
+            clean = line.strip()
+            if len(clean) == 64:
+                try:
+                    yield bytes.fromhex(clean.decode("ascii"))
+                except ValueError:
+                    pass
+        else:
+            for match in HASH_PATTERN.findall(line):
+                yield bytes.fromhex(match.decode("ascii"))
+
+def fetch_source(source, path, work_dir, snapshots):
+    """
+    Stream one feed into a sorted, unique digest file at `path`.
+
+    Every URL keeps a snapshot in CACHE_DIR (sorted digests) plus its
+    ETag / Last-Modified and content hash in `snapshots`. Unchanged URLs
+    answer the conditional GET with 304 and the snapshot is reused; a
+    failed URL also falls back to its last good snapshot.
+    Returns the digest count.
+    """
+    name = source["name"]
     print(f"   🔎 Fetching {name}...")
-    for url in urls:
-        try:
-            r = requests.get(url, headers=HEADERS, timeout=45)
-            if r.status_code == 200:
-                hashes = get_hashes(r.text)
-                print(f"      ✅ {name}: {len(hashes)} signatures.")
-                return hashes
-            else:
-                print(f"      ⚠️ {name} Error ({r.status_code})")
-        except Exception as e:
-            print(f"      ❌ {name} Exception: {str(e)[:50]}")
-    return set()
-
-def fetch_archive_source():
-    print(f"   🔎 Fetching Malware Hash Archive (1-6)...")
-    all_hashes = set()
-    for i in range(1, 7):
-        url = AARYAN_BASE_URL.format(i)
+    whole_line = source["mode"] == "all"
+    part_files = []
+
+    for part, url in enumerate(source["urls"], 1):
+        label = f"Part {part}" if whole_line else name
+        key = f"{name}_{part}"
+        snapshot_path = os.path.join(CACHE_DIR, f"{key}.bin")
+        meta = snapshots.get(key) if os.path.exists(snapshot_path) else None
+
+        headers = dict(HEADERS)
+        if meta and meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta and meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+
         try:
-            print(f"      ...Downloading Part {i}")
-            r = requests.get(url, headers=HEADERS, timeout=60)
-            if r.status_code == 200:
-                count = 0
-                for line in r.iter_lines(decode_unicode=True):
-                    if line:
-                        clean = line.strip().lower()
-                        if len(clean) == 64:
-                            all_hashes.add(clean)
-                            count += 1
-                print(f"      ✅ Part {i}: {count} signatures.")
-            else:
-                print(f"      ⚠️ Part {i} Missing ({r.status_code})")
+            if whole_line:
+                print(f"      ...Downloading {label}")
+            with http_client.get_session().get(url, headers=headers, timeout=60, stream=True) as r:
+                if r.status_code == 304 and meta:
+                    print(f"      ♻️ {label}: not modified ({meta['count']} signatures).")
+                    part_files.append(snapshot_path)
+                elif r.status_code == 200:
+                    sorter = DigestSorter(work_dir)
+                    count = 0
+                    for digest in stream_digests(r, whole_line):
+                        sorter.add(digest)
+                        count += 1
+                    sorter.finish(snapshot_path + ".tmp")
+                    content_hash = file_sha256(snapshot_path + ".tmp")
+                    os.replace(snapshot_path + ".tmp", snapshot_path)
+                    unchanged = meta and meta.get("sha256") == content_hash
+                    snapshots[key] = {
+                        "etag": r.headers.get("ETag"),
+                        "last_modified": r.headers.get("Last-Modified"),
+                        "sha256": content_hash,
+                        "count": count
+                    }
+                    print(f"      ✅ {label}: {count} signatures{' (unchanged)' if unchanged else ''}.")
+                    part_files.append(snapshot_path)
+                else:
+                    print(f"      ⚠️ {label} Error ({r.status_code})")
         except Exception as e:
-            print(f"      ❌ Part {i} Failed: {str(e)[:50]}")
-    return all_hashes
+            print(f"      ❌ {label} Exception: {str(e)[:50]}")
+
+        if whole_line and snapshot_path not in part_files and meta:
+            print(f"      ♻️ {label}: using last snapshot.")
+            part_files.append(snapshot_path)
+        if not whole_line and part_files:
+            break
+
+    if not whole_line and not part_files:
+        # Every mirror failed: fall back to the newest snapshot we have
+        for part in range(1, len(source["urls"]) + 1):
+            snapshot_path = os.path.join(CACHE_DIR, f"{name}_{part}.bin")
+            if os.path.exists(snapshot_path):
+                print(f"      ♻️ {name}: using last snapshot.")
+                part_files.append(snapshot_path)
+                break
+
+    return merge_unique(part_files, path)
+
+def merge_sources(source_files):
+    """
+    K-way merge of per-source sorted digest files. Yields (digest, source
+    index) once per unique digest; on duplicates the lowest source index
+    (highest priority) wins because tuples tie-break on it.
+    """
+    def tagged(path, index):
+        for digest in read_records(path, DIGEST_SIZE):
+            yield digest, index
+
+    last = None
+    for digest, index in heapq.merge(*[tagged(p, i) for i, p in enumerate(source_files)]):
+        if digest != last:
+            yield digest, index
+            last = digest
+
+def diff_databases(old_path, new_path, prefix_len, source_labels):
+    """
+    Merge-walk two compiled databases (sorted digest + source byte records)
+    and return {prefix: {"add": [entries], "del": [hashes]}} for every shard
+    that moved. A relabelled hash counts as an add (it overwrites).
+    """
+    deltas = {}
+
+    def bucket(digest):
+        return deltas.setdefault(digest.hex()[:prefix_len], {"add": [], "del": []})
+
+    def add(record):
+        entry = {"h": record[:DIGEST_SIZE].hex()}
+        label = source_labels[record[DIGEST_SIZE]]
+        if label:
+            entry["n"] = label
+        bucket(record[:DIGEST_SIZE])["add"].append(entry)
+
+    old_iter = read_records(old_path, DIGEST_SIZE + 1)
+    new_iter = read_records(new_path, DIGEST_SIZE + 1)
+    old = next(old_iter, None)
+    new = next(new_iter, None)
+    while old is not None or new is not None:
+        if new is None or (old is not None and old[:DIGEST_SIZE] < new[:DIGEST_SIZE]):
+            bucket(old[:DIGEST_SIZE])["del"].append(old[:DIGEST_SIZE].hex())
+            old = next(old_iter, None)
+        elif old is None or new[:DIGEST_SIZE] < old[:DIGEST_SIZE]:
+            add(new)
+            new = next(new_iter, None)
+        else:
+            if old != new:
+                add(new)
+            old = next(old_iter, None)
+            new = next(new_iter, None)
+    return deltas
+
+def write_deltas(deltas, prefix_len, state):
+    """
+    Publish per-shard patches under sentinel/deltas/<seq>/shard_<prefix>.json
+    and an index so clients at sequence N can apply N+1..seq instead of
+    redownloading. A layout change (or no previous build) resets history.
+    Returns the new sequence number.
+    """
+    index = load_json(os.path.join(DELTAS_DIR, "index.json"), {})
+    seq = max(state.get("seq", 0), index.get("seq", 0))
+    history = index.get("deltas", {}) if index.get("prefix_len") == prefix_len else {}
+
+    if deltas is None:
+        seq += 1
+        history = {}
+        print(f"   🧩 Deltas: full rebuild, history reset at seq {seq}")
+    elif deltas:
+        seq += 1
+        seq_dir = os.path.join(DELTAS_DIR, str(seq))
+        os.makedirs(seq_dir, exist_ok=True)
+        for prefix, patch in deltas.items():
+            with open(os.path.join(seq_dir, f"shard_{prefix}.json"), "w") as f:
+                json.dump(patch, f, separators=(',', ':'))
+        history[str(seq)] = sorted(deltas)
+        adds = sum(len(p["add"]) for p in deltas.values())
+        dels = sum(len(p["del"]) for p in deltas.values())
+        print(f"   🧩 Deltas: seq {seq}, {len(deltas)} shards (+{adds} -{dels})")
+
+    # Compaction: keep only the newest DELTA_KEEP sequences
+    history = {k: history[k] for k in sorted(history, key=int)[-DELTA_KEEP:]}
+    if os.path.isdir(DELTAS_DIR):
+        for name in os.listdir(DELTAS_DIR):
+            if name != "index.json" and name not in history:
+                shutil.rmtree(os.path.join(DELTAS_DIR, name), ignore_errors=True)
+
+    oldest = min([int(k) for k in history] + [seq + 1])
+    save_json(os.path.join(DELTAS_DIR, "index.json"), {
+        "seq": seq,
+        "prefix_len": prefix_len,
+        "min_seq": oldest, # Clients at seq >= min_seq - 1 can patch forward
+        "deltas": history
+    })
+    return seq
+
+def baseline_matches(state, index_path):
+    """
+    True when the cached diff base (MERGED_SNAPSHOT and state.json) is the
+    build published in sentinel/. The cache is restored by key prefix, so
+    it can be older or newer than the data branch. A diff against the
+    wrong base would emit deltas that do not turn the published shards
+    into the new ones.
+    """
+    published = load_json(os.path.join(DELTAS_DIR, "index.json"), {})
+    if published.get("seq") is None or published.get("seq") != state.get("seq"):
+        return False
+    return os.path.exists(index_path) and file_sha256(index_path) == state.get("index_sha256")
+
+def choose_prefix_len(total_bytes):
+    """Smallest hex prefix length (1-4) whose average JSON shard fits TARGET_SHARD_BYTES."""
+    if PREFIX_LEN != "auto":
+        return max(1, min(MAX_PREFIX_LEN, int(PREFIX_LEN)))
+    for prefix_len in range(1, MAX_PREFIX_LEN + 1):
+        if total_bytes / (16 ** prefix_len) <= TARGET_SHARD_BYTES:
+            return prefix_len
+    return MAX_PREFIX_LEN
+
+def bucket_counts(prefix_counts, prefix_len):
+    """Records per bucket for prefix_len, from the per-4-hex-prefix counts taken while merging."""
+    group = 16 ** (MAX_PREFIX_LEN - prefix_len)
+    return [sum(prefix_counts[i:i + group]) for i in range(0, len(prefix_counts), group)]
+
+def iter_buckets(counts, prefix_len):
+    """
+    Yield (prefix, first record, record count) for every one of the
+    16^prefix_len buckets of the merged file, empty ones included. Buckets
+    are contiguous record ranges because the file is sorted.
+    """
+    start = 0
+    for bucket_id, count in enumerate(counts):
+        yield format(bucket_id, f"0{prefix_len}x"), start, count
+        start += count
+
+def bucket_records(merged_path, start, count):
+    """(digest, source index) records of one bucket, streamed from the merged file."""
+    for record in read_records(merged_path, DIGEST_SIZE + 1, start, count):
+        yield record[:DIGEST_SIZE], record[DIGEST_SIZE]
+
+def shard_entries(records, source_labels):
+    for digest, index in records:
+        entry = {"h": digest.hex()} # Minimal key 'h' for hash
+        if source_labels[index]:
+            entry["n"] = source_labels[index] # Minimal key 'n' for name
+        yield entry
+
+def write_json_shard(prefix, count, entries):
+    """
+    Stream one bucket's entries into every configured shard_codec variant;
+    neither the entry list nor its encodings are held in memory.
+    Returns the minified JSON size.
+    """
+    return shard_codec.write_list(os.path.join(SENTINEL_DIR, f"shard_{prefix}"), entries, count)
+
+def remove_stale_shards(directory, written, suffixes):
+    """Delete shard_* files left over from a previous layout or a format/compression no longer configured."""
+    if not os.path.isdir(directory):
+        return
+    for name in os.listdir(directory):
+        if not name.startswith("shard_"):
+            continue
+        prefix, dot, suffix = name[len("shard_"):].partition(".")
+        if prefix not in written or dot + suffix not in suffixes:
+            os.remove(os.path.join(directory, name))
 
 def run():
-    print("🛡️ Orion Sentinel Compiler (v13.0 - Atomic Sharding)")
-    
-    # 1. Fetch
-    tf_hashes = fetch_simple_source("ThreatFox", THREATFOX_URLS)
-    mb_hashes = fetch_simple_source("MalwareBazaar", MALWARE_BAZAAR_URLS)
-    archive_hashes = fetch_archive_source()
-
-    # 2. Compile into Buckets (0-9, a-f)
-    print("\n   ⚙️  Sharding Database into 16 buckets...")
-    
-    # Initialize 16 buckets
-    buckets = {hex(i)[2:]: [] for i in range(16)}
-    
-    processed_hashes = set()
-
-    # Priority Helper
-    def add_to_bucket(hash_set, label):
-        for h in hash_set:
-            if h not in processed_hashes:
-                # Determine bucket char (first char of hash)
-                bucket_char = h[0]
-                
-                entry = {"h": h} # Minimal key 'h' for hash
-                if "Archive" not in label:
-                    entry["n"] = label # Minimal key 'n' for name
-                
-                buckets[bucket_char].append(entry)
-                processed_hashes.add(h)
-
-    # Process in Priority Order
-    add_to_bucket(tf_hashes, "ThreatFox")
-    add_to_bucket(mb_hashes, "MalwareBazaar")
-    add_to_bucket(archive_hashes, "Archive")
-
-    # Manual Keys
-    manual = [
-        ("275a021bbfb6489e54d471899f7db9d1663fc695ec2fe2a2c4538aabf651fd0f", "EICAR-Test"),
-        ("5e884898da28047151d0e56f8dc6292773603d0d6aabbdd62a11ef721d1542d8", "Orion-Test"),
-    ]
-    for h, n in manual:
-        if h not in processed_hashes:
-            bucket_char = h[0]
-            buckets[bucket_char].append({"h": h, "n": n})
-            processed_hashes.add(h)
-
-    # 3. Write Shards
-    total_count = 0
-    if not os.path.exists("sentinel"):
-        os.makedirs("sentinel")
-
-    print("\n   💾 Saving Shards...")
-    for char, data in buckets.items():
-        # Sort for better GZIP compression downstream
-        data.sort(key=lambda x: x['h'])
-        
-        filename = f"sentinel/shard_{char}.json"
-        with open(filename, "w") as f:
-            # Separators remove whitespace for smaller size
-            json.dump(data, f, separators=(',', ':'))
-        
-        print(f"      📦 {filename}: {len(data)} entries")
-        total_count += len(data)
-
-    print(f"\n📦 Total Unique Signatures: {total_count}")
+    print("🛡️ Orion Sentinel Compiler (v15.0 - Incremental Sharding)")
+    work_dir = tempfile.mkdtemp(prefix="sentinel-")
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    snapshots = load_json(SNAPSHOT_META_FILE, {})
+    state = load_json(os.path.join(CACHE_DIR, "state.json"), {})
+    index_path = os.path.join(SENTINEL_DIR, "index.json")
+    previous_index = load_json(index_path, {})
+
+    try:
+        # 1. Fetch (each feed streams into its own sorted digest file)
+        source_labels = []
+        source_files = []
+        for source in SOURCES:
+            path = os.path.join(work_dir, f"{source['name']}.bin")
+            fetch_source(source, path, work_dir, snapshots)
+            source_labels.append(source["label"])
+            source_files.append(path)
+        for h, n in MANUAL:
+            path = os.path.join(work_dir, f"manual_{len(source_files)}.bin")
+            with open(path, "wb") as f:
+                f.write(bytes.fromhex(h))
+            source_labels.append(n)
+            source_files.append(path)
+        save_json(SNAPSHOT_META_FILE, snapshots)
+
+        # 2. Compile (merge in priority order into digest + source index records)
+        merged_path = os.path.join(work_dir, "merged.bin")
+        total_count = 0
+        json_bytes = 0
+        prefix_counts = [0] * 16 ** MAX_PREFIX_LEN # Records per 2-byte digest prefix
+        with open(merged_path, "wb") as out:
+            for digest, index in merge_sources(source_files):
+                out.write(digest + bytes([index]))
+                total_count += 1
+                prefix_counts[digest[0] << 8 | digest[1]] += 1
+                # Minified size: {"h":"<64 hex>"} is 72 bytes, 73 with the list comma,
+                # and ,"n":"<label>" adds 7 + len(label) (labels are plain ASCII)
+                label = source_labels[index]
+                json_bytes += 73 + (7 + len(label) if label else 0)
+
+        prefix_len = choose_prefix_len(json_bytes)
+        print(f"\n   ⚙️  Sharding Database into {16 ** prefix_len} buckets (prefix length {prefix_len})...")
+
+        # Diff against the last build; None means there is nothing to diff against
+        deltas = None
+        if (os.path.exists(MERGED_SNAPSHOT) and state.get("prefix_len") == prefix_len
+                and state.get("labels") == source_labels):
+            if baseline_matches(state, index_path):
+                deltas = diff_databases(MERGED_SNAPSHOT, merged_path, prefix_len, source_labels)
+            else:
+                print(f"   ⚠️ Cached baseline (seq {state.get('seq')}) is not the published {SENTINEL_DIR}/ "
+                      f"(seq {previous_index.get('seq')}): writing full shards, no deltas")
+        changed = set(deltas) if deltas is not None else None
+        legacy_changed = {p[0] for p in changed} if changed is not None else None
+
+        # Binary table labels: 0 = unlabelled (Archive)
+        labels = [None] + [l for l in dict.fromkeys(source_labels) if l is not None]
+        label_index = [labels.index(l) for l in source_labels]
+
+        # 3. Write Shards, binary buckets and layout in a single ordered pass.
+        #    Untouched shards that already exist on disk are left alone.
+        os.makedirs(SENTINEL_DIR, exist_ok=True)
+        table_dir = os.path.join(SENTINEL_DIR, "bin")
+        os.makedirs(table_dir, exist_ok=True)
+
+        print("\n   💾 Saving Shards...")
+        layout = {}
+        table_bytes = 0
+        written = set()
+        rewritten = 0
+        suffixes = shard_codec.variant_suffixes()
+        passes = [prefix_len] + ([1] if LEGACY_SHARDS and prefix_len > 1 else [])
+        for pass_len in passes:
+            if pass_len != prefix_len:
+                print("      ↩️ Writing legacy 16-shard set for older clients...")
+            moved = changed if pass_len == prefix_len else legacy_changed
+            for prefix, start, count in iter_buckets(bucket_counts(prefix_counts, pass_len), pass_len):
+                written.add(prefix)
+                base = os.path.join(SENTINEL_DIR, f"shard_{prefix}")
+                bin_path = os.path.join(table_dir, f"shard_{prefix}.bin")
+                is_main = pass_len == prefix_len
+                # Unchanged bucket: keep it only if every configured variant is already on disk
+                if moved is not None and prefix not in moved \
+                        and all(os.path.exists(base + suffix) for suffix in suffixes) \
+                        and (not is_main or os.path.exists(bin_path)):
+                    if is_main:
+                        size = os.path.getsize(base + ".json") if ".json" in suffixes else 0
+                        layout[prefix] = {"count": count, "bytes": size}
+                        table_bytes += os.path.getsize(bin_path)
+                    continue
+
+                entries = shard_entries(bucket_records(merged_path, start, count), source_labels)
+                size = write_json_shard(prefix, count, entries)
+                rewritten += 1
+                if is_main:
+                    layout[prefix] = {"count": count, "bytes": size}
+                    table_bytes += sentinel_table.write_bucket_stream(
+                        table_dir, prefix, count,
+                        lambda: ((d, label_index[i]) for d, i in bucket_records(merged_path, start, count)))
+                    if prefix_len == 1:
+                        print(f"      📦 {SENTINEL_DIR}/shard_{prefix}.json: {count} entries")
+        remove_stale_shards(SENTINEL_DIR, written, suffixes)
+        remove_stale_shards(table_dir, set(layout), [".bin"])
+        sentinel_table.write_labels(table_dir, labels)
+
+        sizes = [s["bytes"] for s in layout.values()]
+        print(f"      ♻️ Rewrote {rewritten} shard files, kept {len(written) - rewritten} unchanged")
+        print(f"      📏 Shard size: avg {sum(sizes) // len(sizes)} bytes, max {max(sizes)} bytes")
+        print(f"\n📦 Total Unique Signatures: {total_count}")
+
+        # 4. Binary Sorted Table (32-byte digests + uint8 label index)
+        print(f"   🧮 Binary table: {table_dir} ({table_bytes} bytes, {len(labels) - 1} labels)")
+
+        # 5. Probabilistic Prefilter (clean hashes never need a shard fetch)
+        filter_path = os.path.join(SENTINEL_DIR, "filter.bin")
+        if changed == set() and os.path.exists(filter_path) and previous_index.get("filter"):
+            print("   🌸 Bloom filter: unchanged")
+            filter_stats = previous_index["filter"]
+        else:
+            filter_stats = sentinel_filter.build_filter(
+                lambda: (r[:DIGEST_SIZE] for r in read_records(merged_path, DIGEST_SIZE + 1)),
+                total_count, filter_path)
+
+        # 6. Per-shard deltas for clients patching a local copy
+        seq = write_deltas(deltas, prefix_len, state)
+
+        # 7. Layout Index (tells clients how to find the shard for a hash)
+        index = {
+            "version": 1,
+            "prefix_len": prefix_len,
+            "shard_count": len(layout),
+            "total": total_count,
+            "seq": seq,
+            "shard": "shard_{prefix}",
+            "formats": sorted(suffixes),
+            "legacy_shards": LEGACY_SHARDS or prefix_len == 1,
+            "binary": {"dir": "bin", "labels": "bin/" + sentinel_table.LABELS_FILE},
+            "filter": {"file": "filter.bin", "m": filter_stats["m"], "k": filter_stats["k"]},
+            "deltas": "deltas/index.json",
+            "shards": layout
+        }
+        with open(index_path, "w") as f:
+            json.dump(index, f, separators=(',', ':'))
+        print(f"   🗂️ Index: {SENTINEL_DIR}/index.json")
+
+        # Keep this build as the baseline for the next diff
+        shutil.move(merged_path, MERGED_SNAPSHOT)
+        save_json(os.path.join(CACHE_DIR, "state.json"), {"seq": seq, "prefix_len": prefix_len, "labels": source_labels,
+                                                          "index_sha256": file_sha256(index_path)})
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    http_client.report()
+
+    # ru_maxrss is reported in KiB on Linux
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"   📈 Peak RSS: {peak_mb:.1f} MiB")
 
 if __name__ == "__main__":
     run()
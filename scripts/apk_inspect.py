@@ -0,0 +1,386 @@
+#!/usr/bin/env python3
+"""
+In-process APK inspection: validity check plus package / versionName /
+versionCode, without aapt.
+
+The APK is memory-mapped and only the zip central directory and the
+AndroidManifest.xml member are touched: the end-of-central-directory
+record locates the directory, the directory locates the manifest, and
+the manifest (binary AXML) is inflated on its own and walked only up to
+the <manifest> element's attributes. A versionName/versionCode given as
+a resource reference (@string/...) is resolved through resources.arsc,
+preferring the default configuration, as aapt does.
+
+    python scripts/apk_inspect.py app.apk                 # one line per APK
+    python scripts/apk_inspect.py --json a.apk b.apk      # records as JSON
+    python scripts/apk_inspect.py --field version_name app.apk
+
+Exits non-zero when any APK is invalid, or when --field is requested and
+the value could not be read, so shell callers can branch on it.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, asdict
+import argparse
+import json
+import mmap
+import os
+import struct
+import sys
+import zlib
+
+MANIFEST_NAME = b'AndroidManifest.xml'
+RESOURCES_NAME = b'resources.arsc'
+
+# Zip records
+EOCD_SIG = b'PK\x05\x06'
+ZIP64_LOCATOR_SIG = b'PK\x06\x07'
+ZIP64_EOCD_SIG = b'PK\x06\x06'
+CENTRAL_SIG = b'PK\x01\x02'
+LOCAL_SIG = b'PK\x03\x04'
+EOCD_SEARCH = 22 + 0xFFFF  # fixed record + longest possible comment
+
+# AXML chunk types and value types
+RES_STRING_POOL_TYPE = 0x0001
+RES_XML_TYPE = 0x0003
+RES_XML_START_ELEMENT_TYPE = 0x0102
+RES_XML_RESOURCE_MAP_TYPE = 0x0180
+UTF8_FLAG = 0x100
+TYPE_REFERENCE = 0x01
+TYPE_STRING = 0x03
+TYPE_INT_DEC = 0x10
+TYPE_INT_HEX = 0x11
+NO_INDEX = 0xFFFFFFFF
+
+# android:versionCode / android:versionName, for manifests with stripped attribute names
+ATTR_IDS = {0x0101021b: 'versionCode', 0x0101021c: 'versionName'}
+
+# resources.arsc chunk types and flags
+RES_TABLE_TYPE = 0x0002
+RES_TABLE_PACKAGE_TYPE = 0x0200
+RES_TABLE_TYPE_TYPE = 0x0201
+FLAG_SPARSE = 0x01
+FLAG_OFFSET16 = 0x02
+ENTRY_FLAG_COMPLEX = 0x0001
+ENTRY_FLAG_COMPACT = 0x0008
+NO_ENTRY16 = 0xFFFF
+
+class ApkError(Exception):
+    pass
+
+class ResourceRef(int):
+    """Manifest attribute value that points into resources.arsc"""
+
+    def __repr__(self):
+        return f"@0x{self:08x}"
+
+@dataclass
+class ApkInfo:
+    """Result of inspecting one file"""
+    path: str
+    valid: bool = False
+    package: str = None
+    version_name: str = None
+    version_code: int = None
+    error: str = None
+
+    def as_dict(self):
+        return asdict(self)
+
+def _find_eocd(buf):
+    start = max(0, len(buf) - EOCD_SEARCH)
+    pos = buf.rfind(EOCD_SIG, start)
+    if pos < 0:
+        raise ApkError("no zip end-of-central-directory record")
+    entries, size, offset = struct.unpack_from('<HII', buf, pos + 10)
+    if NO_INDEX in (size, offset) or entries == 0xFFFF:
+        locator = pos - 20
+        if locator < 0 or buf[locator:locator + 4] != ZIP64_LOCATOR_SIG:
+            raise ApkError("zip64 archive without a zip64 locator")
+        (zip64_pos,) = struct.unpack_from('<Q', buf, locator + 8)
+        if buf[zip64_pos:zip64_pos + 4] != ZIP64_EOCD_SIG:
+            raise ApkError("bad zip64 end-of-central-directory record")
+        entries, size, offset = struct.unpack_from('<QQQ', buf, zip64_pos + 32)
+    return entries, offset
+
+def _find_member(buf, entries, offset, wanted=MANIFEST_NAME):
+    """(compression method, compressed size, local header offset) of a member"""
+    pos = offset
+    for _ in range(entries):
+        if buf[pos:pos + 4] != CENTRAL_SIG:
+            raise ApkError("corrupt zip central directory")
+        method, = struct.unpack_from('<H', buf, pos + 10)
+        comp_size, _, name_len, extra_len, comment_len = struct.unpack_from('<IIHHH', buf, pos + 20)
+        local_offset, = struct.unpack_from('<I', buf, pos + 42)
+        name = buf[pos + 46:pos + 46 + name_len]
+        if name == wanted:
+            if NO_INDEX in (comp_size, local_offset):
+                comp_size, local_offset = _zip64_extra(buf, pos, name_len, extra_len, comp_size, local_offset)
+            return method, comp_size, local_offset
+        pos += 46 + name_len + extra_len + comment_len
+    raise ApkError(f"{wanted.decode()} not found")
+
+def _zip64_extra(buf, pos, name_len, extra_len, comp_size, local_offset):
+    """Resolve 0xFFFFFFFF sizes/offsets from the zip64 extra field"""
+    extra = pos + 46 + name_len
+    end = extra + extra_len
+    while extra + 4 <= end:
+        tag, length = struct.unpack_from('<HH', buf, extra)
+        if tag == 0x0001:
+            values = iter(struct.unpack_from('<' + 'Q' * (length // 8), buf, extra + 4))
+            # Fields appear in order uncompressed, compressed, offset - only the overflowed ones
+            if struct.unpack_from('<I', buf, pos + 24)[0] == NO_INDEX:
+                next(values)
+            if comp_size == NO_INDEX:
+                comp_size = next(values)
+            if local_offset == NO_INDEX:
+                local_offset = next(values)
+            return comp_size, local_offset
+        extra += 4 + length
+    raise ApkError("zip64 entry without a zip64 extra field")
+
+def _read_member(buf, method, comp_size, local_offset):
+    if buf[local_offset:local_offset + 4] != LOCAL_SIG:
+        raise ApkError("corrupt local zip header")
+    name_len, extra_len = struct.unpack_from('<HH', buf, local_offset + 26)
+    start = local_offset + 30 + name_len + extra_len
+    data = buf[start:start + comp_size]
+    if method == 0:
+        return bytes(data)
+    if method == 8:
+        return zlib.decompressobj(-15).decompress(data)
+    raise ApkError(f"unsupported compression method {method}")
+
+def _pool_string(data, pos, index):
+    """String `index` of the string pool chunk at pos"""
+    header_size, _, count, _, flags, strings_start = struct.unpack_from('<HIIIII', data, pos + 2)
+    if index >= count:
+        raise ApkError(f"string index {index} out of range")
+    offset, = struct.unpack_from('<I', data, pos + header_size + 4 * index)
+    p = pos + strings_start + offset
+    if flags & UTF8_FLAG:
+        # UTF-16 length, then UTF-8 byte length, each 1 or 2 bytes
+        p += 2 if data[p] & 0x80 else 1
+        length = data[p]
+        if length & 0x80:
+            length = ((length & 0x7F) << 8) | data[p + 1]
+            p += 1
+        p += 1
+        return bytes(data[p:p + length]).decode('utf-8', 'replace')
+    length, = struct.unpack_from('<H', data, p)
+    p += 2
+    if length & 0x8000:
+        length = ((length & 0x7FFF) << 16) | struct.unpack_from('<H', data, p)[0]
+        p += 2
+    return bytes(data[p:p + length * 2]).decode('utf-16-le', 'replace')
+
+def _string_pool(data, pos):
+    """Decode an AXML string pool chunk into a list of str"""
+    count, = struct.unpack_from('<I', data, pos + 8)
+    return [_pool_string(data, pos, index) for index in range(count)]
+
+def parse_manifest(data):
+    """package / versionName / versionCode from binary AndroidManifest.xml bytes"""
+    if len(data) < 8 or struct.unpack_from('<H', data, 0)[0] != RES_XML_TYPE:
+        raise ApkError("AndroidManifest.xml is not binary XML")
+    strings = []
+    resource_ids = ()
+    pos = struct.unpack_from('<H', data, 2)[0]
+    while pos + 8 <= len(data):
+        chunk_type, header_size, chunk_size = struct.unpack_from('<HHI', data, pos)
+        if chunk_size < 8:
+            break
+        if chunk_type == RES_STRING_POOL_TYPE:
+            strings = _string_pool(data, pos)
+        elif chunk_type == RES_XML_RESOURCE_MAP_TYPE:
+            resource_ids = struct.unpack_from(f'<{(chunk_size - header_size) // 4}I', data, pos + header_size)
+        elif chunk_type == RES_XML_START_ELEMENT_TYPE:
+            _, name, attr_start, attr_size, attr_count = struct.unpack_from('<IIHHH', data, pos + 16)
+            if strings[name] != 'manifest':
+                raise ApkError("first element is not <manifest>")
+            return _manifest_attrs(data, pos + header_size + attr_start, attr_size, attr_count,
+                                   strings, resource_ids)
+        pos += chunk_size
+    raise ApkError("no <manifest> element")
+
+def _manifest_attrs(data, pos, attr_size, attr_count, strings, resource_ids):
+    values = {}
+    for index in range(attr_count):
+        _, name, raw, _, _, value_type, value = struct.unpack_from('<IIIHBBI', data, pos + index * attr_size)
+        key = ATTR_IDS.get(resource_ids[name]) if name < len(resource_ids) else None
+        key = key or strings[name]
+        if key not in ('package', 'versionName', 'versionCode'):
+            continue
+        if raw != NO_INDEX:
+            values[key] = strings[raw]
+        elif value_type == TYPE_REFERENCE:
+            values[key] = ResourceRef(value)
+        elif value_type == TYPE_STRING:
+            values[key] = strings[value]
+        elif value_type in (TYPE_INT_DEC, TYPE_INT_HEX):
+            values[key] = value
+    version_code = values.get('versionCode')
+    if isinstance(version_code, str):
+        version_code = int(version_code) if version_code.isdigit() else None
+    return values.get('package'), values.get('versionName'), version_code
+
+def _arsc_entry(data, pos, entry_index):
+    """Offset of entry `entry_index` in the type chunk at pos, or None"""
+    header_size, _ = struct.unpack_from('<HI', data, pos + 2)
+    flags = data[pos + 9]
+    count, entries_start = struct.unpack_from('<II', data, pos + 12)
+    table = pos + header_size
+    if flags & FLAG_SPARSE:
+        # Sorted (entry index, offset / 4) pairs
+        lo, hi = 0, count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            index, offset = struct.unpack_from('<HH', data, table + 4 * mid)
+            if index == entry_index:
+                return pos + entries_start + offset * 4
+            if index < entry_index:
+                lo = mid + 1
+            else:
+                hi = mid
+        return None
+    if entry_index >= count:
+        return None
+    if flags & FLAG_OFFSET16:
+        offset, = struct.unpack_from('<H', data, table + 2 * entry_index)
+        return None if offset == NO_ENTRY16 else pos + entries_start + offset * 4
+    offset, = struct.unpack_from('<I', data, table + 4 * entry_index)
+    return None if offset == NO_INDEX else pos + entries_start + offset
+
+def _arsc_value(data, ref):
+    """(value type, data, global string pool offset) of resource `ref`, default config first"""
+    if struct.unpack_from('<H', data, 0)[0] != RES_TABLE_TYPE:
+        raise ApkError("resources.arsc is not a resource table")
+    package_id, type_id, entry_index = ref >> 24, (ref >> 16) & 0xFF, ref & 0xFFFF
+    pos = struct.unpack_from('<H', data, 2)[0]
+    global_pool = None
+    found = None
+    while pos + 8 <= len(data):
+        chunk_type, header_size, chunk_size = struct.unpack_from('<HHI', data, pos)
+        if chunk_size < 8:
+            break
+        if chunk_type == RES_STRING_POOL_TYPE and global_pool is None:
+            global_pool = pos
+        elif chunk_type == RES_TABLE_PACKAGE_TYPE and struct.unpack_from('<I', data, pos + 8)[0] == package_id:
+            sub, end = pos + header_size, pos + chunk_size
+            while sub + 8 <= end:
+                sub_type, _, sub_size = struct.unpack_from('<HHI', data, sub)
+                if sub_size < 8:
+                    break
+                if sub_type == RES_TABLE_TYPE_TYPE and data[sub + 8] == type_id:
+                    entry = _arsc_entry(data, sub, entry_index)
+                    if entry is not None:
+                        config_size, = struct.unpack_from('<I', data, sub + 20)
+                        is_default = not any(data[sub + 24:sub + 20 + config_size])
+                        if found is None or is_default:
+                            found = entry
+                        if is_default:
+                            break
+                sub += sub_size
+        pos += chunk_size
+    if found is None:
+        raise ApkError(f"resource @0x{ref:08x} not found in resources.arsc")
+    size, flags = struct.unpack_from('<HH', data, found)
+    if flags & ENTRY_FLAG_COMPACT:
+        # Compact entry: the value type sits in the flags' high byte, data follows the key
+        return flags >> 8, struct.unpack_from('<I', data, found + 4)[0], global_pool
+    if flags & ENTRY_FLAG_COMPLEX:
+        raise ApkError(f"resource @0x{ref:08x} is a bag, not a value")
+    _, _, value_type, value = struct.unpack_from('<HBBI', data, found + size)
+    return value_type, value, global_pool
+
+def resolve_resource(data, ref, depth=5):
+    """String or int value of a resource reference, following reference chains"""
+    for _ in range(depth):
+        value_type, value, global_pool = _arsc_value(data, ref)
+        if value_type == TYPE_STRING and global_pool is not None:
+            return _pool_string(data, global_pool, value)
+        if value_type in (TYPE_INT_DEC, TYPE_INT_HEX):
+            return value
+        if value_type != TYPE_REFERENCE:
+            raise ApkError(f"resource @0x{ref:08x} has unsupported value type 0x{value_type:02x}")
+        ref = value
+    raise ApkError(f"resource reference chain too long at @0x{ref:08x}")
+
+def inspect(path):
+    """Validate one APK and read its manifest identity. Never raises."""
+    info = ApkInfo(path=path)
+    try:
+        with open(path, 'rb') as f:
+            head = f.read(512)
+            if head[:4] != LOCAL_SIG:
+                if head.lstrip()[:1] == b'<':
+                    raise ApkError("file is an HTML/XML page, not an APK")
+                raise ApkError("not a zip archive (missing PK header)")
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+                entries, offset = _find_eocd(buf)
+                manifest = _read_member(buf, *_find_member(buf, entries, offset))
+                info.package, info.version_name, info.version_code = parse_manifest(manifest)
+                info.valid = True
+                if isinstance(info.version_name, ResourceRef) or isinstance(info.version_code, ResourceRef):
+                    _resolve_versions(info, buf, entries, offset)
+    except (ApkError, OSError, ValueError, IndexError, struct.error, zlib.error) as e:
+        info.error = str(e) or e.__class__.__name__
+    return info
+
+def _resolve_versions(info, buf, entries, offset):
+    """Replace resource references in versionName/versionCode; unresolvable ones become None"""
+    try:
+        resources = _read_member(buf, *_find_member(buf, entries, offset, RESOURCES_NAME))
+    except (ApkError, ValueError, struct.error, zlib.error) as e:
+        resources, reason = None, str(e)
+    for field in ('version_name', 'version_code'):
+        ref = getattr(info, field)
+        if not isinstance(ref, ResourceRef):
+            continue
+        try:
+            if resources is None:
+                raise ApkError(reason)
+            value = resolve_resource(resources, ref)
+            setattr(info, field, str(value) if field == 'version_name' else int(value))
+        except (ApkError, ValueError, IndexError, struct.error) as e:
+            # The APK itself is fine; only this field is unknown
+            setattr(info, field, None)
+            info.error = f"{field} {ref!r} could not be resolved: {e}"
+
+def inspect_many(paths, workers=None):
+    """Inspect a batch of APKs on a process pool; results keep input order"""
+    paths = list(paths)
+    if len(paths) < 2 or workers == 1:
+        return [inspect(path) for path in paths]
+    with ProcessPoolExecutor(max_workers=workers or min(len(paths), os.cpu_count() or 1)) as pool:
+        return list(pool.map(inspect, paths))
+
+def main():
+    parser = argparse.ArgumentParser(description='Read package and version from APK files without aapt')
+    parser.add_argument('apks', nargs='+', help='APK files to inspect')
+    parser.add_argument('--field', choices=('package', 'version_name', 'version_code'),
+                        help='Print only this field (one line per APK)')
+    parser.add_argument('--json', action='store_true', help='Print the records as a JSON list')
+    parser.add_argument('--workers', type=int, help='Process pool size (default: CPU count)')
+    args = parser.parse_args()
+
+    results = inspect_many(args.apks, args.workers)
+    if args.json:
+        print(json.dumps([info.as_dict() for info in results], indent=2))
+    missing = 0
+    for info in results:
+        if not info.valid:
+            print(f"❌ {info.path}: {info.error}", file=sys.stderr)
+        elif args.field:
+            value = getattr(info, args.field)
+            if value is None:
+                # An empty value would end up in release tags; fail instead
+                missing += 1
+                print(f"❌ {info.path}: no {args.field}" + (f" ({info.error})" if info.error else ""),
+                      file=sys.stderr)
+            print('' if value is None else value)
+        elif not args.json:
+            print(f"{info.path}: {info.package} {info.version_name} ({info.version_code})")
+    return 0 if all(info.valid for info in results) and not missing else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,161 @@
+"""
+Content-addressed local APK store.
+
+Every downloaded APK is kept once under its SHA-256
+
+    <store>/objects/<sha[:2]>/<sha>.apk
+
+and the named files in downloads/ are hardlinks to it (symlinks, or a
+copy, where hardlinks aren't possible). index.json records
+
+  objects  sha -> size, last use
+  entries  (app, version) -> sha, size
+  urls     download URL -> sha, ETag/Last-Modified, Content-Length
+
+so a repeat download whose response validators match a known URL can be
+served from the store without reading the body, and an upload can reuse
+the hash instead of re-reading the file.
+
+The store is bounded by APK_STORE_MAX_MB (default 2048); least recently
+used objects are evicted first, never one used by this process.
+APK_STORE_DIR moves it (default .apk_store); set it empty to disable.
+"""
+import json
+import os
+import shutil
+import threading
+import time
+
+STORE_DIR = os.environ.get('APK_STORE_DIR', '.apk_store')
+MAX_BYTES = int(float(os.environ.get('APK_STORE_MAX_MB', '2048')) * 1024 * 1024)
+
+class ApkStore:
+    def __init__(self, root=STORE_DIR, max_bytes=MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.index_path = os.path.join(root, 'index.json')
+        self.index = {'objects': {}, 'entries': {}, 'urls': {}}
+        self.pinned = set()  # objects used by this process, never evicted
+        self.hits = 0
+        self.bytes_saved = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.join(root, 'objects'), exist_ok=True)
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                self.index.update(json.load(f))
+        except (OSError, ValueError):
+            pass
+        # Drop index rows whose object was removed behind our back
+        for sha in [sha for sha in self.index['objects'] if not os.path.exists(self.object_path(sha))]:
+            self._forget(sha)
+
+    def object_path(self, sha256):
+        return os.path.join(self.root, 'objects', sha256[:2], sha256 + '.apk')
+
+    def lookup(self, url, validator, length):
+        """
+        sha of a stored object previously downloaded from url with the same
+        ETag/Last-Modified and Content-Length, else None.
+        """
+        if not validator or length is None:
+            return None
+        with self._lock:
+            known = self.index['urls'].get(url)
+            if not known or known['validator'] != validator or known['length'] != length:
+                return None
+            sha = known['sha256']
+            if sha not in self.index['objects'] or not os.path.exists(self.object_path(sha)):
+                return None
+            self._touch(sha)
+            self.hits += 1
+            self.bytes_saved += length
+            self._save()
+            return sha
+
+    def add(self, tmp_path, sha256, urls=(), validator=None, length=None):
+        """Move a finished download into the store (dropping it if the content is already there)."""
+        path = self.object_path(sha256)
+        with self._lock:
+            if os.path.exists(path):
+                os.remove(tmp_path)
+                print(f"♻️  Same content already stored as {sha256[:12]} - deduplicated")
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(tmp_path, path)
+            self.index['objects'][sha256] = {'size': os.path.getsize(path), 'last_used': time.time()}
+            self.pinned.add(sha256)
+            if validator and length is not None:
+                for url in urls:
+                    self.index['urls'][url] = {'sha256': sha256, 'validator': validator, 'length': length}
+            self._evict()
+            self._save()
+        return path
+
+    def link(self, sha256, dest):
+        """Expose a stored object at dest: hardlink, else symlink, else copy."""
+        source = self.object_path(sha256)
+        if os.path.lexists(dest):
+            os.remove(dest)
+        try:
+            os.link(source, dest)
+        except OSError:
+            try:
+                os.symlink(os.path.abspath(source), dest)
+            except OSError:
+                shutil.copyfile(source, dest)
+        return dest
+
+    def record(self, app, version, sha256):
+        """Remember which app/version a stored object is."""
+        with self._lock:
+            size = self.index['objects'].get(sha256, {}).get('size', 0)
+            self.index['entries'][f"{app}@{version}"] = {'app': app, 'version': version,
+                                                         'sha256': sha256, 'size': size}
+            self._save()
+
+    def sha_for_path(self, path):
+        """sha of a stored object that path is a link to, else None."""
+        for sha in list(self.index['objects']):
+            try:
+                if os.path.samefile(path, self.object_path(sha)):
+                    return sha
+            except OSError:
+                continue
+        return None
+
+    def _touch(self, sha256):
+        self.index['objects'][sha256]['last_used'] = time.time()
+        self.pinned.add(sha256)
+
+    def _forget(self, sha256):
+        self.index['objects'].pop(sha256, None)
+        for table in ('entries', 'urls'):
+            for key in [k for k, v in self.index[table].items() if v['sha256'] == sha256]:
+                del self.index[table][key]
+
+    def _evict(self):
+        """Drop least recently used objects until the store fits max_bytes."""
+        objects = self.index['objects']
+        total = sum(obj['size'] for obj in objects.values())
+        for sha in sorted(objects, key=lambda s: objects[s]['last_used']):
+            if total <= self.max_bytes:
+                break
+            if sha in self.pinned:
+                continue
+            total -= objects[sha]['size']
+            print(f"🧹 Evicting {sha[:12]} ({objects[sha]['size']} bytes) from the APK store")
+            try:
+                os.remove(self.object_path(sha))
+            except OSError:
+                pass
+            self._forget(sha)
+
+    def _save(self):
+        tmp_path = self.index_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.index, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.index_path)
+
+    def save(self):
+        with self._lock:
+            self._save()
@@ -0,0 +1,119 @@
+"""
+Config store for config/apk-list.json.
+
+The file is read once per run and tracked_apks is indexed by name.
+Version bumps are batched in memory and written by one flush() at the
+end of the run: under an exclusive file lock the current file is
+re-read, the pending changes are applied on top of it (so a concurrent
+writer's updates survive), and the result is written to a temp file,
+fsynced and renamed over the original. A crash mid-write leaves the old
+file intact.
+
+ConfigStore.snapshot() opens a read-only view for checkers that must
+never write (update_checker.py).
+"""
+from types import MappingProxyType
+import json
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows: in-process locking only
+    fcntl = None
+
+CONFIG_FILE = 'config/apk-list.json'
+
+class ConfigReadOnly(Exception):
+    pass
+
+class ConfigStore:
+    def __init__(self, path=CONFIG_FILE, read_only=False):
+        self.path = path
+        self.read_only = read_only
+        self.pending = {}  # name -> {field: value} not yet flushed
+        self._lock = threading.RLock()
+        with open(path, 'r') as f:
+            self.data = json.load(f)
+        self.by_name = {apk['name']: apk for apk in self.data.get('tracked_apks', [])}
+
+    @classmethod
+    def snapshot(cls, path=CONFIG_FILE):
+        """Read-only view; any attempt to change it raises ConfigReadOnly"""
+        return cls(path, read_only=True)
+
+    @property
+    def tracked_apks(self):
+        apks = self.data.get('tracked_apks', [])
+        if self.read_only:
+            return tuple(MappingProxyType(apk) for apk in apks)
+        return apks
+
+    def get(self, name):
+        apk = self.by_name.get(name)
+        if apk is not None and self.read_only:
+            return MappingProxyType(apk)
+        return apk
+
+    def update(self, name, **fields):
+        """Change fields of one tracked APK in memory; written on flush(). False if unknown."""
+        if self.read_only:
+            raise ConfigReadOnly(f"{self.path} was opened read-only")
+        with self._lock:
+            apk = self.by_name.get(name)
+            if apk is None:
+                return False
+            apk.update(fields)
+            self.pending.setdefault(name, {}).update(fields)
+            return True
+
+    def set_version(self, name, version):
+        return self.update(name, current_version=version)
+
+    @property
+    def dirty(self):
+        return bool(self.pending)
+
+    def flush(self):
+        """Write pending changes atomically. Returns the number of APKs changed."""
+        if self.read_only:
+            raise ConfigReadOnly(f"{self.path} was opened read-only")
+        with self._lock:
+            if not self.pending:
+                return 0
+            with open(self.path + '.lock', 'w') as lock_file:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                # Apply our changes to what is on disk now, not to what we loaded
+                with open(self.path, 'r') as f:
+                    current = json.load(f)
+                for apk in current.get('tracked_apks', []):
+                    if apk['name'] in self.pending:
+                        apk.update(self.pending[apk['name']])
+                self._write(current)
+            changed = len(self.pending)
+            self.pending = {}
+            return changed
+
+    def _write(self, data):
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        # Persist the rename itself
+        if hasattr(os, 'O_DIRECTORY'):
+            dir_fd = os.open(os.path.dirname(os.path.abspath(self.path)), os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.fsync(dir_fd)
+            finally:
+                os.close(dir_fd)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if not self.read_only:
+            self.flush()
+        return False
@@ -0,0 +1,86 @@
+"""
+Opt-in capture of raw scraper responses for debugging.
+
+Enabled with SCRAPER_DEBUG_DIR (or main.py --debug-capture DIR). Each run
+gets its own directory and every fetched page is stored byte-for-byte as
+
+    <dir>/<run>/<app>/<seq>-<step>.html
+
+The capture directory is size-capped (SCRAPER_DEBUG_MAX_MB, default 50)
+and keeps at most SCRAPER_DEBUG_KEEP_RUNS runs (default 5); the oldest
+runs, then the oldest files of the current run, are rotated out first.
+When disabled, capture() is a no-op and costs nothing.
+"""
+import os
+import re
+import shutil
+import threading
+import time
+
+DEBUG_DIR = os.environ.get('SCRAPER_DEBUG_DIR')
+MAX_BYTES = int(float(os.environ.get('SCRAPER_DEBUG_MAX_MB', '50')) * 1024 * 1024)
+KEEP_RUNS = int(os.environ.get('SCRAPER_DEBUG_KEEP_RUNS', '5'))
+
+def _slug(value):
+    return re.sub(r'[^A-Za-z0-9._-]+', '_', value).strip('_') or 'page'
+
+class DebugCapture:
+    def __init__(self, base_dir=DEBUG_DIR, max_bytes=MAX_BYTES, keep_runs=KEEP_RUNS):
+        self.enabled = bool(base_dir)
+        self.base_dir = base_dir
+        self.max_bytes = max_bytes
+        self.keep_runs = keep_runs
+        self.seq = 0
+        self.files = []  # (path, size) of this run, oldest first
+        self.total = 0
+        self.old_runs = []  # (path, size) of earlier runs kept, oldest first
+        self._lock = threading.Lock()
+        if not self.enabled:
+            return
+        os.makedirs(base_dir, exist_ok=True)
+        self.run_dir = os.path.join(base_dir, time.strftime('%Y%m%d-%H%M%S') + f"-{os.getpid()}")
+        os.makedirs(self.run_dir, exist_ok=True)
+        self._rotate_runs()
+        print(f"🐞 Debug capture enabled: {self.run_dir}")
+
+    def _rotate_runs(self):
+        """Drop runs beyond KEEP_RUNS and remember the sizes of the ones kept"""
+        runs = sorted(name for name in os.listdir(self.base_dir)
+                      if os.path.isdir(os.path.join(self.base_dir, name))
+                      and os.path.join(self.base_dir, name) != self.run_dir)
+        for index, name in enumerate(runs):
+            path = os.path.join(self.base_dir, name)
+            if index < len(runs) - (self.keep_runs - 1):
+                shutil.rmtree(path, ignore_errors=True)
+                continue
+            size = sum(os.path.getsize(os.path.join(root, f))
+                       for root, _, files in os.walk(path) for f in files)
+            self.old_runs.append((path, size))
+            self.total += size
+
+    def capture(self, app, step, content):
+        """Store raw response bytes for an app/step. No-op unless enabled."""
+        if not self.enabled or content is None:
+            return None
+        with self._lock:
+            self.seq += 1
+            app_dir = os.path.join(self.run_dir, _slug(app))
+            os.makedirs(app_dir, exist_ok=True)
+            path = os.path.join(app_dir, f"{self.seq:04d}-{_slug(step)}.html")
+            with open(path, 'wb') as f:
+                f.write(content)
+            self.files.append((path, len(content)))
+            self.total += len(content)
+            # Over the cap: rotate out older runs first, then this run's oldest captures
+            while self.total > self.max_bytes and self.old_runs:
+                old_path, old_size = self.old_runs.pop(0)
+                self.total -= old_size
+                shutil.rmtree(old_path, ignore_errors=True)
+            while self.total > self.max_bytes and len(self.files) > 1:
+                old_path, old_size = self.files.pop(0)
+                self.total -= old_size
+                try:
+                    os.remove(old_path)
+                except OSError:
+                    pass
+        return path
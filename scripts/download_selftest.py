@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Self-test for the APK download engine (APKDownloader.download_apk) against
+a local http.server on a background thread. Needs no network.
+
+    python scripts/download_selftest.py
+
+Cases:
+  resume      the connection drops mid-body; the retry resumes with a Range request
+  no-range    a server without Range support drops mid-body; the retry restarts from byte 0
+  ignored     the server advertises ranges but answers the Range request with a 200
+  parallel    the file is fetched as parallel ranges and one range drops and resumes
+  truncated   every body is cut short; the download fails and leaves no file behind
+
+Exits non-zero when any case fails.
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import hashlib
+import io
+import os
+import re
+import shutil
+import struct
+import sys
+import tempfile
+import threading
+import zipfile
+
+# No store: every case must really go over the wire
+os.environ['APK_STORE_DIR'] = ''
+import downloader
+
+def build_manifest(package, version_name, version_code):
+    """Minimal binary AndroidManifest.xml: a UTF-16 string pool and one <manifest> element"""
+    strings = ['manifest', 'package', 'versionName', 'versionCode', package, version_name]
+    offsets, data = [], b''
+    for s in strings:
+        offsets.append(len(data))
+        data += struct.pack('<H', len(s)) + s.encode('utf-16-le') + b'\x00\x00'
+    data += b'\x00' * (-len(data) % 4)
+    pool_header = 28 + 4 * len(strings)
+    pool = struct.pack('<HHIIIIII', 0x0001, 28, pool_header + len(data), len(strings), 0, 0, pool_header, 0)
+    pool += struct.pack(f'<{len(strings)}I', *offsets) + data
+
+    no_index = 0xFFFFFFFF
+    attrs = [(1, 4, 0x03, 4), (2, 5, 0x03, 5), (3, no_index, 0x10, version_code)]
+    body = struct.pack('<IIHHHHHH', no_index, 0, 20, 20, len(attrs), 0, 0, 0)
+    for name, raw, value_type, value in attrs:
+        body += struct.pack('<IIIHBBI', no_index, name, raw, 8, 0, value_type, value)
+    element = struct.pack('<HHIII', 0x0102, 16, 16 + len(body), 1, no_index) + body
+
+    return struct.pack('<HHI', 0x0003, 8, 8 + len(pool) + len(element)) + pool + element
+
+def build_apk(size):
+    """A valid APK of roughly `size` bytes (random filler stored uncompressed)"""
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, 'w') as zf:
+        zf.writestr('AndroidManifest.xml', build_manifest('org.orion.selftest', '1.2.3', 123),
+                    compress_type=zipfile.ZIP_DEFLATED)
+        zf.writestr('assets/filler.bin', os.urandom(size), compress_type=zipfile.ZIP_STORED)
+    return buf.getvalue()
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def handle(self):
+        try:
+            super().handle()
+        except ConnectionResetError:
+            pass  # The client hung up on a half-sent body, as the case intended
+
+    def do_GET(self):
+        case = self.server.case
+        payload = case['payload']
+        range_header = self.headers.get('Range')
+        case['requests'].append(range_header)
+
+        start, end, status = 0, len(payload), 200
+        if range_header and case['ranges'] and case['honor_range']:
+            first, last = re.match(r'bytes=(\d+)-(\d*)', range_header).groups()
+            start, end, status = int(first), int(last) + 1 if last else len(payload), 206
+        body = payload[start:end]
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/vnd.android.package-archive')
+        self.send_header('Content-Length', str(len(body)))
+        if case['ranges']:
+            self.send_header('Accept-Ranges', 'bytes')
+        if status == 206:
+            self.send_header('Content-Range', f'bytes {start}-{end - 1}/{len(payload)}')
+        self.end_headers()
+
+        if case['drops'] and (range_header or not case['drop_ranged_only']):
+            # Send half the body, then hang up
+            case['drops'] -= 1
+            self.wfile.write(body[:len(body) // 2])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+        self.wfile.write(body)
+
+CASES = [
+    # name, server behaviour, whether the download should succeed
+    ('resume', dict(ranges=True, honor_range=True, drops=1), True),
+    ('no-range', dict(ranges=False, honor_range=False, drops=1), True),
+    ('ignored', dict(ranges=True, honor_range=False, drops=1), True),
+    ('parallel', dict(ranges=True, honor_range=True, drops=1, drop_ranged_only=True, parallel=True), True),
+    ('truncated', dict(ranges=False, honor_range=False, drops=10 ** 6), False),
+]
+
+def check(dl, name, case, ok, filepath, sha256):
+    """List of failed expectations for one case"""
+    problems = []
+    requests = case['requests']
+    part = os.path.join('downloads', f'{name}.apk.part')
+    if not ok:
+        if filepath is not None or os.path.exists(os.path.join('downloads', f'{name}.apk')):
+            problems.append("truncated download was accepted")
+        if os.path.exists(part):
+            problems.append("partial file left behind")
+        return problems
+
+    if filepath is None:
+        return ["download failed"]
+    with open(filepath, 'rb') as f:
+        if hashlib.sha256(f.read()).hexdigest() != sha256:
+            problems.append("content differs from what the server sent")
+    if dl.file_sha256(filepath) != sha256:
+        problems.append("recorded sha256 is wrong")
+    info = dl.apk_info.get(filepath)
+    if not info or info.version_name != '1.2.3':
+        problems.append("APK manifest was not read")
+
+    if name == 'resume' and not (len(requests) == 2 and (requests[1] or '').startswith('bytes=')
+                                 and requests[1] != 'bytes=0-'):
+        problems.append(f"expected one resumed Range request, saw {requests}")
+    if name == 'no-range' and any(requests):
+        problems.append(f"sent a Range request to a server without Range support: {requests}")
+    if name == 'ignored' and len(requests) != 2:
+        problems.append(f"expected one restart after the ignored Range request, saw {requests}")
+    if name == 'parallel' and sum(1 for r in requests if r) <= downloader.PARALLEL_PARTS:
+        problems.append(f"expected {downloader.PARALLEL_PARTS} ranges plus one resume, saw {requests}")
+    return problems
+
+def main():
+    work_dir = tempfile.mkdtemp(prefix='download-selftest-')
+    os.chdir(work_dir)
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f'http://127.0.0.1:{server.server_port}'
+    dl = downloader.APKDownloader()
+    saved = downloader.PARALLEL_MIN_BYTES, downloader.DOWNLOAD_ATTEMPTS
+
+    failures = 0
+    try:
+        for name, behaviour, should_succeed in CASES:
+            # Larger than one CHUNK_SIZE read, so a drop halfway leaves whole chunks to resume from
+            payload = build_apk(3 * downloader.CHUNK_SIZE)
+            case = {'drop_ranged_only': False, 'parallel': False, **behaviour}
+            case.update(payload=payload, requests=[])
+            server.case = case
+            downloader.PARALLEL_MIN_BYTES = 0 if case['parallel'] else len(payload) + 1
+            downloader.DOWNLOAD_ATTEMPTS = saved[1] if should_succeed else 2
+
+            print(f"\n🧪 Case {name}")
+            filepath = dl.download_apk(f'{base_url}/{name}.apk', f'{name}.apk')
+            problems = check(dl, name, case, should_succeed, filepath, hashlib.sha256(payload).hexdigest())
+            failures += bool(problems)
+            for problem in problems:
+                print(f"❌ {name}: {problem}")
+            if not problems:
+                print(f"✅ {name}: passed ({len(case['requests'])} requests)")
+    finally:
+        downloader.PARALLEL_MIN_BYTES, downloader.DOWNLOAD_ATTEMPTS = saved
+        server.shutdown()
+        os.chdir('/')
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(f"\n{'❌' if failures else '✅'} {len(CASES) - failures}/{len(CASES)} download cases passed")
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
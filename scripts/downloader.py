@@ -1,16 +1,62 @@
-from utils import setup_session, load_config, save_config
+from utils import setup_session
+from config_store import ConfigStore
+import apk_inspect
+import apk_store
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_EXCEPTION
+import hashlib
 import requests
 import os
+import threading
+import time
 from github import Github
 import re
 
+CHUNK_SIZE = 1024 * 1024
+DOWNLOAD_TIMEOUT = (15, 60)  # connect, per-read
+DOWNLOAD_ATTEMPTS = int(os.environ.get('APK_DOWNLOAD_ATTEMPTS', '5'))
+# Files at least this large are fetched as parallel byte ranges when the server allows it
+PARALLEL_PARTS = int(os.environ.get('APK_DOWNLOAD_PARTS', '4'))
+PARALLEL_MIN_BYTES = int(os.environ.get('APK_PARALLEL_MIN_MB', '32')) * 1024 * 1024
+RELEASE_MARKER_RE = re.compile(r'<!-- apk-sha256: ([0-9a-f]{64}) size: (\d+) asset: (.+?) -->')
+
+class DownloadError(Exception):
+    pass
+
+class RangeNotSupported(DownloadError):
+    pass
+
 class APKDownloader:
-    def __init__(self, github_token=None):
+    def __init__(self, github_token=None, config=None):
         self.session = setup_session()
+        # Shared ConfigStore whose flush() the caller runs once at the end; None = write per update
+        self.config = config
         self.gh = Github(github_token) if github_token else None
+        # filepath -> SHA-256 computed while downloading
+        self.digests = {}
+        # filepath -> apk_inspect.ApkInfo (package, versionName, versionCode)
+        self.apk_info = {}
+        # Content-addressed store of past downloads (None when APK_STORE_DIR is empty)
+        self.store = apk_store.ApkStore() if apk_store.STORE_DIR else None
     
-    def download_apk(self, url, filename):
-        """Download APK file with proper handling"""
+    def download_apk(self, url, filename, app=None, version=None):
+        """
+        Download an APK into downloads/ and return its path (None on failure).
+        
+        Data streams in large chunks into <file>.part and is renamed into place
+        only once complete. Interrupted transfers resume with an HTTP Range
+        request when the server supports it (otherwise restart from zero), the
+        size is checked against Content-Length, and the SHA-256 is computed
+        while streaming and kept in self.digests. The finished file is
+        validated as an APK (zip directory + binary manifest) before it is
+        renamed into place; its package and version land in self.apk_info.
+        
+        With the APK store enabled the file is kept under its SHA-256 and
+        filepath is a link to it. When the response's ETag/Last-Modified and
+        Content-Length match an earlier download of the same URL, the body is
+        never read and the stored copy is linked instead. app/version label
+        the store entry.
+        """
+        tmp_path = None
         try:
             print(f"📥 Downloading APK from {url}")
             
@@ -22,43 +68,244 @@ class APKDownloader:
             os.makedirs('downloads', exist_ok=True)
             
             filepath = os.path.join('downloads', filename)
+            tmp_path = filepath + '.part'
             
-            # Stream download to handle large files
-            response = self.session.get(url, stream=True, timeout=60)
+            response = self.session.get(url, stream=True, timeout=DOWNLOAD_TIMEOUT)
             response.raise_for_status()
             
-            # Check if it's actually an APK file
             content_type = response.headers.get('content-type', '').lower()
-            content_length = response.headers.get('content-length', 0)
+            # A compressed transfer has no usable byte length or ranges
+            identity = response.headers.get('content-encoding', 'identity').lower() == 'identity'
+            length = response.headers.get('content-length')
+            total = int(length) if length and length.isdigit() and identity else None
+            ranges = identity and response.headers.get('accept-ranges', '').lower() == 'bytes'
             
-            print(f"📊 Response - Type: {content_type}, Size: {content_length} bytes")
+            print(f"📊 Response - Type: {content_type}, Size: {total if total is not None else 'unknown'} bytes, "
+                  f"Ranges: {'yes' if ranges else 'no'}")
             
-            # Write file in chunks
-            with open(filepath, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    if chunk:
-                        f.write(chunk)
+            validator = response.headers.get('etag') or response.headers.get('last-modified')
+            # Mirrors often redirect to a fresh URL; either one can identify the file
+            urls = {url, response.url}
+            known = None
+            if self.store:
+                known = self.store.lookup(url, validator, total) or self.store.lookup(response.url, validator, total)
+            if known:
+                response.close()
+                print(f"♻️  Unchanged since the last download ({validator}) - reusing stored {known[:12]}")
+                self.store.link(known, filepath)
+                info = apk_inspect.inspect(filepath)
+                if info.valid:
+                    return self._finish(filepath, known, info, app, version)
+                print(f"⚠️  Stored copy is not a valid APK ({info.error}) - downloading again")
+                response = self.session.get(url, stream=True, timeout=DOWNLOAD_TIMEOUT)
+                response.raise_for_status()
             
-            # Verify the downloaded file
-            file_size = os.path.getsize(filepath)
-            print(f"✅ Downloaded: {filepath} ({file_size} bytes)")
+            sha256 = None
+            if total and ranges and PARALLEL_PARTS > 1 and total >= PARALLEL_MIN_BYTES:
+                response.close()
+                try:
+                    sha256 = self._download_parallel(response.url, tmp_path, total)
+                except RangeNotSupported as e:
+                    print(f"⚠️  {e} - falling back to a single stream")
+                    ranges = False
+                    response = self.session.get(response.url, stream=True, timeout=DOWNLOAD_TIMEOUT)
+                    response.raise_for_status()
+            if sha256 is None:
+                sha256 = self._download_stream(response, tmp_path, total, ranges)
+            
+            file_size = os.path.getsize(tmp_path)
+            if total is not None and file_size != total:
+                raise DownloadError(f"size mismatch: got {file_size} bytes, Content-Length {total}")
             
-            # Check if file is actually an APK (APK files start with PK header)
-            with open(filepath, 'rb') as f:
-                header = f.read(4)
-                if header == b'PK\x03\x04':
-                    print("🔍 File verified as valid APK (PK header found)")
-                else:
-                    print("⚠️  Warning: File doesn't appear to be a valid APK")
+            # Catches HTML error pages and truncated archives before they land
+            info = apk_inspect.inspect(tmp_path)
+            if not info.valid:
+                raise DownloadError(f"not a valid APK: {info.error}")
             
-            return filepath
+            if self.store:
+                self.store.add(tmp_path, sha256, urls, validator, total)
+                self.store.link(sha256, filepath)
+            else:
+                os.replace(tmp_path, filepath)
+            print(f"✅ Downloaded: {filepath} ({file_size} bytes, sha256 {sha256})")
+            return self._finish(filepath, sha256, info, app, version)
             
         except Exception as e:
             print(f"❌ Error downloading APK: {e}")
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
             return None
     
+    def _finish(self, filepath, sha256, info, app, version):
+        info.path = filepath
+        self.digests[filepath] = sha256
+        self.apk_info[filepath] = info
+        if self.store and app:
+            self.store.record(app, version or info.version_name, sha256)
+        print(f"🔍 APK verified: {info.package} {info.version_name} (versionCode {info.version_code})")
+        return filepath
+    
+    def _download_stream(self, response, tmp_path, total, ranges):
+        """Single-stream download with resume. Returns the sha256 hex digest."""
+        url = response.url
+        hasher = hashlib.sha256()
+        written = 0
+        attempt = 1
+        with open(tmp_path, 'wb') as f:
+            while True:
+                try:
+                    if response is None:
+                        headers = {'Range': f'bytes={written}-'} if ranges and written else {}
+                        response = self.session.get(url, headers=headers, stream=True, timeout=DOWNLOAD_TIMEOUT)
+                        response.raise_for_status()
+                        if written and not (response.status_code == 206 and
+                                            response.headers.get('content-range', '').startswith(f'bytes {written}-')):
+                            print("⚠️  Server ignored the Range request, restarting from byte 0")
+                            f.seek(0)
+                            f.truncate()
+                            hasher = hashlib.sha256()
+                            written = 0
+                    
+                    for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                        if chunk:
+                            f.write(chunk)
+                            hasher.update(chunk)
+                            written += len(chunk)
+                    response.close()
+                    
+                    if total is not None and written < total:
+                        raise DownloadError(f"body ended at {written} of {total} bytes")
+                    return hasher.hexdigest()
+                    
+                except (requests.exceptions.RequestException, DownloadError) as e:
+                    if response is not None:
+                        response.close()
+                        response = None
+                    if attempt >= DOWNLOAD_ATTEMPTS:
+                        raise
+                    attempt += 1
+                    if not ranges:
+                        f.seek(0)
+                        f.truncate()
+                        hasher = hashlib.sha256()
+                        written = 0
+                    print(f"🔁 {e} - retrying from byte {written} (attempt {attempt}/{DOWNLOAD_ATTEMPTS})")
+                    time.sleep(attempt)
+    
+    def _download_part(self, url, tmp_path, start, end, progress, index, stop):
+        """Fetch bytes [start, end) into their place in tmp_path, resuming on errors"""
+        attempt = 1
+        with open(tmp_path, 'r+b') as f:
+            while start + progress[index] < end and not stop.is_set():
+                offset = start + progress[index]
+                try:
+                    response = self.session.get(url, headers={'Range': f'bytes={offset}-{end - 1}'},
+                                                stream=True, timeout=DOWNLOAD_TIMEOUT)
+                    response.raise_for_status()
+                    if response.status_code != 206:
+                        response.close()
+                        raise RangeNotSupported(f"server answered {response.status_code} to a Range request")
+                    f.seek(offset)
+                    for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                        chunk = chunk[:end - start - progress[index]]
+                        if chunk:
+                            f.write(chunk)
+                            # Flush before publishing progress so the hasher can read it
+                            f.flush()
+                            progress[index] += len(chunk)
+                        if start + progress[index] >= end or stop.is_set():
+                            break
+                    response.close()
+                    if start + progress[index] < end and not stop.is_set():
+                        raise DownloadError(f"range {offset}-{end - 1} ended early")
+                except RangeNotSupported:
+                    raise
+                except (requests.exceptions.RequestException, DownloadError) as e:
+                    if attempt >= DOWNLOAD_ATTEMPTS:
+                        raise
+                    attempt += 1
+                    print(f"🔁 Part {index + 1}: {e} - resuming at byte {start + progress[index]} "
+                          f"(attempt {attempt}/{DOWNLOAD_ATTEMPTS})")
+                    time.sleep(attempt)
+    
+    def _download_parallel(self, url, tmp_path, total):
+        """
+        Fetch PARALLEL_PARTS byte ranges concurrently into a preallocated file.
+        The SHA-256 advances over the contiguous prefix as parts land, reading
+        back bytes that were just written (still in the page cache), so no
+        separate pass over the finished file is needed.
+        """
+        part_size = -(-total // PARALLEL_PARTS)
+        parts = [(start, min(start + part_size, total)) for start in range(0, total, part_size)]
+        progress = [0] * len(parts)
+        print(f"⚡ Downloading {total} bytes in {len(parts)} parallel ranges")
+        
+        with open(tmp_path, 'wb') as f:
+            f.truncate(total)
+        
+        hasher = hashlib.sha256()
+        hashed = 0
+        stop = threading.Event()
+        # Unbuffered: a buffered reader may serve a seek from bytes it read before a part landed
+        with ThreadPoolExecutor(max_workers=len(parts)) as pool, open(tmp_path, 'rb', buffering=0) as reader:
+            futures = [pool.submit(self._download_part, url, tmp_path, start, end, progress, i, stop)
+                       for i, (start, end) in enumerate(parts)]
+            while True:
+                finished = all(future.done() for future in futures)
+                failed = [future for future in futures if future.done() and future.exception()]
+                if failed:
+                    # Let the other parts bail out instead of finishing a doomed download
+                    stop.set()
+                    raise failed[0].exception()
+                
+                contiguous = 0
+                for (start, end), done in zip(parts, progress):
+                    contiguous = start + done
+                    if contiguous < end:
+                        break
+                while hashed < contiguous:
+                    reader.seek(hashed)
+                    data = reader.read(min(CHUNK_SIZE, contiguous - hashed))
+                    hasher.update(data)
+                    hashed += len(data)
+                
+                if finished:
+                    break
+                wait(futures, timeout=0.2, return_when=FIRST_EXCEPTION)
+        
+        if hashed != total:
+            raise DownloadError(f"parallel download incomplete: {hashed} of {total} bytes")
+        return hasher.hexdigest()
+    
+    def file_sha256(self, filepath):
+        """SHA-256 recorded during download or known to the APK store, else hashed from disk"""
+        if filepath in self.digests:
+            return self.digests[filepath]
+        known = self.store.sha_for_path(filepath) if self.store else None
+        if known:
+            self.digests[filepath] = known
+            return known
+        hasher = hashlib.sha256()
+        with open(filepath, 'rb') as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                hasher.update(chunk)
+        self.digests[filepath] = hasher.hexdigest()
+        return self.digests[filepath]
+    
+    def release_body(self, version, sha256, size, asset_name):
+        """Release notes plus a hidden marker recording what the asset contains"""
+        return (f"Auto-updated APK - Version {version}\n\nDownloaded from GetModsApk\n\n"
+                f"<!-- apk-sha256: {sha256} size: {size} asset: {asset_name} -->")
+    
     def upload_to_release(self, repo_name, filepath, release_tag, version):
-        """Upload APK to GitHub release with proper error handling"""
+        """
+        Upload APK to GitHub release with proper error handling.
+        
+        Skips the upload when the release already holds a byte-identical asset
+        (same SHA-256 and size, recorded in the release body). Otherwise the
+        new asset is uploaded before the old ones are deleted, so the release
+        is never left without a download.
+        """
         if not self.gh:
             print("❌ GitHub token not provided - cannot upload to releases")
             return False
@@ -77,42 +324,67 @@ class APKDownloader:
                 print(f"❌ File too small: {file_size} bytes - likely not a valid APK")
                 return False
             
-            print(f"📁 File to upload: {filepath} ({file_size} bytes)")
+            asset_name = os.path.basename(filepath)
+            sha256 = self.file_sha256(filepath)
+            title = f"{asset_name.replace('.apk', '')} {version}"
+            body = self.release_body(version, sha256, file_size, asset_name)
+            print(f"📁 File to upload: {filepath} ({file_size} bytes, sha256 {sha256})")
             
             # Check if release exists
             try:
                 release = repo.get_release(release_tag)
                 print(f"🔄 Release '{release_tag}' exists, updating...")
-                
-                # Delete existing assets
-                assets = release.get_assets()
-                asset_count = 0
-                for asset in assets:
-                    print(f"🗑️  Deleting old asset: {asset.name}")
-                    asset.delete_asset()
-                    asset_count += 1
-                print(f"✅ Deleted {asset_count} old assets")
-                
             except Exception as e:
                 print(f"📝 Release '{release_tag}' doesn't exist, creating new release...")
                 # Create new release
                 release = repo.create_git_release(
                     tag=release_tag,
-                    name=f"{os.path.basename(filepath).replace('.apk', '')} {version}",
-                    message=f"Auto-updated APK - Version {version}\n\nDownloaded from GetModsApk",
+                    name=title,
+                    message=body,
                     draft=False,
                     prerelease=False
                 )
                 print(f"✅ Created new release: {release_tag}")
             
-            # Upload APK file
-            print(f"⬆️  Uploading {os.path.basename(filepath)} to release...")
-            with open(filepath, 'rb') as f:
-                release.upload_asset(
-                    path=filepath,
-                    label=os.path.basename(filepath),
-                    content_type='application/vnd.android.package-archive'
-                )
+            old_assets = list(release.get_assets())
+            marker = RELEASE_MARKER_RE.search(release.body or '')
+            if marker and marker.group(1) == sha256 and int(marker.group(2)) == file_size:
+                current = next((a for a in old_assets if a.name == marker.group(3)), None)
+                if current is not None and current.size == file_size:
+                    print(f"⏭️  {current.name} already has this exact APK (sha256 match) - skipping upload")
+                    if release.body != body or release.title != title:
+                        release.update_release(name=title, message=body,
+                                               draft=release.draft, prerelease=release.prerelease)
+                    return True
+            
+            # Upload first; a same-named asset can't coexist, so stage under a temp name
+            staged_name = f"uploading-{asset_name}"
+            for asset in [a for a in old_assets if a.name == staged_name]:
+                # Left behind by a run that failed before its rename
+                print(f"🧹 Deleting leftover staged asset: {asset.name}")
+                asset.delete_asset()
+                old_assets.remove(asset)
+            taken = any(a.name == asset_name for a in old_assets)
+            upload_name = staged_name if taken else asset_name
+            print(f"⬆️  Uploading {asset_name} to release...")
+            new_asset = release.upload_asset(
+                path=filepath,
+                label=asset_name,
+                content_type='application/vnd.android.package-archive',
+                name=upload_name
+            )
+            
+            # Delete existing assets
+            for asset in old_assets:
+                print(f"🗑️  Deleting old asset: {asset.name}")
+                asset.delete_asset()
+            print(f"✅ Deleted {len(old_assets)} old assets")
+            
+            if upload_name != asset_name:
+                self.rename_staged_asset(release, new_asset, filepath, asset_name)
+            if release.body != body or release.title != title:
+                release.update_release(name=title, message=body,
+                                       draft=release.draft, prerelease=release.prerelease)
             
             print(f"✅ Successfully uploaded {filepath} to release {release_tag}")
             return True
@@ -121,24 +393,45 @@ class APKDownloader:
             print(f"❌ Error uploading to release: {e}")
             return False
     
+    def rename_staged_asset(self, release, staged, filepath, asset_name):
+        """
+        Give a staged upload its real name once the old assets are gone.
+
+        If the rename fails the file is uploaded again under the real name
+        and the staged copy dropped, so the release doesn't keep only an
+        "uploading-" asset. The failure is still raised: the release body
+        (and its SHA-256 marker) is then left alone and the next run retries.
+        """
+        try:
+            staged.update_asset(name=asset_name, label=asset_name)
+        except Exception as e:
+            print(f"❌ Could not rename {staged.name} to {asset_name}: {e}")
+            try:
+                release.upload_asset(
+                    path=filepath,
+                    label=asset_name,
+                    content_type='application/vnd.android.package-archive',
+                    name=asset_name
+                )
+                staged.delete_asset()
+                print(f"↩️  Re-uploaded {asset_name} under its real name")
+            except Exception as retry_error:
+                print(f"⚠️  Re-upload failed too ({retry_error}); {staged.name} is replaced on the next run")
+            raise
+    
     def update_apk_list(self, apk_name, new_version):
-        """Update APK list with new version"""
+        """Update APK list with new version (batched when a shared ConfigStore is set)"""
         try:
-            config = load_config()
-            updated = False
-            
-            for apk in config['tracked_apks']:
-                if apk['name'] == apk_name:
-                    print(f"📝 Updating {apk_name} from {apk['current_version']} to {new_version}")
-                    apk['current_version'] = new_version
-                    updated = True
-                    break
-            
-            if updated:
-                save_config(config)
-                print(f"✅ Updated config for {apk_name}")
-            else:
+            config = self.config or ConfigStore()
+            apk = config.get(apk_name)
+            if apk is None:
                 print(f"❌ Could not find {apk_name} in config")
+                return
+            print(f"📝 Updating {apk_name} from {apk['current_version']} to {new_version}")
+            config.set_version(apk_name, new_version)
+            if config is not self.config:
+                config.flush()
+            print(f"✅ Updated config for {apk_name}")
                 
         except Exception as e:
             print(f"❌ Error updating APK list: {e}")
@@ -0,0 +1,139 @@
+"""
+HTML parser backends for the scraper.
+
+Every backend returns a document exposing the same few targeted queries
+the extractors in scraper.py need, so switching parsers never changes
+what gets extracted. full_text() is the whole document (head included)
+without script, style and template contents on every backend.
+scripts/scrape_selftest.py checks this against the saved pages in
+fixtures/getmodsapk/.
+
+  selectolax   lexbor engine, fastest (optional: pip install selectolax)
+  lxml         BeautifulSoup with the lxml tree builder (optional)
+  html.parser  BeautifulSoup with the stdlib tree builder, always available
+
+SCRAPER_PARSER picks one explicitly; the default "auto" uses the first
+installed backend in the order above.
+"""
+from bs4 import BeautifulSoup
+from bs4.element import CData, NavigableString
+import os
+
+# full_text() covers the whole document minus the contents of these
+NON_TEXT_TAGS = ('script', 'style', 'template')
+
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:
+    LexborHTMLParser = None
+
+try:
+    import lxml  # noqa: F401 - only needed as a BeautifulSoup tree builder
+    HAVE_LXML = True
+except ImportError:
+    HAVE_LXML = False
+
+class SoupDocument:
+    """BeautifulSoup tree (lxml or html.parser builder)"""
+
+    def __init__(self, content, builder):
+        self.soup = BeautifulSoup(content, builder)
+
+    def title(self):
+        node = self.soup.find('title')
+        return node.get_text() if node else ''
+
+    def first_text(self, selector):
+        node = self.soup.select_one(selector)
+        return node.get_text() if node else None
+
+    def attr_values(self, selector, attr):
+        values = []
+        for node in self.soup.select(selector):
+            value = node.get(attr)
+            if value:
+                values.append(value)
+        return values
+
+    def leaf_texts(self, selector):
+        """(text, href) for matches that have no child elements"""
+        return [(node.get_text(), node.get('href', '')) for node in self.soup.select(selector)
+                if node.find(True) is None]
+
+    def scripts(self):
+        return [node.string for node in self.soup.find_all('script') if node.string]
+
+    def full_text(self):
+        # get_text() would include script and style contents
+        return ''.join(text for text in self.soup.find_all(string=True)
+                       if type(text) in (NavigableString, CData)
+                       and not any(parent.name in NON_TEXT_TAGS for parent in text.parents))
+
+def iter_parents(node):
+    node = node.parent
+    while node is not None:
+        yield node
+        node = node.parent
+
+class LexborDocument:
+    """selectolax (lexbor) tree"""
+
+    def __init__(self, content):
+        self.tree = LexborHTMLParser(content)
+
+    def title(self):
+        node = self.tree.css_first('title')
+        return node.text() if node else ''
+
+    def first_text(self, selector):
+        node = self.tree.css_first(selector)
+        return node.text() if node else None
+
+    def attr_values(self, selector, attr):
+        values = []
+        for node in self.tree.css(selector):
+            value = node.attributes.get(attr)
+            if value:
+                values.append(value)
+        return values
+
+    def leaf_texts(self, selector):
+        """(text, href) for matches that have no child elements"""
+        return [(node.text(), node.attributes.get('href') or '') for node in self.tree.css(selector)
+                if next(node.iter(include_text=False), None) is None]
+
+    def scripts(self):
+        return [text for text in (node.text() for node in self.tree.css('script')) if text]
+
+    def full_text(self):
+        # Whole document (head included, like SoupDocument), skipping script and style
+        root = self.tree.root
+        if root is None:
+            return ''
+        return ''.join(node.text_content or '' for node in root.traverse(include_text=True)
+                       if node.tag == '-text' and not any(parent.tag in NON_TEXT_TAGS for parent in iter_parents(node)))
+
+BACKENDS = {
+    'selectolax': LexborDocument if LexborHTMLParser else None,
+    'lxml': (lambda content: SoupDocument(content, 'lxml')) if HAVE_LXML else None,
+    'html.parser': lambda content: SoupDocument(content, 'html.parser'),
+}
+
+def available_backends():
+    return [name for name, factory in BACKENDS.items() if factory]
+
+def resolve_backend(name=None):
+    """Backend name to use: explicit choice, SCRAPER_PARSER, or the fastest installed"""
+    name = name or os.environ.get('SCRAPER_PARSER', 'auto')
+    if name == 'auto':
+        return available_backends()[0]
+    if not BACKENDS.get(name):
+        print(f"⚠️ HTML backend '{name}' not available, using html.parser")
+        return 'html.parser'
+    return name
+
+def parse(content, backend=None):
+    """Parse raw page bytes with the given (or default) backend"""
+    return BACKENDS[backend or DEFAULT_BACKEND](content)
+
+DEFAULT_BACKEND = resolve_backend()
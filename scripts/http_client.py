@@ -0,0 +1,189 @@
+"""
+Shared HTTP client for the scraper, downloader, mirror generator and
+threat compiler.
+
+One requests.Session per process with:
+  - a connection pool sized for the thread pools that use it (HTTP_POOL_SIZE)
+  - retries with exponential backoff on connection errors and 5xx,
+    honoring Retry-After up to HTTP_MAX_RETRY_AFTER seconds (HTTP_RETRIES,
+    HTTP_BACKOFF)
+  - rate limits: a 403/429 with X-RateLimit-Remaining: 0 waits for
+    X-RateLimit-Reset, a 429 with Retry-After waits that long (either up
+    to HTTP_MAX_RATE_WAIT seconds), then retries once. Callers that
+    schedule around rate limits themselves pass wait_for_rate_limit=False
+    (per call) or set it on the client, and get the limited response back
+  - per-host request rate limits, e.g. HTTP_HOST_RATES="getmodsapk.com=2"
+    (requests per second)
+  - a default timeout for calls that don't pass one
+  - timing hooks: add_timing_hook(fn) calls fn(method, url, status, seconds)
+    after every request (status is None when the request raised)
+
+Scripts under .github/scripts import this module from scripts/.
+"""
+import os
+import threading
+import time
+import urllib.parse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+POOL_SIZE = int(os.environ.get('HTTP_POOL_SIZE', '32'))
+RETRIES = int(os.environ.get('HTTP_RETRIES', '3'))
+BACKOFF = float(os.environ.get('HTTP_BACKOFF', '0.5'))
+MAX_RATE_WAIT = int(os.environ.get('HTTP_MAX_RATE_WAIT', '120'))
+MAX_RETRY_AFTER = int(os.environ.get('HTTP_MAX_RETRY_AFTER', '30'))
+DEFAULT_TIMEOUT = (15, 60)  # connect, per-read
+# 429 is left to the rate-limit path in HTTPClient.request, which callers can switch off
+RETRY_STATUSES = (500, 502, 503, 504)
+
+def _parse_rates(spec):
+    rates = {}
+    for item in spec.split(','):
+        host, _, rate = item.partition('=')
+        if host.strip() and rate.strip():
+            rates[host.strip().lower()] = float(rate)
+    return rates
+
+HOST_RATES = _parse_rates(os.environ.get('HTTP_HOST_RATES', 'getmodsapk.com=4'))
+
+def host_of(url):
+    host = urllib.parse.urlparse(url).hostname or ''
+    return host[4:] if host.startswith('www.') else host
+
+class HostRateLimiter:
+    """Spaces requests to each host at least 1/rate seconds apart"""
+
+    def __init__(self, rates):
+        self.rates = rates
+        self.next_slot = {}
+        self._lock = threading.Lock()
+
+    def wait(self, host):
+        rate = self.rates.get(host)
+        if not rate:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot.get(host, now))
+            self.next_slot[host] = slot + 1.0 / rate
+        if slot > now:
+            time.sleep(slot - now)
+
+class RequestStats:
+    """Default timing hook: per-host request count, errors and total time"""
+
+    def __init__(self):
+        self.hosts = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, method, url, status, seconds):
+        with self._lock:
+            entry = self.hosts.setdefault(host_of(url), [0, 0, 0.0])
+            entry[0] += 1
+            entry[1] += status is None or status >= 400
+            entry[2] += seconds
+
+    def report(self):
+        for host, (count, errors, seconds) in sorted(self.hosts.items(), key=lambda kv: -kv[1][2]):
+            print(f"   🌐 {host:<32} {count:>5} req  {errors:>3} err  {seconds:>8.2f}s  "
+                  f"{seconds / count * 1000:>7.1f} ms/req")
+
+class CappedRetry(Retry):
+    """Retry that never sleeps longer than MAX_RETRY_AFTER for a server's Retry-After"""
+
+    # urllib3 retries these whenever Retry-After is set, even outside status_forcelist
+    RETRY_AFTER_STATUS_CODES = frozenset({503})
+
+    def get_retry_after(self, response):
+        retry_after = super().get_retry_after(response)
+        return None if retry_after is None else min(retry_after, MAX_RETRY_AFTER)
+
+class HTTPClient(requests.Session):
+    def __init__(self, pool_size=POOL_SIZE, retries=RETRIES, backoff=BACKOFF, host_rates=None,
+                 wait_for_rate_limit=True):
+        super().__init__()
+        self.wait_for_rate_limit = wait_for_rate_limit
+        self.headers.update({'User-Agent': USER_AGENT})
+        retry = CappedRetry(
+            total=retries,
+            connect=retries,
+            read=retries,
+            status=retries,
+            backoff_factor=backoff,
+            status_forcelist=RETRY_STATUSES,
+            respect_retry_after_header=True,
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.mount('https://', adapter)
+        self.mount('http://', adapter)
+        self.limiter = HostRateLimiter(HOST_RATES if host_rates is None else host_rates)
+        self.timing_hooks = []
+        self.stats = RequestStats()
+        self.timing_hooks.append(self.stats)
+
+    def add_timing_hook(self, hook):
+        self.timing_hooks.append(hook)
+
+    def _timed(self, method, url, **kwargs):
+        self.limiter.wait(host_of(url))
+        start = time.perf_counter()
+        status = None
+        try:
+            response = super().request(method, url, **kwargs)
+            status = response.status_code
+            return response
+        finally:
+            elapsed = time.perf_counter() - start
+            for hook in self.timing_hooks:
+                hook(method, url, status, elapsed)
+
+    def request(self, method, url, wait_for_rate_limit=None, **kwargs):
+        kwargs.setdefault('timeout', DEFAULT_TIMEOUT)
+        response = self._timed(method, url, **kwargs)
+        if wait_for_rate_limit is None:
+            wait_for_rate_limit = self.wait_for_rate_limit
+        wait = rate_limit_wait(response) if wait_for_rate_limit else None
+        if wait is not None:
+            if wait > MAX_RATE_WAIT:
+                print(f"⚠️ Rate limited by {host_of(url)}, reset in {wait:.0f}s - not waiting")
+                return response
+            print(f"⏳ Rate limited by {host_of(url)}, waiting {wait:.0f}s for reset")
+            response.close()
+            time.sleep(wait)
+            response = self._timed(method, url, **kwargs)
+        return response
+
+def rate_limit_wait(response):
+    """Seconds until an exhausted GitHub-style rate limit resets (or Retry-After of a 429), else None"""
+    if response.status_code not in (403, 429):
+        return None
+    if response.headers.get('X-RateLimit-Remaining') == '0':
+        reset = response.headers.get('X-RateLimit-Reset')
+        if reset and reset.isdigit():
+            return max(0.0, int(reset) - time.time()) + 1
+    retry_after = response.headers.get('Retry-After', '')
+    if response.status_code == 429 and retry_after.isdigit():
+        return float(retry_after)
+    return None
+
+_shared = None
+_shared_lock = threading.Lock()
+
+def get_session():
+    """The process-wide shared client"""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = HTTPClient()
+        return _shared
+
+def add_timing_hook(hook):
+    get_session().add_timing_hook(hook)
+
+def report():
+    """Print per-host request stats for the shared client"""
+    get_session().stats.report()
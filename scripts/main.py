@@ -2,19 +2,12 @@
 import argparse
 from scraper import GetModsApkScraper
 from downloader import APKDownloader
-from utils import load_config, save_config
+from debug_capture import DebugCapture
+from pipeline import AutoPipeline
+import http_client
+from config_store import ConfigStore
+import json
 import os
-import re
-
-def normalize_version(version):
-    """Normalize version string for comparison"""
-    if not version:
-        return ""
-    # Remove 'v' prefix and any non-version characters
-    version = re.sub(r'^v', '', str(version).strip())
-    # Keep only version numbers and dots
-    version = re.sub(r'[^\d.]', '', version)
-    return version
 
 def main():
     parser = argparse.ArgumentParser(description='APK Scraper for GetModsApk')
@@ -24,6 +17,13 @@ def main():
     parser.add_argument('--tag', help='Release tag for manual download')
     parser.add_argument('--name', help='APK name for manual download')
     parser.add_argument('--force', action='store_true', help='Force download even if version matches')
+    parser.add_argument('--scrape-workers', type=int, default=4, help='Parallel page scrapes in --auto mode')
+    parser.add_argument('--download-workers', type=int, default=3, help='Parallel APK downloads in --auto mode')
+    parser.add_argument('--upload-workers', type=int, default=2, help='Parallel release uploads in --auto mode')
+    parser.add_argument('--stage-timeout', type=int, default=900,
+                        help='Seconds one running scrape/download/upload stage may take in --auto mode (queue time not counted)')
+    parser.add_argument('--results', help='Write per-app result records to this JSON file')
+    parser.add_argument('--debug-capture', metavar='DIR', help='Store raw scraped pages per app/step under DIR (or set SCRAPER_DEBUG_DIR)')
     
     args = parser.parse_args()
     
@@ -33,86 +33,74 @@ def main():
     print(f"🔑 GitHub Token: {'Provided' if github_token else 'Not provided'}")
     print(f"🏠 Repository: {repo_name}")
     
-    scraper = GetModsApkScraper()
-    downloader = APKDownloader(github_token)
+    scraper = GetModsApkScraper(debug=DebugCapture(args.debug_capture) if args.debug_capture else None)
     
     if args.auto:
         print("🚀 Running auto scraper...")
-        config = load_config()
-        downloaded_count = 0
+        # Loaded once; version bumps are batched and written in one atomic flush below
+        config = ConfigStore()
+        downloader = APKDownloader(github_token, config=config)
+        apks = config.tracked_apks
+        print(f"📋 {len(apks)} tracked APK(s): {args.scrape_workers} scrape / "
+              f"{args.download_workers} download / {args.upload_workers} upload workers")
         
-        for apk in config['tracked_apks']:
-            print(f"\n" + "="*50)
-            print(f"🔍 Processing {apk['name']}...")
-            print(f"🌐 URL: {apk['base_url']}")
-            
-            # Check current version
-            current_version = scraper.get_current_version(apk['base_url'])
-            if not current_version:
-                print(f"❌ Could not determine current version for {apk['name']}")
-                continue
-                
-            normalized_current = normalize_version(current_version)
-            normalized_config = normalize_version(apk['current_version'])
-            
-            print(f"📋 Website version: {current_version}")
-            print(f"📋 Config version: {apk['current_version']}")
-            print(f"📊 Normalized comparison: {normalized_current} vs {normalized_config}")
-            
-            should_download = args.force or (normalized_current != normalized_config)
-            
-            if should_download:
-                if args.force:
-                    print(f"🔄 Force downloading: {current_version}")
-                else:
-                    print(f"🆕 New version found: {current_version} (was {apk['current_version']})")
-                
-                # Get download link
-                download_url = scraper.get_download_links(apk['base_url'])
-                if download_url:
-                    print(f"🔗 Download URL obtained: {download_url}")
-                    filename = f"{apk['name'].replace(' ', '-').lower()}-{current_version}.apk"
-                    filepath = downloader.download_apk(download_url, filename)
-                    
-                    if filepath and os.path.exists(filepath):
-                        file_size = os.path.getsize(filepath) / (1024 * 1024)  # MB
-                        print(f"✅ Downloaded: {filepath} ({file_size:.2f} MB)")
-                        downloaded_count += 1
-                        
-                        if github_token:
-                            print(f"📤 Attempting to upload to GitHub releases...")
-                            success = downloader.upload_to_release(
-                                repo_name, 
-                                filepath, 
-                                apk['release_tag'], 
-                                current_version
-                            )
-                            if success:
-                                downloader.update_apk_list(apk['name'], current_version)
-                                print(f"🎉 Successfully completed for {apk['name']}")
-                            else:
-                                print(f"❌ Failed to upload to release for {apk['name']}")
-                        else:
-                            print(f"⚠️  No GitHub token - skipping release upload")
-                    else:
-                        print(f"❌ Failed to download APK or file doesn't exist")
-                else:
-                    print(f"❌ Could not find download link for {apk['name']}")
-            else:
-                print(f"✅ No update available for {apk['name']}")
+        pipeline = AutoPipeline(
+            scraper,
+            downloader,
+            repo_name=repo_name,
+            github_token=github_token,
+            force=args.force,
+            scrape_workers=args.scrape_workers,
+            download_workers=args.download_workers,
+            upload_workers=args.upload_workers,
+            stage_timeout=args.stage_timeout
+        )
+        try:
+            results = pipeline.run(apks)
+        finally:
+            changed = config.flush()
+            if changed:
+                print(f"💾 Saved {changed} version update(s) to {config.path}")
         
         print(f"\n" + "="*50)
+        for result in results:
+            version = result.website_version or '-'
+            print(f"   {result.name:<30} {result.status:<16} {version:<12} {result.elapsed:>7.1f}s")
+        downloaded_count = sum(1 for r in results if r.filepath)
         print(f"📊 Summary: Downloaded {downloaded_count} new APK(s)")
+        print(f"🗃️  Page cache: {scraper.cache.hits} hits, {scraper.cache.misses} fetches")
+        if downloader.store:
+            print(f"📦 APK store: {downloader.store.hits} download(s) reused, "
+                  f"{downloader.store.bytes_saved / 1024 / 1024:.1f} MB not re-fetched")
+        http_client.report()
+        
+        if args.results:
+            os.makedirs(os.path.dirname(args.results) or '.', exist_ok=True)
+            with open(args.results, 'w') as f:
+                json.dump([r.as_dict() for r in results], f, indent=2)
+            print(f"📝 Result records written to {args.results}")
         
     elif args.manual and args.url and args.tag and args.name:
         print("🛠️ Running manual download...")
-        download_url = scraper.get_download_links(args.url)
+        downloader = APKDownloader(github_token)
+        try:
+            product = scraper.scrape_product(args.url)
+            download_url = scraper.get_download_links(args.url, product)
+        except Exception as e:
+            print(f"❌ Error accessing product page: {e}")
+            download_url = None
         
         if download_url:
-            current_version = scraper.get_current_version(args.url) or "unknown"
+            current_version = product['version'] or "unknown"
             filename = f"{args.name.replace(' ', '-').lower()}-{current_version}.apk"
-            filepath = downloader.download_apk(download_url, filename)
-            
+            filepath = downloader.download_apk(download_url, filename, app=args.name,
+                                               version=product['version'])
+
+            info = downloader.apk_info.get(filepath)
+            if current_version == "unknown" and info and info.version_name:
+                print(f"📦 Using versionName from the APK manifest: {info.version_name}")
+                current_version = info.version_name
+
             if filepath and github_token:
                 downloader.upload_to_release(
                     repo_name,
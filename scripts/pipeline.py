@@ -0,0 +1,245 @@
+from utils import normalize_version
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout, wait
+from contextlib import nullcontext
+from dataclasses import dataclass, asdict
+import os
+import threading
+import time
+import urllib.parse
+
+# getmodsapk.com throttles aggressive clients; keep concurrent hits low
+HOST_LIMITS = {'getmodsapk.com': 2}
+DEFAULT_HOST_LIMIT = 4
+
+@dataclass
+class AppResult:
+    """Structured outcome of one tracked APK in an --auto run"""
+    name: str
+    status: str = "pending"  # up_to_date | updated | downloaded | no_version | no_link | download_failed | upload_failed | timeout | error
+    website_version: str = None
+    config_version: str = None
+    download_url: str = None
+    filepath: str = None
+    size_bytes: int = 0
+    package: str = None  # read from the downloaded APK's manifest
+    apk_version: str = None
+    error: str = None
+    elapsed: float = 0.0
+
+    def as_dict(self):
+        return asdict(self)
+
+class HostLimiter:
+    """Caps concurrent requests per hostname (e.g. getmodsapk.com)"""
+
+    def __init__(self, limits, default_limit):
+        self.limits = limits
+        self.default_limit = default_limit
+        self._slots = {}
+        self._lock = threading.Lock()
+
+    def slot(self, url):
+        host = urllib.parse.urlparse(url).netloc.lower()
+        if host.startswith('www.'):
+            host = host[4:]
+        with self._lock:
+            if host not in self._slots:
+                self._slots[host] = threading.Semaphore(self.limits.get(host, self.default_limit))
+            return self._slots[host]
+
+class StageTimeout(Exception):
+    def __init__(self, stage):
+        super().__init__(stage)
+        self.stage = stage
+
+class AutoPipeline:
+    """
+    Pipelined scheduler for main.py --auto.
+
+    Each tracked APK flows through three stages, each with its own worker
+    pool: scrape (version + download link), download, upload (+ config
+    update). A slow mirror only occupies one download worker instead of
+    stalling every other app. Requests to the same host share a per-host
+    semaphore.
+
+    Each stage gets stage_timeout seconds counted from when it actually
+    starts running, so time spent queued behind other apps or waiting for
+    a host slot never counts. A stage that overruns marks its app as a
+    timeout, but it cannot be interrupted: run() waits for it before
+    returning and records its late result (a late successful upload still
+    updates the config, so the next run does not upload it again).
+    """
+
+    def __init__(self, scraper, downloader, repo_name=None, github_token=None, force=False,
+                 scrape_workers=4, download_workers=3, upload_workers=2,
+                 host_limits=None, stage_timeout=900):
+        self.scraper = scraper
+        self.downloader = downloader
+        self.repo_name = repo_name
+        self.github_token = github_token
+        self.force = force
+        self.stage_timeout = stage_timeout
+        self._late = []  # (future, handler) for stages still running past their timeout
+        self._late_lock = threading.Lock()
+        self.hosts = HostLimiter(host_limits or HOST_LIMITS, DEFAULT_HOST_LIMIT)
+        self.scrape_pool = ThreadPoolExecutor(max_workers=scrape_workers, thread_name_prefix='scrape')
+        self.download_pool = ThreadPoolExecutor(max_workers=download_workers, thread_name_prefix='download')
+        self.upload_pool = ThreadPoolExecutor(max_workers=upload_workers, thread_name_prefix='upload')
+
+    def _stage(self, pool, stage, fn, *args, host=None, on_late=None):
+        """
+        Run fn on a stage pool. The timeout starts once fn is running (host
+        slot acquired), not when it is queued. On timeout the still-running
+        future is handed to run() along with on_late(result) and
+        StageTimeout is raised.
+        """
+        started = threading.Event()
+
+        def run_stage():
+            with self.hosts.slot(host) if host else nullcontext():
+                started.set()
+                return fn(*args)
+
+        future = pool.submit(run_stage)
+        while not started.wait(1):
+            if future.done():
+                break
+        try:
+            return future.result(timeout=self.stage_timeout)
+        except FutureTimeout:
+            with self._late_lock:
+                self._late.append((future, on_late))
+            raise StageTimeout(stage)
+
+    def _scrape_product(self, apk):
+        try:
+            return self.scraper.scrape_product(apk['base_url'])
+        except Exception as e:
+            print(f"❌ Error getting current version for {apk['name']}: {e}")
+            return None
+
+    def _scrape_link(self, apk, product):
+        return self.scraper.get_download_links(apk['base_url'], product)
+
+    def _download(self, url, filename, apk, version):
+        return self.downloader.download_apk(url, filename, app=apk['name'], version=version)
+
+    def _upload(self, filepath, apk, version):
+        return self.downloader.upload_to_release(self.repo_name, filepath, apk['release_tag'], version)
+
+    def _record_upload(self, result, apk, version):
+        # Batched in the shared ConfigStore; main.py flushes once at the end
+        self.downloader.update_apk_list(apk['name'], version)
+        result.status = "updated"
+
+    def _late_upload(self, result, apk, version):
+        """on_late handler: an upload that finished after its timeout"""
+        def handle(uploaded):
+            if uploaded:
+                print(f"🐢 {apk['name']}: upload finished after the {self.stage_timeout}s timeout, recording it")
+                self._record_upload(result, apk, version)
+                result.error = "upload finished after the stage timeout"
+        return handle
+
+    def process(self, apk):
+        """Drive one APK through every stage. Always returns an AppResult."""
+        result = AppResult(name=apk['name'], config_version=apk.get('current_version'))
+        start = time.monotonic()
+        try:
+            # One fetch of the product page yields the version; the link stage
+            # reuses the download-page URL built alongside it
+            product = self._stage(self.scrape_pool, "scrape", self._scrape_product, apk, host=apk['base_url'])
+            current_version = product['version'] if product else None
+            result.website_version = current_version
+            if not current_version:
+                print(f"❌ Could not determine current version for {apk['name']}")
+                result.status = "no_version"
+                return result
+
+            normalized_current = normalize_version(current_version)
+            normalized_config = normalize_version(apk['current_version'])
+            print(f"📋 {apk['name']}: website {current_version} vs config {apk['current_version']} "
+                  f"({normalized_current} vs {normalized_config})")
+
+            if not (self.force or normalized_current != normalized_config):
+                print(f"✅ No update available for {apk['name']}")
+                result.status = "up_to_date"
+                return result
+
+            if self.force:
+                print(f"🔄 Force downloading {apk['name']}: {current_version}")
+            else:
+                print(f"🆕 New version found for {apk['name']}: {current_version} (was {apk['current_version']})")
+
+            download_url = self._stage(self.scrape_pool, "scrape", self._scrape_link, apk, product,
+                                       host=apk['base_url'])
+            result.download_url = download_url
+            if not download_url:
+                print(f"❌ Could not find download link for {apk['name']}")
+                result.status = "no_link"
+                return result
+
+            filename = f"{apk['name'].replace(' ', '-').lower()}-{current_version}.apk"
+            filepath = self._stage(self.download_pool, "download", self._download, download_url, filename,
+                                   apk, current_version, host=download_url)
+            if not filepath or not os.path.exists(filepath):
+                print(f"❌ Failed to download APK for {apk['name']}")
+                result.status = "download_failed"
+                return result
+            result.filepath = filepath
+            result.size_bytes = os.path.getsize(filepath)
+            result.status = "downloaded"
+            info = self.downloader.apk_info.get(filepath)
+            if info:
+                result.package = info.package
+                result.apk_version = info.version_name
+                if info.version_name and normalize_version(info.version_name) != normalized_current:
+                    print(f"⚠️  {apk['name']}: APK reports versionName {info.version_name}, website says {current_version}")
+
+            if not self.github_token:
+                print(f"⚠️  No GitHub token - skipping release upload for {apk['name']}")
+                return result
+
+            print(f"📤 Uploading {apk['name']} to GitHub releases...")
+            if self._stage(self.upload_pool, "upload", self._upload, filepath, apk, current_version,
+                           on_late=self._late_upload(result, apk, current_version)):
+                self._record_upload(result, apk, current_version)
+                print(f"🎉 Successfully completed for {apk['name']}")
+            else:
+                print(f"❌ Failed to upload to release for {apk['name']}")
+                result.status = "upload_failed"
+            return result
+
+        except StageTimeout as e:
+            print(f"⏱️  {apk['name']}: {e.stage} stage exceeded {self.stage_timeout}s, giving up")
+            result.status = "timeout"
+            return result
+        except Exception as e:
+            print(f"❌ Unexpected error for {apk['name']}: {e}")
+            result.status = "error"
+            result.error = str(e)
+            return result
+        finally:
+            result.elapsed = round(time.monotonic() - start, 2)
+
+    def run(self, apks):
+        """Process all APKs concurrently. Results keep the config order."""
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, len(apks)), thread_name_prefix='app') as drivers:
+                results = list(drivers.map(self.process, apks))
+            self._finish_late()
+            return results
+        finally:
+            for pool in (self.scrape_pool, self.download_pool, self.upload_pool):
+                pool.shutdown(wait=False)
+
+    def _finish_late(self):
+        """Wait for stages that overran their timeout and apply their late results"""
+        if not self._late:
+            return
+        print(f"⏳ Waiting for {len(self._late)} stage(s) still running past their timeout...")
+        wait([future for future, _ in self._late])
+        for future, on_late in self._late:
+            if on_late and not future.cancelled() and future.exception() is None:
+                on_late(future.result())
+        self._late = []
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Self-test for the scraper's extractors against saved getmodsapk pages in
+fixtures/getmodsapk/ (pages.json maps each URL to its file and lists the
+expected version and APK link). Needs no network.
+
+    python scripts/scrape_selftest.py
+
+Every installed HTML backend runs scrape_product and get_download_links
+for every fixture app. The test fails when a backend misses the
+expected result or when two backends extract anything differently,
+down to the per-page version, candidate links and direct link.
+
+Exits non-zero when any check fails.
+"""
+import contextlib
+import io
+import json
+import os
+import sys
+
+import html_backend
+from debug_capture import DebugCapture
+from scraper import GetModsApkScraper, PageCache
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'getmodsapk')
+
+def load_fixtures():
+    with open(os.path.join(FIXTURES_DIR, 'pages.json'), 'r') as f:
+        apps = json.load(f)
+    pages = {}
+    for app in apps.values():
+        for url, name in app['pages'].items():
+            with open(os.path.join(FIXTURES_DIR, name), 'rb') as f:
+                pages[url] = f.read()
+    return apps, pages
+
+def fixture_scraper(backend, pages):
+    """Scraper whose fetch() serves the fixture pages (unknown URLs fail like a 404)"""
+    scraper = GetModsApkScraper(cache=PageCache(cache_dir=None), parser=backend, debug=DebugCapture(None))
+    def fetch(url, app=None, step='page', cache=False):
+        if url not in pages:
+            raise IOError(f"404 Not Found: {url}")
+        return pages[url]
+    scraper.fetch = fetch
+    return scraper
+
+def extract_all(scraper, apps, pages):
+    """Everything the scraper derives from the fixtures, keyed so backends can be compared"""
+    results = {}
+    with contextlib.redirect_stdout(io.StringIO()):
+        for name, app in apps.items():
+            product = scraper.scrape_product(app['base_url'])
+            results[name] = {'version': product['version'],
+                             'link': scraper.get_download_links(app['base_url'], product)}
+        for url, content in pages.items():
+            doc = scraper.parse(content)
+            results[url] = (scraper.extract_version(doc), scraper.find_candidate_links(doc),
+                            scraper.extract_direct_apk_link(doc, url))
+    return results
+
+def main():
+    apps, pages = load_fixtures()
+    backends = html_backend.available_backends()
+    print(f"🧪 {len(apps)} fixture apps, {len(pages)} pages, backends: {', '.join(backends)}")
+
+    failures = 0
+    reference = None
+    for backend in backends:
+        results = extract_all(fixture_scraper(backend, pages), apps, pages)
+        problems = []
+        for name, app in apps.items():
+            for field in ('version', 'link'):
+                if results[name][field] != app[field]:
+                    problems.append(f"{name}: {field} {results[name][field]!r}, expected {app[field]!r}")
+        if reference is None:
+            reference = (backend, results)
+        else:
+            for key, value in results.items():
+                if value != reference[1][key]:
+                    problems.append(f"{key}: {value!r} differs from {reference[0]}'s {reference[1][key]!r}")
+        failures += bool(problems)
+        for problem in problems:
+            print(f"❌ {backend}: {problem}")
+        if not problems:
+            print(f"✅ {backend}: passed")
+
+    print(f"\n{'❌' if failures else '✅'} {len(backends) - failures}/{len(backends)} backends passed")
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
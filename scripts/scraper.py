@@ -1,84 +1,203 @@
 from utils import setup_session, extract_version_info
-from bs4 import BeautifulSoup
+from debug_capture import DebugCapture
+import html_backend
+import hashlib
+import os
 import re
+import threading
 import time
 import urllib.parse
 
+# Product pages fetched within this window are reused instead of re-requested.
+# Download and final pages carry short-lived links and are always fetched.
+# Set SCRAPER_CACHE_DIR to persist them across runs (update-checker ->
+# auto-scraper) via actions/cache.
+CACHE_TTL = int(os.environ.get('SCRAPER_CACHE_TTL', '3600'))
+CACHE_DIR = os.environ.get('SCRAPER_CACHE_DIR')
+
+# Extraction patterns, compiled once
+VERSION_RE = re.compile(r'v?(\d+\.\d+\.\d+)', re.I)
+DOWNLOAD_ID_RE = re.compile(r'/download/\d+/', re.I)
+DOWNLOAD_TEXT_RE = re.compile(r'download|begin download', re.I)
+APK_HREF_RE = re.compile(r'\.apk($|\?|#)', re.I)
+SCRIPT_APK_PATTERNS = [
+    re.compile(r'https?://[^"\']*\.apk[^"\']*', re.I),
+    re.compile(r'downloadUrl\s*[=:]\s*["\']([^"\']*\.apk[^"\']*)["\']', re.I),
+    re.compile(r'fileUrl\s*[=:]\s*["\']([^"\']*\.apk[^"\']*)["\']', re.I),
+    re.compile(r'href\s*[=:]\s*["\']([^"\']*\.apk[^"\']*)["\']', re.I)
+]
+SCRIPT_URL_PATTERNS = [
+    re.compile(r'https?://[^"\']*/download/[^"\']*', re.I),
+    re.compile(r'https?://[^"\']*/file/[^"\']*', re.I),
+    re.compile(r'https?://[^"\']*\.apk[^"\']*', re.I)
+]
+
+class PageCache:
+    """URL -> raw page bytes with a TTL, optionally mirrored to disk"""
+    
+    def __init__(self, ttl=CACHE_TTL, cache_dir=CACHE_DIR):
+        self.ttl = ttl
+        self.cache_dir = cache_dir
+        self.pages = {}
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+            self.prune()
+    
+    def prune(self):
+        """Drop on-disk pages older than the TTL so the cache dir stays small"""
+        cutoff = time.time() - self.ttl
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
+    
+    def _path(self, url):
+        return os.path.join(self.cache_dir, hashlib.sha256(url.encode('utf-8')).hexdigest()[:32] + '.html')
+    
+    def get(self, url):
+        now = time.time()
+        with self._lock:
+            entry = self.pages.get(url)
+            if entry and now - entry[0] < self.ttl:
+                self.hits += 1
+                return entry[1]
+        if self.cache_dir:
+            path = self._path(url)
+            try:
+                fetched_at = os.path.getmtime(path)
+                if now - fetched_at < self.ttl:
+                    with open(path, 'rb') as f:
+                        content = f.read()
+                    with self._lock:
+                        self.pages[url] = (fetched_at, content)
+                        self.hits += 1
+                    return content
+            except OSError:
+                pass
+        with self._lock:
+            self.misses += 1
+        return None
+    
+    def put(self, url, content):
+        with self._lock:
+            self.pages[url] = (time.time(), content)
+        if self.cache_dir:
+            path = self._path(url)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+
 class GetModsApkScraper:
-    def __init__(self):
+    def __init__(self, cache=None, parser=None, debug=None):
         self.session = setup_session()
         self.base_domain = "https://getmodsapk.com"
+        self.cache = cache or PageCache()
+        self.parser = html_backend.resolve_backend(parser)
+        self.debug = debug or DebugCapture()
+    
+    def parse(self, content):
+        return html_backend.parse(content, self.parser)
+    
+    def fetch(self, url, app=None, step='page', cache=False):
+        """
+        GET a page, through the cache when `cache` is set. Raises on HTTP errors
+        like session.get + raise_for_status.
+        With debug capture enabled the raw bytes are stored under app/step.
+        """
+        content = self.cache.get(url) if cache else None
+        if content is None:
+            response = self.session.get(url)
+            if not response.ok:
+                self.debug.capture(app or url, f"{step}-http{response.status_code}", response.content)
+            response.raise_for_status()
+            content = response.content
+            if cache:
+                self.cache.put(url, content)
+        self.debug.capture(app or url, step, content)
+        return content
+    
+    def app_key(self, base_url):
+        """Short per-app name for debug captures, e.g. 'rosetta-stone'"""
+        return urllib.parse.urlparse(base_url).path.strip('/').replace('/', '_') or base_url
+    
+    def scrape_product(self, base_url):
+        """
+        Parse the product page once and return everything derived from it:
+        {'version': str or None, 'download_page': url}
+        """
+        doc = self.parse(self.fetch(base_url, self.app_key(base_url), 'product', cache=True))
+        download_page = base_url.rstrip('/') + '/download/'
+        return {
+            'version': self.extract_version(doc),
+            'download_page': download_page
+        }
+    
+    def absolute_url(self, href):
+        if href.startswith('/'):
+            return self.base_domain + href
+        if href.startswith('http'):
+            return href
+        return urllib.parse.urljoin(self.base_domain, href)
     
-    def get_download_links(self, base_url):
+    def find_candidate_links(self, doc):
+        """Candidate /download/<id>/ page URLs, best match first"""
+        # Method 1: Look for links containing '/download/<id>/'
+        hrefs = [href for href in doc.attr_values('a[href]', 'href') if DOWNLOAD_ID_RE.search(href)]
+        
+        if not hrefs:
+            # Method 2: Look for buttons with download text
+            hrefs = [href for text, href in doc.leaf_texts('a, button')
+                     if href and '/download/' in href and DOWNLOAD_TEXT_RE.search(text)]
+        
+        if not hrefs:
+            # Method 3: Look for any links with download in class
+            hrefs = doc.attr_values('a[class*="download" i][href], div[class*="download" i][href]', 'href')
+        
+        urls = []
+        for href in hrefs:
+            url = self.absolute_url(href)
+            if url not in urls:
+                urls.append(url)
+        return urls
+    
+    def get_download_links(self, base_url, product=None):
         """Get download links following the multi-step process"""
         try:
             print(f"🔍 Starting download process for: {base_url}")
+            app = self.app_key(base_url)
             
-            # Step 1: Navigate to base URL
+            # Step 1: Product page (usually already cached by the version check)
             print(f"📄 Step 1: Accessing main page...")
-            response = self.session.get(base_url)
-            response.raise_for_status()
+            if product is None:
+                product = self.scrape_product(base_url)
             
             # Step 2: Go to download page
-            download_page_url = base_url.rstrip('/') + '/download/'
             print(f"📥 Step 2: Accessing download page...")
-            response = self.session.get(download_page_url)
-            response.raise_for_status()
-            
-            soup = BeautifulSoup(response.content, 'html.parser')
-            
-            # Debug: Save HTML for inspection
-            with open('debug_page.html', 'w', encoding='utf-8') as f:
-                f.write(soup.prettify())
+            doc = self.parse(self.fetch(product['download_page'], app, 'download'))
             
             # Step 3: Find all potential download links
             print(f"🔗 Step 3: Finding download links...")
-            
-            # Method 1: Look for links containing '/download/'
-            download_links = soup.find_all('a', href=re.compile(r'/download/\d+/', re.I))
-            
-            if not download_links:
-                # Method 2: Look for buttons with download text
-                download_buttons = soup.find_all(['a', 'button'], 
-                                               string=re.compile(r'download|begin download', re.I))
-                for button in download_buttons:
-                    href = button.get('href', '')
-                    if href and '/download/' in href:
-                        download_links.append(button)
-            
-            if not download_links:
-                # Method 3: Look for any links with download in class or id
-                download_links = soup.find_all(['a', 'div'], 
-                                             attrs={'class': re.compile(r'download', re.I),
-                                                   'href': re.compile(r'.*')})
+            download_links = self.find_candidate_links(doc)
             
             print(f"📎 Found {len(download_links)} potential download links")
             
             # Step 4: Try each download link
-            for i, link in enumerate(download_links[:5]):  # Limit to first 5 to avoid too many requests
-                href = link.get('href', '')
-                if not href:
-                    continue
-                    
-                # Construct full URL
-                if href.startswith('/'):
-                    download_id_url = self.base_domain + href
-                elif href.startswith('http'):
-                    download_id_url = href
-                else:
-                    download_id_url = urllib.parse.urljoin(self.base_domain, href)
-                
+            for i, download_id_url in enumerate(download_links[:5]):  # Limit to first 5 to avoid too many requests
                 print(f"🔍 Trying download link {i+1}: {download_id_url}")
                 
                 try:
                     # Step 4: Get final download page
-                    final_response = self.session.get(download_id_url)
-                    final_response.raise_for_status()
-                    
-                    final_soup = BeautifulSoup(final_response.content, 'html.parser')
+                    final_doc = self.parse(self.fetch(download_id_url, app, f"final-{i+1}"))
                     
                     # Extract direct APK download link
-                    apk_link = self.extract_direct_apk_link(final_soup, download_id_url)
+                    apk_link = self.extract_direct_apk_link(final_doc, download_id_url)
                     if apk_link:
                         print(f"✅ Success! Found APK: {apk_link}")
                         return apk_link
@@ -90,144 +209,153 @@ class GetModsApkScraper:
                     continue
             
             # If all methods fail, try JavaScript-based extraction
-            return self.extract_from_javascript(soup, base_url)
+            return self.extract_from_javascript(doc, base_url)
             
         except Exception as e:
             print(f"❌ Error in download process: {e}")
             return None
     
-    def extract_direct_apk_link(self, soup, page_url):
+    def extract_direct_apk_link(self, doc, page_url):
         """Extract direct APK download link from final page"""
         print(f"🔍 Extracting APK link from: {page_url}")
         
         # Method 1: Direct .apk links
-        apk_links = soup.find_all('a', href=re.compile(r'\.apk($|\?|#)', re.I))
-        for link in apk_links:
-            href = link.get('href', '')
-            if href:
+        for href in doc.attr_values('a[href]', 'href'):
+            if APK_HREF_RE.search(href):
                 full_url = href if href.startswith('http') else urllib.parse.urljoin(self.base_domain, href)
                 print(f"📦 Found direct APK link: {full_url}")
                 return full_url
         
         # Method 2: Look for download buttons with data attributes
-        download_elements = soup.find_all(attrs={
-            'data-download': True,
-            'href': re.compile(r'.*')
-        })
-        for element in download_elements:
-            href = element.get('href', '')
-            if href and '.apk' in href.lower():
+        for href in doc.attr_values('[data-download][href]', 'href'):
+            if '.apk' in href.lower():
                 full_url = href if href.startswith('http') else urllib.parse.urljoin(self.base_domain, href)
                 print(f"📦 Found data-download APK: {full_url}")
                 return full_url
         
         # Method 3: Look for iframes or redirects
-        iframes = soup.find_all('iframe', src=re.compile(r'.*'))
-        for iframe in iframes:
-            src = iframe.get('src', '')
-            if src and '.apk' in src.lower():
+        for src in doc.attr_values('iframe[src]', 'src'):
+            if '.apk' in src.lower():
                 full_url = src if src.startswith('http') else urllib.parse.urljoin(self.base_domain, src)
                 print(f"📦 Found iframe APK: {full_url}")
                 return full_url
         
         # Method 4: Extract from JavaScript variables
-        script_tags = soup.find_all('script')
-        for script in script_tags:
-            if script.string:
-                # Look for various URL patterns in JavaScript
-                patterns = [
-                    r'https?://[^"\']*\.apk[^"\']*',
-                    r'downloadUrl\s*[=:]\s*["\']([^"\']*\.apk[^"\']*)["\']',
-                    r'fileUrl\s*[=:]\s*["\']([^"\']*\.apk[^"\']*)["\']',
-                    r'href\s*[=:]\s*["\']([^"\']*\.apk[^"\']*)["\']'
-                ]
-                
-                for pattern in patterns:
-                    matches = re.findall(pattern, script.string, re.I)
-                    for match in matches:
-                        if isinstance(match, tuple):
-                            match = match[0]  # Get the first group if it's a tuple
-                        full_url = match if match.startswith('http') else urllib.parse.urljoin(self.base_domain, match)
-                        print(f"📦 Found JavaScript APK: {full_url}")
-                        return full_url
+        for script in doc.scripts():
+            # Every pattern needs ".apk", so skip the (many) scripts without it
+            if '.apk' not in script.lower():
+                continue
+            for pattern in SCRIPT_APK_PATTERNS:
+                match = pattern.search(script)
+                if match:
+                    url = match.group(1) if pattern.groups else match.group(0)
+                    full_url = url if url.startswith('http') else urllib.parse.urljoin(self.base_domain, url)
+                    print(f"📦 Found JavaScript APK: {full_url}")
+                    return full_url
         
         print(f"❌ No APK link found on {page_url}")
         return None
     
-    def extract_from_javascript(self, soup, base_url):
+    def extract_from_javascript(self, doc, base_url):
         """Alternative extraction method for JavaScript-heavy pages"""
         print("🔄 Trying JavaScript-based extraction...")
         
         # Look for scripts that might contain download logic
-        scripts = soup.find_all('script')
-        for script in scripts:
-            if script.string and 'download' in script.string.lower():
-                # Extract any URLs that might be download endpoints
-                url_patterns = [
-                    r'https?://[^"\']*/download/[^"\']*',
-                    r'https?://[^"\']*/file/[^"\']*',
-                    r'https?://[^"\']*\.apk[^"\']*'
-                ]
-                
-                for pattern in url_patterns:
-                    matches = re.findall(pattern, script.string, re.I)
-                    for match in matches:
-                        if 'getmodsapk' in match.lower():
-                            print(f"🔗 Found potential JS download: {match}")
-                            # Try to access this URL
-                            try:
-                                response = self.session.get(match)
-                                if response.status_code == 200:
-                                    js_soup = BeautifulSoup(response.content, 'html.parser')
-                                    apk_link = self.extract_direct_apk_link(js_soup, match)
-                                    if apk_link:
-                                        return apk_link
-                            except:
-                                continue
+        for script in doc.scripts():
+            if 'download' not in script.lower():
+                continue
+            # Extract any URLs that might be download endpoints
+            for pattern in SCRIPT_URL_PATTERNS:
+                for match in pattern.findall(script):
+                    if 'getmodsapk' in match.lower():
+                        print(f"🔗 Found potential JS download: {match}")
+                        # Try to access this URL
+                        try:
+                            apk_link = self.extract_direct_apk_link(self.parse(self.fetch(match, self.app_key(base_url), 'js')), match)
+                            if apk_link:
+                                return apk_link
+                        except:
+                            continue
         
         return None
     
     def get_current_version(self, base_url):
         """Get current version from the website"""
         try:
-            response = self.session.get(base_url)
-            response.raise_for_status()
-            
-            soup = BeautifulSoup(response.content, 'html.parser')
-            
-            # Look for version in multiple places
-            version_pattern = r'v?(\d+\.\d+\.\d+)'
-            
-            # Check page title and headings
-            title = soup.find('title')
-            if title:
-                version_match = re.search(version_pattern, title.get_text(), re.I)
-                if version_match:
-                    return version_match.group(0)
-            
-            # Check main content
-            main_content = soup.find('main') or soup.find('article') or soup.find('div', class_=re.compile(r'content|main', re.I))
-            if main_content:
-                version_match = re.search(version_pattern, main_content.get_text(), re.I)
+            return self.scrape_product(base_url)['version']
+        except Exception as e:
+            print(f"❌ Error getting current version: {e}")
+            return None
+    
+    def extract_version(self, doc):
+        """Find the app version in a parsed product page"""
+        # Check page title
+        version_match = VERSION_RE.search(doc.title())
+        if version_match:
+            return version_match.group(0)
+        
+        # Check main content
+        for selector in ('main', 'article', 'div[class*="content" i], div[class*="main" i]'):
+            text = doc.first_text(selector)
+            if text is not None:
+                version_match = VERSION_RE.search(text)
                 if version_match:
                     return version_match.group(0)
-            
-            # Check specific version elements
-            version_elements = soup.find_all(['span', 'div', 'p'], 
-                                           string=re.compile(r'v?\d+\.\d+\.\d+', re.I))
-            for element in version_elements:
-                version = extract_version_info(element.get_text())
+                break
+        
+        # Check specific version elements
+        for text, _ in doc.leaf_texts('span, div, p'):
+            if VERSION_RE.search(text):
+                version = extract_version_info(text)
                 if version:
                     return version
-            
-            # Fallback: extract from any text
-            page_text = soup.get_text()
-            version_match = re.search(version_pattern, page_text, re.I)
-            if version_match:
-                return version_match.group(0)
-            
-            return None
-            
-        except Exception as e:
-            print(f"❌ Error getting current version: {e}")
-            return None
+        
+        # Fallback: extract from any text
+        version_match = VERSION_RE.search(doc.full_text())
+        if version_match:
+            return version_match.group(0)
+        
+        return None
+
+def benchmark(paths, rounds=20):
+    """Parse + extraction time per page for every installed backend, checking results match"""
+    import contextlib
+    import io
+    pages = []
+    for path in paths:
+        with open(path, 'rb') as f:
+            pages.append((path, f.read()))
+    
+    scraper = GetModsApkScraper(cache=PageCache(cache_dir=None), debug=DebugCapture(None))
+    def extract(content):
+        doc = scraper.parse(content)
+        with contextlib.redirect_stdout(io.StringIO()):
+            return (scraper.extract_version(doc), scraper.find_candidate_links(doc),
+                    scraper.extract_direct_apk_link(doc, ''))
+    
+    reference = None
+    mismatches = 0
+    for backend in html_backend.available_backends():
+        scraper.parser = backend
+        results = [extract(content) for _, content in pages]
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for _, content in pages:
+                extract(content)
+        per_page = (time.perf_counter() - start) / (rounds * len(pages))
+        if reference is None:
+            reference = results
+        differing = [path for (path, _), ours, ref in zip(pages, results, reference) if ours != ref]
+        mismatches += len(differing)
+        print(f"📊 {backend:<12} {per_page * 1e3:>8.2f} ms/page  "
+              f"{'✅ identical' if not differing else '❌ differs: ' + ', '.join(differing)}")
+    return mismatches
+
+if __name__ == "__main__":
+    # python scraper.py bench [saved_page.html ...] (defaults to the pages in fixtures/getmodsapk/)
+    import glob
+    import sys
+    if len(sys.argv) >= 2 and sys.argv[1] == "bench":
+        fixtures = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'getmodsapk', '*.html')
+        sys.exit(1 if benchmark(sys.argv[2:] or sorted(glob.glob(fixtures))) else 0)
+    print("usage: python scraper.py bench [<saved_page.html> ...]")
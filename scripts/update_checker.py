@@ -1,14 +1,15 @@
 #!/usr/bin/env python3
 from scraper import GetModsApkScraper
-from utils import load_config
+from config_store import ConfigStore
 import os
 
 def check_updates():
     scraper = GetModsApkScraper()
-    config = load_config()
+    # Read-only: the checker must never rewrite the config
+    config = ConfigStore.snapshot()
     updates_available = False
     
-    for apk in config['tracked_apks']:
+    for apk in config.tracked_apks:
         print(f"Checking {apk['name']}...")
         current_version = scraper.get_current_version(apk['base_url'])
         
@@ -18,6 +19,9 @@ def check_updates():
         else:
             print(f"No update for {apk['name']}")
     
+    # Pages land in SCRAPER_CACHE_DIR (if set) so a triggered auto-scraper run reuses them
+    print(f"Page cache: {scraper.cache.hits} hits, {scraper.cache.misses} fetches")
+    
     # Set output for GitHub Actions
     if updates_available:
         print("::set-output name=updates_available::true")